@@ -0,0 +1,507 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+離線效能測試
+使用本地模擬網站測量 check_links、check_google_docs_permission 與
+checkWebsite 的吞吐量，每個模式在獨立的子程序中執行以取得正確的記憶體峰值，
+結果存成 JSON 方便比較不同 commit 之間的差異
+
+使用方法:
+  python benchmark.py                           # 執行預設模式
+  python benchmark.py --links 100,1000,100000   # 指定頁面連結數
+  python benchmark.py --compare old.json        # 與先前的結果比較
+  python benchmark.py --modes scripts --script-kb 64,512,4096   # 掃描內嵌腳本網址的額外成本
+  python benchmark.py --modes startup           # 啟動時間 (python -X importtime) 與沒有異常時的整體執行時間
+  python benchmark.py --modes aggregate --fleet 1000,10000   # 大量網站的結果彙整 (摘要、憑證門檻、各收件者統計)
+  python benchmark.py --modes google_probe      # Google 連結只取標頭的探測與讀取整個頁面判斷的比較
+"""
+
+import os
+import sys
+import json
+import logging
+import time
+import argparse
+import platform
+import resource
+import subprocess
+import contextlib
+
+DEFAULT_MODES = ["links", "google", "sites"]
+
+# 排程入口的載入時間預算 (毫秒，python -X importtime 的累計時間，取多次執行的最小值)
+IMPORT_BUDGET_MS = {"checkWebsite": 110, "checkWeblink": 125}
+# 只在需要時才載入的模組，單純 import 入口程式時不應出現
+LAZY_MODULES = [
+    "smtplib", "email.mime.text", "email.mime.multipart", "getpass", "uuid", "bs4",
+    "cProfile", "pstats", "http.server", "multiprocessing", "concurrent.futures.process",
+]
+
+
+def percentile(values, pct):
+    """計算百分位數 (最近秩法)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+class RequestTimer:
+    """記錄 requests.Session 每個請求的耗時"""
+
+    def __init__(self):
+        self.durations = []
+
+    @contextlib.contextmanager
+    def installed(self):
+        import requests
+
+        original = requests.Session.request
+        durations = self.durations
+
+        def timed_request(session, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(session, *args, **kwargs)
+            finally:
+                durations.append(time.perf_counter() - start)
+
+        requests.Session.request = timed_request
+        try:
+            yield self
+        finally:
+            requests.Session.request = original
+
+
+def _usage():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime, usage.ru_maxrss
+
+
+def _summary(count, elapsed, durations, unit):
+    cpu_time, peak_rss_kb = _usage()
+    p95 = percentile(durations, 95)
+    return {
+        "count": count,
+        "elapsed_seconds": round(elapsed, 4),
+        f"{unit}_per_second": round(count / elapsed, 2) if elapsed else None,
+        "p50_latency_ms": round(percentile(durations, 50) * 1000, 3) if durations else None,
+        "p95_latency_ms": round(p95 * 1000, 3) if p95 is not None else None,
+        "cpu_seconds": round(cpu_time, 3),
+        "peak_rss_mb": round(peak_rss_kb / 1024, 1),
+    }
+
+
+def bench_links(farm, link_count):
+    """以含 link_count 個連結的頁面測量 check_links"""
+    # 模擬網站的延遲不寫入主機延遲紀錄
+    os.environ.setdefault("HOST_LATENCY_FILE", "")
+    import checkWeblink
+
+    checkWeblink.REQUEST_DELAY = 0
+    timer = RequestTimer()
+    with timer.installed(), open(os.devnull, "w") as devnull:
+        with contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            broken = checkWeblink.check_links(farm.url(f"/page/{link_count}"))
+            elapsed = time.perf_counter() - start
+
+    result = _summary(link_count, elapsed, timer.durations[1:], "links")
+    result["broken"] = len(broken)
+    return result
+
+
+def bench_google(farm, iterations):
+    """測量 Google 文件權限判斷 (HTML 解析) 的速度"""
+    import requests
+    import checkWeblink
+
+    session = requests.Session()
+    pages = [
+        session.get(farm.url(f"/docs.google.com/{kind}/{i}"))
+        for i, kind in enumerate(["public", "login"])
+    ]
+
+    durations = []
+    start = time.perf_counter()
+    for i in range(iterations):
+        response = pages[i % len(pages)]
+        t0 = time.perf_counter()
+        checkWeblink.check_google_docs_permission(response)
+        durations.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+    return _summary(iterations, elapsed, durations, "pages")
+
+
+def bench_google_pool(farm, iterations, workers=None):
+    """測量以程序池 (多核心) 平行判斷 Google 文件權限的吞吐量"""
+    import requests
+    from concurrent.futures import ThreadPoolExecutor
+    from cpu_pool import CpuPool
+    from page_parser import classify_google_docs_page
+
+    session = requests.Session()
+    pages = [
+        session.get(farm.url(f"/docs.google.com/{kind}/{i}"))
+        for i, kind in enumerate(["public", "login"])
+    ]
+    pool = CpuPool(workers)
+
+    def classify(i):
+        response = pages[i % len(pages)]
+        t0 = time.perf_counter()
+        pool.run(classify_google_docs_page, response.content, response.encoding, response.url)
+        return time.perf_counter() - t0
+
+    # 先啟動工作程序，不計入量測時間
+    classify(0)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=pool.workers * 2) as threads:
+        durations = list(threads.map(classify, range(iterations)))
+    elapsed = time.perf_counter() - start
+    pool.close()
+    result = _summary(iterations, elapsed, durations, "pages")
+    result["workers"] = pool.workers
+    return result
+
+
+def bench_google_probe(farm, iterations):
+    """
+    以 check_link 比較兩種 Google 連結的檢查：只取標頭 (與 Google 相同網址格式的文件) 與讀取整個頁面判斷
+    (/docs.google.com/public|login/<編號>)，公開與需要登入的各占一半
+    """
+    os.environ.setdefault("HOST_LATENCY_FILE", "")
+    import checkWeblink
+    from link_fetcher import LinkFetcher
+
+    fetcher = LinkFetcher(checkWeblink.create_session())
+    styles = {
+        "headers": lambda i: f"/docs.google.com/document/d/{'private' if i % 2 else 'public'}{i}/edit",
+        "page": lambda i: f"/docs.google.com/{'login' if i % 2 else 'public'}/{i}",
+    }
+    result = {"count": iterations}
+    for style, path in styles.items():
+        durations = []
+        broken = 0
+        for i in range(iterations):
+            link_info = {
+                "url": farm.url(path(i)), "text": "", "parent": "a", "parent_class": [], "parent_id": "", "type": "link",
+            }
+            t0 = time.perf_counter()
+            broken += len(checkWeblink.check_link(link_info, fetcher, timeout=10))
+            durations.append(time.perf_counter() - t0)
+        result[f"{style}_p50_latency_ms"] = round(percentile(durations, 50) * 1000, 3)
+        result[f"{style}_p95_latency_ms"] = round(percentile(durations, 95) * 1000, 3)
+        result[f"{style}_links_per_second"] = round(iterations / sum(durations), 2)
+        result[f"{style}_broken"] = broken
+    cpu_time, peak_rss_kb = _usage()
+    result["cpu_seconds"] = round(cpu_time, 3)
+    result["peak_rss_mb"] = round(peak_rss_kb / 1024, 1)
+    return result
+
+
+def bench_scripts(farm, script_kb, iterations=20):
+    """
+    比較解析含 script_kb KB 內嵌腳本的選單頁面時，掃描腳本網址與不掃描的耗時；
+    超過 MAX_SCRIPT_SCAN_SIZE 的部分不掃描，額外成本應有上限
+    """
+    from mock_webfarm import generate_menu_page
+    from page_parser import MAX_SCRIPT_SCAN_SIZE, parse_page_links
+
+    page = generate_menu_page(200, script_kb)
+    url = farm.url("/menu/200")
+    timings = {}
+    for scripts in (False, True):
+        durations = []
+        for _ in range(iterations):
+            t0 = time.perf_counter()
+            links_info = parse_page_links(page, "utf-8", url, True, scripts)
+            durations.append(time.perf_counter() - t0)
+        timings[scripts] = durations
+
+    result = _summary(iterations, sum(timings[True]), timings[True], "pages")
+    base = percentile(timings[False], 50)
+    scan = percentile(timings[True], 50)
+    result["script_kb"] = script_kb
+    result["scanned_kb"] = round(min(script_kb * 1024, MAX_SCRIPT_SCAN_SIZE) / 1024)
+    result["script_links"] = sum(1 for info in links_info if info.get("type") == "script_link")
+    result["p50_without_scripts_ms"] = round(base * 1000, 3)
+    result["overhead_percent"] = round((scan - base) / base * 100, 1) if base else None
+    return result
+
+
+def bench_sites(farm, site_count):
+    """測量 checkWebsite 的網站檢測，包含大型內容與緩慢回應"""
+    os.environ.setdefault("HOST_LATENCY_FILE", "")
+    import checkWebsite
+    from content_probe import ContentAssertions
+
+    urls = []
+    for i in range(site_count):
+        if i % 20 == 0:
+            urls.append(farm.url("/large/2000000"))
+        elif i % 25 == 0:
+            urls.append(farm.url("/drip/1"))
+        else:
+            urls.append(farm.url(f"/link/{i}"))
+    assertions = ContentAssertions(forbidden=["系統維護中"], max_body_size=1000000)
+
+    durations = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        for url in urls:
+            t0 = time.perf_counter()
+            checkWebsite.check_website(url, timeout=5, assertions=assertions)
+            durations.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - start
+    return _summary(site_count, elapsed, durations, "sites")
+
+
+def bench_aggregate(farm, site_count, iterations=20):
+    """
+    測量 checkWebsite 對 site_count 個網站的結果彙整：建立結果表、摘要與結束代碼、憑證門檻、
+    10 位收件者的統計與 Telegram 子表 (不實際連線，結果為固定亂數產生)
+    """
+    import random
+    from site_config import SiteConfig
+    from result_table import CERT_CRITICAL, CERT_WARNING, ResultTable
+
+    rng = random.Random(site_count)
+    config = SiteConfig.from_urls([f"https://site{i}.example.com/" for i in range(site_count)])
+    results, certs = [], []
+    for target in config.sites:
+        status = rng.choice(["online"] * 18 + ["timeout", "offline"])
+        results.append({
+            "url": target.url, "status": status, "status_code": 200 if status == "online" else None,
+            "response_time": 0.1, "error": None, "confirmed": rng.random() < 0.5,
+        })
+        if status == "online":
+            certs.append({
+                "hostname": target.host, "remaining_days": rng.choice([None, -1, 3, 10, 90]),
+                "warning_days": 14, "critical_days": 7,
+            })
+    groups = {f"recipient{k}@example.com": config.sites[k::10] for k in range(10)}
+
+    durations = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        table = ResultTable(config.sites, results, certs)
+        table.summary()
+        table.status()
+        table.certs_at_least(CERT_WARNING)
+        table.certs_at_least(CERT_CRITICAL)
+        table.rollup(groups)
+        table.filter(lambda target: target.telegram)
+        durations.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+    return _summary(site_count * iterations, elapsed, durations, "sites")
+
+
+def _import_time_ms(module):
+    """以 python -X importtime 量測載入模組的累計時間 (毫秒)"""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    for line in reversed(completed.stderr.splitlines()):
+        fields = [field.strip() for field in line.split("|")]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1]) / 1000
+    raise RuntimeError(f"找不到 {module} 的載入時間")
+
+
+def _loaded_lazy_modules(module):
+    """import 入口程式後已載入的 LAZY_MODULES"""
+    code = f"import sys, json, {module}; print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))"
+    completed = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    return json.loads(completed.stdout)
+
+
+def bench_startup(farm, repeats):
+    """
+    量測排程入口的啟動成本：各入口的載入時間 (與 IMPORT_BUDGET_MS 比較)、不應提早載入的模組，
+    以及 checkWebsite 檢測一個正常網站 (不寄信、不發通知) 從啟動到結束的時間
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    result = {"count": repeats}
+    for module, budget in IMPORT_BUDGET_MS.items():
+        import_ms = min(_import_time_ms(module) for _ in range(repeats))
+        result[f"{module}_import_ms"] = round(import_ms, 1)
+        result[f"{module}_import_budget_ms"] = budget
+        result[f"{module}_eager_modules"] = _loaded_lazy_modules(module)
+
+    env = dict(os.environ, HOST_LATENCY_FILE="")
+    durations = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        subprocess.run(
+            [sys.executable, os.path.join(here, "checkWebsite.py"), farm.url("/link/1")],
+            capture_output=True, check=True, env=env, cwd=here,
+        )
+        durations.append(time.perf_counter() - t0)
+    result["healthy_run_p50_ms"] = round(percentile(durations, 50) * 1000, 1)
+    result["healthy_run_min_ms"] = round(min(durations) * 1000, 1)
+    result["over_budget"] = [
+        module for module, budget in IMPORT_BUDGET_MS.items()
+        if result[f"{module}_import_ms"] > budget or result[f"{module}_eager_modules"]
+    ]
+    return result
+
+
+def run_mode(args):
+    """在子程序中執行單一模式並以 JSON 輸出結果"""
+    from mock_webfarm import MockWebFarm
+
+    # 檢查過程的日誌不列入量測
+    logging.disable(logging.CRITICAL)
+    status_mix = json.loads(args.status_mix) if args.status_mix else None
+    with MockWebFarm(latency=args.latency, status_mix=status_mix, https=args.https) as farm:
+        if args.run_mode == "links":
+            result = bench_links(farm, args.size)
+        elif args.run_mode == "google":
+            result = bench_google(farm, args.size)
+        elif args.run_mode == "google_pool":
+            result = bench_google_pool(farm, args.size)
+        elif args.run_mode == "google_probe":
+            result = bench_google_probe(farm, args.size)
+        elif args.run_mode == "sites":
+            result = bench_sites(farm, args.size)
+        elif args.run_mode == "scripts":
+            result = bench_scripts(farm, args.size)
+        elif args.run_mode == "startup":
+            result = bench_startup(farm, args.size)
+        elif args.run_mode == "aggregate":
+            result = bench_aggregate(farm, args.size)
+        else:
+            raise SystemExit(f"未知的模式: {args.run_mode}")
+    print(json.dumps(result))
+
+
+def spawn_mode(mode, size, args):
+    command = [
+        sys.executable, os.path.abspath(__file__),
+        "--run-mode", mode, "--size", str(size), "--latency", str(args.latency),
+    ]
+    if args.status_mix:
+        command += ["--status-mix", args.status_mix]
+    if args.https:
+        command.append("--https")
+    env = dict(os.environ)
+    if args.https:
+        # 設定 CA bundle 環境變數時 requests 會忽略 session.verify = False
+        env.pop("REQUESTS_CA_BUNDLE", None)
+        env.pop("CURL_CA_BUNDLE", None)
+    completed = subprocess.run(command, capture_output=True, text=True, env=env)
+    if completed.returncode != 0:
+        print(completed.stderr, file=sys.stderr)
+        return {"error": completed.stderr.strip().splitlines()[-1:]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_file):
+    """列出與先前結果相比的變化百分比"""
+    with open(baseline_file, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\n與 {baseline_file} ({baseline.get('commit')}) 比較:")
+    for name, metrics in results["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            continue
+        for key, value in metrics.items():
+            old_value = old.get(key)
+            if isinstance(value, (int, float)) and isinstance(old_value, (int, float)) and old_value:
+                change = (value - old_value) / old_value * 100
+                print(f"  {name:>14} {key:<22} {old_value:>12} -> {value:>12} ({change:+.1f}%)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="使用本地模擬網站進行離線效能測試")
+    parser.add_argument("--modes", default=",".join(DEFAULT_MODES), help="要執行的模式 (links,google,google_pool,google_probe,sites,scripts,startup,aggregate)")
+    parser.add_argument("--links", default="100,1000", help="links 模式的頁面連結數，以逗號分隔")
+    parser.add_argument("--google-iterations", type=int, default=200)
+    parser.add_argument("--sites", type=int, default=50, help="sites 模式的網站數")
+    parser.add_argument("--script-kb", default="64,512,4096", help="scripts 模式的內嵌腳本大小 (KB)，以逗號分隔")
+    parser.add_argument("--fleet", default="1000,10000", help="aggregate 模式的網站數，以逗號分隔")
+    parser.add_argument("--startup-repeats", type=int, default=5, help="startup 模式每項量測的重複次數")
+    parser.add_argument("--latency", type=float, default=0.0, help="模擬網站的平均延遲 (秒)")
+    parser.add_argument("--status-mix", help='狀態碼比例 JSON，例如 {"200": 0.9, "404": 0.1}')
+    parser.add_argument("--https", action="store_true", help="模擬網站使用自簽憑證的 HTTPS")
+    parser.add_argument("--output", default="bench_results.json", help="結果輸出檔")
+    parser.add_argument("--compare", help="與先前的結果檔比較")
+    # 子程序內部使用
+    parser.add_argument("--run-mode", help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """執行效能測試，有模式執行失敗或超出啟動預算時回傳 1 (有問題)"""
+    args = parse_args(argv)
+    if args.run_mode:
+        run_mode(args)
+        return 0
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "latency": args.latency,
+        "results": {},
+    }
+
+    for mode in args.modes.split(","):
+        if mode == "links":
+            runs = [("links", int(size)) for size in args.links.split(",")]
+        elif mode in ("google", "google_pool", "google_probe"):
+            runs = [(mode, args.google_iterations)]
+        elif mode == "sites":
+            runs = [("sites", args.sites)]
+        elif mode == "scripts":
+            runs = [("scripts", int(size)) for size in args.script_kb.split(",")]
+        elif mode == "startup":
+            runs = [("startup", args.startup_repeats)]
+        elif mode == "aggregate":
+            runs = [("aggregate", int(size)) for size in args.fleet.split(",")]
+        else:
+            print(f"略過未知的模式: {mode}")
+            continue
+
+        for name, size in runs:
+            key = f"{name}_{size}"
+            print(f"執行 {key}...")
+            results["results"][key] = spawn_mode(name, size, args)
+            print(f"  {json.dumps(results['results'][key], ensure_ascii=False)}")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n結果已儲存到 {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+    problems = [key for key, result in results["results"].items() if "error" in result or result.get("over_budget")]
+    if problems:
+        print(f"\n執行失敗或超出預算: {', '.join(problems)}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
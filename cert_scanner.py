@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+TLS 憑證掃描
+平行掃描多個 HTTPS 主機，收集憑證到期日、憑證鏈是否有效、主機名稱是否相符、
+TLS 通訊協定版本與 OCSP stapling (需安裝 pyOpenSSL)；結果依主機與 IP 快取，
+在憑證接近到期前都直接使用快取，重複掃描幾乎不需要連線
+
+使用方法:
+  python cert_scanner.py www.nknush.kh.edu.tw zerojudge.tw:443
+  python cert_scanner.py --cafile test_ca.pem 127.0.0.1:8443
+"""
+
+import os
+import ssl
+import sys
+import json
+import time
+import atexit
+import select
+import socket
+import argparse
+import tempfile
+import threading
+import logging
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import instrumentation
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_FILE = ".cert_cache.json"
+# 憑證到期前多少天開始重新掃描，讓提早更新的憑證能在發出警告前被發現
+DEFAULT_REFRESH_DAYS = 21
+# 憑證有問題 (憑證鏈無效、名稱不符) 時快取的最長時間
+INVALID_CACHE_SECONDS = 24 * 3600
+WEAK_PROTOCOLS = {"SSLv2", "SSLv3", "TLSv1", "TLSv1.1"}
+CERT_TIME_FORMAT = "%b %d %H:%M:%S %Y %Z"
+DATETIME_FIELDS = ("expiry_date", "not_before")
+
+
+def parse_host(value, default_port=443):
+    """將 host 或 host:port 轉成 (host, port)"""
+    if value.startswith("[") and "]" in value:
+        host, _, rest = value[1:].partition("]")
+        return host, int(rest[1:]) if rest.startswith(":") else default_port
+    if value.count(":") == 1:
+        host, port = value.split(":")
+        return host, int(port)
+    return value, default_port
+
+
+def https_host(url):
+    """HTTPS 網址的 (主機, 連接埠)，其他網址回傳 None"""
+    parsed = urlparse(url)
+    if parsed.scheme != "https" or not parsed.hostname:
+        return None
+    try:
+        return parsed.hostname, parsed.port or 443
+    except ValueError:
+        return None
+
+
+def _decode_der(der):
+    """
+    解析未通過驗證的憑證 (getpeercert() 此時不會回傳內容)
+    有安裝 cryptography 時使用它，否則使用標準函式庫的憑證解碼
+    """
+    try:
+        from cryptography import x509
+    except ImportError:
+        x509 = None
+
+    if x509 is not None:
+        cert = x509.load_der_x509_certificate(der)
+        try:
+            names = cert.extensions.get_extension_for_class(x509.SubjectAlternativeName).value
+            alt_names = [("DNS", name) for name in names.get_values_for_type(x509.DNSName)]
+            alt_names += [("IP Address", str(ip)) for ip in names.get_values_for_type(x509.IPAddress)]
+        except x509.ExtensionNotFound:
+            alt_names = []
+        common_names = [attr.value for attr in cert.subject.get_attributes_for_oid(x509.NameOID.COMMON_NAME)]
+        return {
+            "notAfter": cert.not_valid_after.strftime("%b %d %H:%M:%S %Y GMT"),
+            "notBefore": cert.not_valid_before.strftime("%b %d %H:%M:%S %Y GMT"),
+            "subject": tuple(((("commonName", name),) for name in common_names)),
+            "issuer": ((("commonName", cert.issuer.rfc4514_string()),),),
+            "subjectAltName": tuple(alt_names),
+        }
+
+    decode = getattr(ssl._ssl, "_test_decode_cert", None)
+    if decode is None:
+        return {}
+    # 只能從檔案解碼
+    with tempfile.NamedTemporaryFile("w", suffix=".pem", delete=False) as f:
+        f.write(ssl.DER_cert_to_PEM_cert(der))
+    try:
+        return decode(f.name)
+    finally:
+        os.remove(f.name)
+
+
+def _name_field(name, field):
+    for rdn in name or ():
+        for key, value in rdn:
+            if key == field:
+                return value
+    return None
+
+
+def _match_pattern(pattern, hostname):
+    """比對憑證名稱，萬用字元只能出現在最左邊的一段"""
+    pattern = pattern.lower().rstrip(".")
+    hostname = hostname.lower().rstrip(".")
+    if pattern.startswith("*."):
+        head, _, tail = hostname.partition(".")
+        return bool(head) and tail == pattern[2:]
+    return pattern == hostname
+
+
+def hostname_matches(cert, hostname):
+    """依 subjectAltName (沒有時使用 commonName) 判斷憑證是否適用於此主機"""
+    alt_names = cert.get("subjectAltName", ())
+    dns_names = [value for key, value in alt_names if key == "DNS"]
+    ip_names = [value for key, value in alt_names if key == "IP Address"]
+    if hostname in ip_names:
+        return True
+    if dns_names:
+        return any(_match_pattern(name, hostname) for name in dns_names)
+    common_name = _name_field(cert.get("subject"), "commonName")
+    return bool(common_name) and _match_pattern(common_name, hostname)
+
+
+def check_ocsp_stapling(hostname, ip, port, timeout):
+    """以 pyOpenSSL 要求 OCSP stapling，回傳是否有附上 OCSP 回應；未安裝 pyOpenSSL 時回傳 None"""
+    try:
+        from OpenSSL import SSL
+    except ImportError:
+        return None
+
+    stapled = {}
+
+    def ocsp_callback(connection, ocsp_data, data):
+        stapled["data"] = ocsp_data
+        return True
+
+    context = SSL.Context(SSL.TLS_CLIENT_METHOD)
+    context.set_ocsp_client_callback(ocsp_callback)
+    with socket.create_connection((ip, port), timeout=timeout) as sock:
+        connection = SSL.Connection(context, sock)
+        connection.set_tlsext_host_name(hostname.encode("idna"))
+        connection.request_ocsp()
+        connection.set_connect_state()
+        while True:
+            try:
+                connection.do_handshake()
+                break
+            except SSL.WantReadError:
+                if not select.select([sock], [], [], timeout)[0]:
+                    raise socket.timeout("OCSP 檢查逾時")
+    return bool(stapled.get("data"))
+
+
+def remaining_days(expiry_date):
+    """到期日距今的天數 (已過期為負數)"""
+    return (expiry_date - datetime.utcnow()).days
+
+
+def scan_host(hostname, port=443, timeout=10, cafile=None, ip=None):
+    """
+    連線到主機並檢查憑證，回傳 dict:
+    expiry_date / not_before / remaining_days、issuer、chain_valid / chain_error、
+    hostname_match、protocol、cipher、ocsp_stapled (None 表示未檢查)、error
+    """
+    result = {
+        "hostname": hostname,
+        "port": port,
+        "ip": ip,
+        "expiry_date": None,
+        "not_before": None,
+        "remaining_days": None,
+        "issuer": None,
+        "chain_valid": None,
+        "chain_error": None,
+        "hostname_match": None,
+        "protocol": None,
+        "cipher": None,
+        "ocsp_stapled": None,
+        "error": None,
+    }
+    try:
+        if ip is None:
+            ip = result["ip"] = socket.getaddrinfo(hostname, port, type=socket.SOCK_STREAM)[0][4][0]
+
+        # 先以驗證憑證鏈的方式連線，主機名稱另外比對，兩者才能分別回報
+        context = ssl.create_default_context(cafile=cafile)
+        context.check_hostname = False
+        cert = None
+        try:
+            with socket.create_connection((ip, port), timeout=timeout) as sock:
+                with context.wrap_socket(sock, server_hostname=hostname) as ssock:
+                    cert = ssock.getpeercert()
+                    result["protocol"] = ssock.version()
+                    result["cipher"] = ssock.cipher()[0]
+            result["chain_valid"] = True
+        except ssl.SSLCertVerificationError as e:
+            result["chain_valid"] = False
+            result["chain_error"] = e.verify_message or str(e)
+
+        if cert is None:
+            # 憑證鏈無效時改用不驗證的連線取得憑證內容，並允許舊版通訊協定以便回報
+            insecure = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+            insecure.check_hostname = False
+            insecure.verify_mode = ssl.CERT_NONE
+            try:
+                insecure.minimum_version = ssl.TLSVersion.MINIMUM_SUPPORTED
+            except (ValueError, ssl.SSLError):
+                pass
+            with socket.create_connection((ip, port), timeout=timeout) as sock:
+                with insecure.wrap_socket(sock, server_hostname=hostname) as ssock:
+                    cert = _decode_der(ssock.getpeercert(binary_form=True))
+                    result["protocol"] = ssock.version()
+                    result["cipher"] = ssock.cipher()[0]
+
+        if cert.get("notAfter"):
+            result["expiry_date"] = datetime.strptime(cert["notAfter"], CERT_TIME_FORMAT)
+            result["remaining_days"] = remaining_days(result["expiry_date"])
+        if cert.get("notBefore"):
+            result["not_before"] = datetime.strptime(cert["notBefore"], CERT_TIME_FORMAT)
+        result["issuer"] = _name_field(cert.get("issuer"), "organizationName") or _name_field(
+            cert.get("issuer"), "commonName"
+        )
+        if cert:
+            result["hostname_match"] = hostname_matches(cert, hostname)
+
+        try:
+            result["ocsp_stapled"] = check_ocsp_stapling(hostname, ip, port, timeout)
+        except Exception:
+            # OCSP 檢查失敗不影響其他結果
+            result["ocsp_stapled"] = None
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def certificate_issues(result, warning_days=14, critical_days=7):
+    """將掃描結果轉成問題說明清單，沒有問題時回傳空清單"""
+    if result["error"]:
+        return [f"憑證檢查失敗: {result['error']}"]
+
+    issues = []
+    remaining = result["remaining_days"]
+    if remaining is not None:
+        if remaining <= 0:
+            issues.append(f"憑證已過期 ({result['expiry_date']:%Y-%m-%d})")
+        elif remaining <= critical_days:
+            issues.append(f"憑證將於 {remaining} 天後到期 (緊急)")
+        elif remaining <= warning_days:
+            issues.append(f"憑證將於 {remaining} 天後到期")
+    if result["chain_valid"] is False:
+        issues.append(f"憑證鏈無效: {result['chain_error']}")
+    if result["hostname_match"] is False:
+        issues.append(f"憑證名稱與主機 {result['hostname']} 不符")
+    if result["protocol"] in WEAK_PROTOCOLS:
+        issues.append(f"使用過舊的通訊協定 {result['protocol']}")
+    return issues
+
+
+class CertScanner:
+    """平行掃描多個主機，結果依主機與 IP 快取並可存檔供下次執行使用"""
+
+    def __init__(
+        self,
+        cache_file=None,
+        timeout=10,
+        workers=16,
+        cafile=None,
+        refresh_days=DEFAULT_REFRESH_DAYS,
+    ):
+        self.cache_file = cache_file
+        self.timeout = timeout
+        self.workers = workers
+        self.cafile = cafile
+        self.refresh_days = refresh_days
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._changed = False
+        self._load()
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        kwargs.setdefault("cache_file", os.getenv("CERT_CACHE_FILE", DEFAULT_CACHE_FILE))
+        return cls(**kwargs)
+
+    def _load(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"無法讀取憑證快取 {self.cache_file}: {e}")
+            return
+        now = time.time()
+        for key, entry in entries.items():
+            if entry.get("cache_until", 0) <= now:
+                continue
+            result = entry["result"]
+            for field in DATETIME_FIELDS:
+                if result.get(field):
+                    result[field] = datetime.fromisoformat(result[field])
+            self._cache[key] = entry
+
+    def save(self):
+        if not self.cache_file or not self._changed:
+            return
+        with self._lock:
+            entries = {}
+            for key, entry in self._cache.items():
+                result = dict(entry["result"])
+                for field in DATETIME_FIELDS:
+                    if result.get(field):
+                        result[field] = result[field].isoformat()
+                entries[key] = {"cache_until": entry["cache_until"], "result": result}
+        tmp_file = f"{self.cache_file}.tmp"
+        try:
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(tmp_file, self.cache_file)
+            self._changed = False
+        except OSError as e:
+            logger.warning(f"無法寫入憑證快取 {self.cache_file}: {e}")
+
+    def _cache_until(self, result):
+        """正常的憑證快取到到期前 refresh_days 天，有問題的憑證最多快取一天，失敗不快取"""
+        if result["error"] or result["expiry_date"] is None:
+            return None
+        expiry = result["expiry_date"] - timedelta(days=self.refresh_days)
+        until = (expiry - datetime.utcnow()).total_seconds() + time.time()
+        if result["chain_valid"] is False or result["hostname_match"] is False:
+            until = min(until, time.time() + INVALID_CACHE_SECONDS)
+        return until if until > time.time() else None
+
+    def scan(self, hostname, port=443):
+        """掃描單一主機，快取仍有效時直接回傳快取結果 (cached 為 True)"""
+        try:
+            ip = socket.getaddrinfo(hostname, port, type=socket.SOCK_STREAM)[0][4][0]
+        except OSError as e:
+            result = scan_host(hostname, port, self.timeout, self.cafile, ip=None)
+            result["error"] = result["error"] or str(e)
+            return result
+
+        key = f"{hostname}:{port}@{ip}"
+        with self._lock:
+            entry = self._cache.get(key)
+        if entry is not None and entry["cache_until"] > time.time():
+            instrumentation.count("cert_cache_hits")
+            # 快取可能保留數週，剩餘天數 (以及由此判斷的警告等級) 依到期日重新計算
+            result = dict(entry["result"], cached=True)
+            result["remaining_days"] = remaining_days(result["expiry_date"])
+            return result
+
+        with instrumentation.stage("cert_scan"):
+            result = scan_host(hostname, port, self.timeout, self.cafile, ip=ip)
+        until = self._cache_until(result)
+        if until is not None:
+            with self._lock:
+                self._cache[key] = {"cache_until": until, "result": result}
+                self._changed = True
+        return dict(result, cached=False)
+
+    def scan_many(self, hosts):
+        """平行掃描多個 (主機, 連接埠)，回傳 {(主機, 連接埠): 結果}"""
+        hosts = list(dict.fromkeys(hosts))
+        if not hosts:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(hosts))) as pool:
+            results = pool.map(lambda host: self.scan(*host), hosts)
+            return dict(zip(hosts, results))
+
+
+_default_scanner = None
+
+
+def get_cert_scanner():
+    """取得共用的憑證掃描器，程式結束時自動儲存快取"""
+    global _default_scanner
+    if _default_scanner is None:
+        _default_scanner = CertScanner.from_env()
+        atexit.register(_default_scanner.save)
+    return _default_scanner
+
+
+def main():
+    parser = argparse.ArgumentParser(description="掃描 HTTPS 主機的 TLS 憑證")
+    parser.add_argument("hosts", nargs="+", help="主機名稱，可加上 :port")
+    parser.add_argument("--cafile", help="額外信任的 CA 憑證 (例如本地測試伺服器的自簽憑證)")
+    parser.add_argument("--cache-file", default=os.getenv("CERT_CACHE_FILE", DEFAULT_CACHE_FILE))
+    parser.add_argument("--no-cache", action="store_true", help="不使用快取")
+    parser.add_argument("--warning-days", type=int, default=14)
+    parser.add_argument("--critical-days", type=int, default=7)
+    args = parser.parse_args()
+
+    scanner = CertScanner(cache_file=None if args.no_cache else args.cache_file, cafile=args.cafile)
+    results = scanner.scan_many(parse_host(host) for host in args.hosts)
+    exit_code = 0
+    for (host, port), result in results.items():
+        issues = certificate_issues(result, args.warning_days, args.critical_days)
+        expiry = f"{result['expiry_date']:%Y-%m-%d}" if result["expiry_date"] else "未知"
+        stapled = {True: "有", False: "無", None: "未檢查"}[result["ocsp_stapled"]]
+        print(
+            f"{host}:{port} ({result['ip']}) 到期日 {expiry}, 剩餘 {result['remaining_days']} 天, "
+            f"{result['protocol']}, OCSP stapling: {stapled}" + (" [快取]" if result.get("cached") else "")
+        )
+        for issue in issues:
+            print(f"  ⚠️ {issue}")
+        if issues:
+            exit_code = 1
+    scanner.save()
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
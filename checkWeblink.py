@@ -1,17 +1,87 @@
 import requests
-from bs4 import BeautifulSoup
 import urllib.parse
 import time
 import urllib3
 import ssl
-import re
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from datetime import datetime
-import socket
 import os, sys
-import getpass
+import argparse
+import logging
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+
+from runtime_env import format_runner_info, get_runtime_info, prefetch_runtime_info
+from mail_sender import get_mail_sender, shutdown_mail_sender
+from metrics import registry as metrics, add_arguments as add_metrics_arguments, classify_broken_link
+from instrumentation import (
+    instrumentation,
+    add_arguments as add_instrumentation_arguments,
+    setup_from_args as setup_instrumentation,
+    finish_from_args as finish_instrumentation,
+)
+from log_setup import (
+    ProgressReporter,
+    add_arguments as add_logging_arguments,
+    setup_from_args as setup_logging,
+    shutdown_logging,
+)
+from site_config import DEFAULT_CONFIG_FILE, SiteConfig, load_config
+from link_fetcher import FETCH_DEADLINE, MAX_BODY_SIZE, HostThrottle, LinkFetcher
+from host_latency import HostUnavailable, get_host_latency
+from page_parser import (
+    MAX_SCRIPT_SCAN_SIZE, RESOURCE_LABELS, classify_google_docs_page, is_google_docs_link, parse_page_links,
+    scan_script_urls, script_link_entries,
+)
+from cpu_pool import cpu_pool
+from google_probes import probe_for as google_probe_for
+from cert_scanner import certificate_issues, get_cert_scanner, https_host
+from crawl_seed import CrawlSeeder, CrawlState, DEFAULT_STATE_FILE
+from link_index import DEFAULT_INDEX_FILE, LinkIndex, links_fingerprint
+from link_priority import prioritize
+from run_status import (
+    DEGRADED, FAILED, HEALTHY, STATUS_NAMES, add_arguments as add_output_arguments, finish as finish_run, run_main,
+    worst,
+)
+from link_shards import (
+    DEFAULT_CHECKPOINT_DIR, HashRing, ShardCheckpoint, checkpoint_path, link_host,
+    merge_checkpoints, parse_shard, remove_checkpoints,
+)
+
+# 以命令列指定網址且未加 --recipient 時的收件者
+DEFAULT_RECIPIENT = os.getenv('REPORT_RECIPIENT', '555@tea.nknush.kh.edu.tw')
+# 每個連結檢查之間的延遲 (秒)，避免對目標網站發送過多請求
+REQUEST_DELAY = 0.5
+# 同時檢查的連結數 (同一主機仍依 REQUEST_DELAY 間隔)
+LINK_CONCURRENCY = 8
+# 是否一併檢查圖片、腳本、樣式表、內嵌框架與影音 (設定檔的 assets 可個別關閉)
+CHECK_ASSETS = True
+# 是否掃描內嵌腳本與其引用的 JSON 中的網址 (設定檔的 scripts 可個別關閉)
+SCAN_SCRIPTS = True
+# 每個頁面最多讀取幾個腳本中引用的 JSON 檔 (例如選單資料)
+MAX_JSON_FETCHES = 5
+# 依各主機過去的延遲調整逾時，並在主機連續連線失敗後略過其餘連結
+ADAPTIVE_TIMEOUTS = True
+# 整次執行的截止時間 (time.monotonic)，由 --time-budget 設定；到期後其餘連結延後檢查
+RUN_DEADLINE = None
+# 本次執行中無法存取的頁面，目標主頁無法存取時結束代碼為失敗
+UNREACHABLE_PAGES = set()
+
+# 只需確認存在的資源以 HEAD 檢查，不支援 HEAD 的伺服器改用 GET
+HEAD_PROBE_TYPES = {'image', 'script', 'stylesheet'}
+HEAD_UNSUPPORTED_STATUSES = {405, 501}
+# 影音檔可能很大，只要求第一個位元組；416 表示檔案存在但為空
+RANGE_PROBE_HEADERS = {'Range': 'bytes=0-0'}
+MEDIA_OK_STATUSES = (200, 206, 416)
+# 需要判斷 Google 文件權限的資源類型 (連結與嵌入的表單、簡報)
+GOOGLE_CHECK_TYPES = {'link', 'iframe', 'script_link'}
+# 報告中依資源類型分組的順序與名稱
+REPORT_GROUPS = {**RESOURCE_LABELS, 'certificate': '憑證'}
+# 延後檢查的項目 (連結或整個頁面) 的名稱
+DEFERRED_LABELS = {**RESOURCE_LABELS, 'page': '頁面'}
+# 報告中最多列出的延後檢查項目數
+MAX_DEFERRED_REPORTED = 50
+
+logger = logging.getLogger("checkWeblink")
 
 # 停用 SSL 警告訊息
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -24,178 +94,642 @@ except AttributeError:
     # 如果沒有 PyOpenSSL
     pass
 
-def is_google_docs_link(url):
-    """判斷是否為 Google 文件連結"""
-    google_patterns = [
-        r'docs\.google\.com',
-        r'drive\.google\.com',
-        r'sheets\.google\.com',
-        r'slides\.google\.com',
-        r'forms\.google\.com'
-    ]
-    return any(re.search(pattern, url) for pattern in google_patterns)
-
 def check_google_docs_permission(response):
     """檢查 Google 文件是否需要權限"""
-    # 檢查是否有登入頁面或權限提示的關鍵詞
-    permission_indicators = [
-        'You need permission',
-        'Request access',
-        '需要權限',
-        '請求存取權限'
-    ]
-    
-    # 這些詞可能出現在正常可訪問的文檔中，但也可能出現在登入頁面
-    # 所以我們需要更嚴格地判斷
-    ambiguous_indicators = [
-        'Sign in',
-        'Google Account', 
-        '登入',
-        'Google 帳戶'
-    ]
-    
-    soup = BeautifulSoup(response.text, 'html.parser')
-    page_text = soup.get_text().lower()
-    
-    # 首先檢查明確的權限指示詞
-    for indicator in permission_indicators:
-        if indicator.lower() in page_text:
-            return False, f"需要權限: {indicator}"
-    
-    # 檢查具有表單特性的元素數量，登入頁面通常有表單
-    login_forms = soup.find_all('form')
-    if login_forms and len(login_forms) >= 1:
-        # 查看表單是否包含密碼欄位，這是登入頁面的特徵
-        password_fields = soup.find_all('input', {'type': 'password'})
-        if password_fields:
-            # 檢查模糊指示詞
-            for indicator in ambiguous_indicators:
-                if indicator.lower() in page_text:
-                    return False, f"疑似需要登入: 發現登入表單和指示詞 '{indicator}'"
-    
-    # 檢查是否有顯示 Google 文件的內容（如果是公開文件應該有這些特徵）
-    content_indicators = ["viewer", "document", "spreadsheet", "presentation", "folder contents"]
-    if is_google_docs_link(response.url) and any(indicator in page_text for indicator in content_indicators):
-        return True, "文件可公開存取"
-    
-    # 檢查文件內容區塊是否存在
-    content_divs = soup.find_all('div', {'role': 'presentation'}) or \
-                   soup.find_all('div', {'class': 'ndfHFb-c4YZDc-cYSp0e-DARUcf'}) or \
-                   soup.find_all('div', {'class': 'drive-viewer-content'}) or \
-                   soup.find_all('div', {'id': 'drive-viewer-content'})
-    
-    if content_divs:
-        return True, "發現文件內容區塊，應該可以存取"
-        
-    # 額外檢查：Drive 文件夾專用檢查
-    if 'drive.google.com/drive/folders' in response.url:
-        # 檢查是否有文件列表的特徵
-        file_list_indicators = ["name", "last modified", "file", "folder", "共用", "檔案", "資料夾", "最後修改"]
-        if any(indicator in page_text.lower() for indicator in file_list_indicators):
-            return True, "發現資料夾內容列表，應該可以存取"
-    
-    # 保守結論：我們不確定，但假設可能可以訪問
-    for indicator in ambiguous_indicators:
-        if indicator.lower() in page_text:
-            return True, f"可能需要登入但看起來可以部分存取 (含有'{indicator}'但未發現明確權限阻擋)"
-            
-    return True, "看起來可以存取"
+    return classify_google_docs_page(response.content, response.encoding, response.url)
+
+def create_session():
+    """建立連結檢查共用的 Session (停用 SSL 驗證並模擬瀏覽器)"""
+    session = requests.Session()
+    session.verify = False  # 停用 SSL 驗證
+    # 設定 User-Agent 模擬瀏覽器，避免被阻擋
+    session.headers.update({
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.127 Safari/537.36'
+    })
+    return session
+
+def create_fetcher(session, target=None):
+    """
+    依目標設定的內容大小上限 (max_body_size) 與總時限 (deadline) 建立 LinkFetcher，
+    並共用主機延遲紀錄 (逾時調整與斷路器)
+    """
+    options = target.options if target is not None else {}
+    return LinkFetcher(
+        session,
+        max_body_size=options.get('max_body_size', MAX_BODY_SIZE),
+        deadline=options.get('deadline', FETCH_DEADLINE),
+        latency=get_host_latency() if ADAPTIVE_TIMEOUTS else None)
 
-def check_links(url):
+def extract_links(url, target=None, session=None):
+    """
+    取得頁面並擷取所有連結，已依 target 的 include/exclude 規則過濾
+    無法存取頁面時回傳 None
+    """
     try:
-        print(f"正在連接網站：{url}...")
+        logger.info(f"正在連接網站：{url}...")
         # 建立自訂的 Session，設定特定的 SSL 選項
-        session = requests.Session()
-        session.verify = False  # 停用 SSL 驗證
-        # 設定 User-Agent 模擬瀏覽器，避免被阻擋
-        session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.127 Safari/537.36'
-        })
+        if session is None:
+            session = create_session()
         
-        response = session.get(url, timeout=10)
+        fetcher = create_fetcher(session, target)
+        with instrumentation.stage('fetch_root'):
+            response, result = fetcher.fetch(url, timeout=10, keep_body=True)
         response.raise_for_status()
-        print("成功連接網站！正在解析頁面...")
+        if result['body'] is None:
+            raise ValueError(fetcher.limit_issue(result) or fetcher.redirect_issue(result))
+        logger.debug("成功連接網站！正在解析頁面...")
     except Exception as e:
-        print(f"無法存取主頁面 {url}，錯誤：{e}")
+        logger.error(f"無法存取主頁面 {url}，錯誤：{e}")
+        UNREACHABLE_PAGES.add(url)
+        return None
+
+    # 解析與擷取連結在程序池中進行，直接傳送未解碼的內容
+    options = target.options if target is not None else {}
+    # 命令列關閉時不論設定檔為何都不檢查
+    assets = CHECK_ASSETS and options.get('assets', True)
+    scripts = SCAN_SCRIPTS and options.get('scripts', True)
+    with instrumentation.stage('parse'):
+        links_info = cpu_pool.run(parse_page_links, result['body'], response.encoding, url, assets, scripts)
+    if scripts:
+        links_info.extend(scan_referenced_json(links_info, url, session))
+
+    # 依設定的 include/exclude 規則過濾連結 (規則已預先編譯成單一正規表示式)
+    if target is not None:
+        total_links = len(links_info)
+        links_info = [info for info in links_info if target.allows(info['url'])]
+        if len(links_info) != total_links:
+            logger.info(f"依設定規則略過 {total_links - len(links_info)} 個連結")
+    return links_info
+
+def scan_referenced_json(links_info, page_url, session, timeout=10):
+    """
+    讀取腳本中引用的 JSON 檔 (例如以 JavaScript 產生的選單資料)，掃描其中的網址，
+    回傳尚未列入 links_info 的項目；每頁最多讀取 MAX_JSON_FETCHES 個檔案，每個最多 MAX_SCRIPT_SCAN_SIZE 位元組
+    """
+    json_urls = [
+        info['url'] for info in links_info
+        if info.get('type') == 'script_link' and urllib.parse.urlparse(info['url']).path.endswith('.json')
+    ][:MAX_JSON_FETCHES]
+    if not json_urls:
         return []
+    fetcher = LinkFetcher(
+        session,
+        max_body_size=MAX_SCRIPT_SCAN_SIZE,
+        latency=get_host_latency() if ADAPTIVE_TIMEOUTS else None)
+    known = {info['url'] for info in links_info}
+    known.add(page_url)
+    entries = []
+    with instrumentation.stage('script_json'):
+        for json_url in json_urls:
+            try:
+                response, result = fetcher.fetch(json_url, timeout=timeout, keep_body=True)
+            except (requests.exceptions.RequestException, HostUnavailable) as e:
+                # JSON 本身是否失效由連結檢查回報，這裡只略過掃描
+                logger.debug(f"無法讀取腳本引用的 JSON {json_url}: {e}")
+                continue
+            if response.status_code != 200 or result['body'] is None:
+                continue
+            urls = cpu_pool.run(scan_script_urls, result['body'], result['final_url'])
+            entries.extend(script_link_entries(urls, page_url, known))
+    if entries:
+        logger.info(f"從腳本引用的 JSON 找到 {len(entries)} 個網址")
+    return entries
 
-    soup = BeautifulSoup(response.text, 'html.parser')
-    # 擷取所有連結及其文字內容
-    links_info = []
-    for a in soup.find_all('a', href=True):
-        links_info.append({
-            'href': a['href'],
-            'text': a.get_text(strip=True) or "[無文字]",
-            'parent': str(a.parent.name),
-            'parent_class': a.parent.get('class', []),
-            'parent_id': a.parent.get('id', '')
-        })
-    
-    base_url = url
+def _broken_entry(link_info, **issue):
+    """失效連結的詳細資訊：連結、問題、顯示文字、父元素與所在頁面"""
+    return {
+        'url': link_info['url'],
+        **issue,
+        'text': link_info['text'],
+        'parent': link_info['parent'],
+        'parent_class': link_info['parent_class'],
+        'parent_id': link_info['parent_id'],
+        'page': link_info.get('page'),
+        'resource_type': link_info.get('type', 'link'),
+    }
+
+def probe_resource(link_info, fetcher, timeout, keep_body=False):
+    """
+    依資源類型選擇最省的請求方式，回傳 (response, 結果, 視為正常的狀態碼)
+    圖片、腳本與樣式表只送 HEAD (伺服器不支援時改用 GET)，影音以 Range 只要求第一個位元組，
+    連結與內嵌框架使用 GET (只有 Google 文件會讀取內容)
+    """
+    url = link_info['url']
+    resource_type = link_info.get('type', 'link')
+    if resource_type == 'media':
+        response, result = fetcher.fetch(url, timeout=timeout, headers=RANGE_PROBE_HEADERS)
+        return response, result, MEDIA_OK_STATUSES
+
+    method = 'HEAD' if resource_type in HEAD_PROBE_TYPES else 'GET'
+    response, result = fetcher.fetch(url, timeout=timeout, method=method, keep_body=keep_body)
+    if method == 'HEAD' and response.status_code in HEAD_UNSUPPORTED_STATUSES:
+        response, result = fetcher.fetch(url, timeout=timeout, keep_body=keep_body)
+    return response, result, (200,)
+
+def check_link(link_info, fetcher, timeout):
+    """檢查單一連結或資源，回傳發現的問題清單 (沒有問題時為空清單)"""
+    absolute_link = link_info['url']
     broken_links_info = []
-    
-    print(f"找到 {len(links_info)} 個連結，開始檢查...")
-    for i, link_info in enumerate(links_info, 1):
-        link = link_info['href']
-        absolute_link = urllib.parse.urljoin(base_url, link)
-        print(f"[{i}/{len(links_info)}] 檢查: {absolute_link} (顯示文字: {link_info['text']})")
-        try:
-            # 使用同一個 session 物件
-            link_response = session.get(absolute_link, timeout=5)
-            
-            # 針對 Google 文件連結特殊處理
-            if is_google_docs_link(absolute_link):
-                print("  檢測到 Google 文件連結，檢查權限...")
-                is_accessible, message = check_google_docs_permission(link_response)
-                if not is_accessible:
-                    print(f"⚠️ Google 文件需要權限: {absolute_link} ({message})")
-                    broken_links_info.append({
-                        'url': absolute_link,
-                        'google_docs_issue': True,
-                        'permission_message': message,
-                        'text': link_info['text'],
-                        'parent': link_info['parent'],
-                        'parent_class': link_info['parent_class'],
-                        'parent_id': link_info['parent_id']
-                    })
+    try:
+        # 使用同一個 session 物件，只有 Google 文件 (連結或內嵌框架) 需要判斷權限
+        is_google = (link_info.get('type', 'link') in GOOGLE_CHECK_TYPES
+                     and is_google_docs_link(absolute_link))
+        # 表單、文件、試算表、簡報與 Drive 檔案只取標頭，其餘 Google 網址讀取頁面判斷 (見 google_probes.py)
+        google_probe = google_probe_for(absolute_link) if is_google else None
+        with instrumentation.stage('link_request'):
+            if google_probe is not None:
+                link_response, result = google_probe.fetch(fetcher, absolute_link, timeout)
+                ok_statuses = (200,)
+                instrumentation.count('google_header_probes')
+            else:
+                link_response, result, ok_statuses = probe_resource(
+                    link_info, fetcher, timeout, keep_body=is_google)
+        instrumentation.count('links_checked')
+        instrumentation.count('redirect_hops', result['hops'])
+        if result['cached']:
+            instrumentation.count('redirect_cache_hits')
+
+        # 轉址鏈過長或形成迴圈時另外列為效能問題
+        redirect_issue = fetcher.redirect_issue(result)
+        if redirect_issue:
+            logger.warning(redirect_issue, extra={'fields': {'url': absolute_link, 'class': 'redirect'}})
+            broken_links_info.append(_broken_entry(
+                link_info,
+                redirect_issue=redirect_issue,
+                redirect_hops=result['hops'],
+                final_url=result['final_url']))
+
+        # 內容過大或回應過慢也是獨立的問題類型
+        limit_issue = fetcher.limit_issue(result)
+        if result['loop'] or result['too_many']:
+            logger.debug(f"轉址未到達最終頁面，略過內容檢查: {absolute_link}")
+        elif limit_issue:
+            logger.warning(f"{limit_issue}: {absolute_link}",
+                           extra={'fields': {'url': absolute_link, 'class': result['outcome']}})
+            broken_links_info.append(_broken_entry(
+                link_info, limit_issue=limit_issue, result_class=result['outcome']))
+        # 針對 Google 文件連結特殊處理 (只取標頭時無法判斷的，例如已刪除的文件，依狀態碼檢查)
+        elif is_google and (google_probe is None or google_probe.decides(link_response, result)):
+            with instrumentation.stage('google_classify'):
+                if google_probe is not None:
+                    is_accessible, message = google_probe.classify(link_response, result)
                 else:
-                    print(f"✓ Google 文件可訪問 ({message})")
-            # 一般連結檢查
-            elif link_response.status_code != 200:
-                print(f"⚠️ 失效連結：{absolute_link} (狀態碼：{link_response.status_code})")
-                # 儲存失效連結的詳細資訊
-                broken_links_info.append({
-                    'url': absolute_link,
-                    'status_code': link_response.status_code,
-                    'text': link_info['text'],
-                    'parent': link_info['parent'],
-                    'parent_class': link_info['parent_class'],
-                    'parent_id': link_info['parent_id']
-                })
+                    is_accessible, message = cpu_pool.run(
+                        classify_google_docs_page, result['body'], link_response.encoding, link_response.url)
+            if not is_accessible:
+                logger.warning(f"Google 文件需要權限: {absolute_link} ({message})",
+                               extra={'fields': {'url': absolute_link, 'class': 'google_permission'}})
+                broken_links_info.append(_broken_entry(
+                    link_info, google_docs_issue=True, permission_message=message))
             else:
-                print(f"✓ 連結正常")
-            # 加入短暫延遲，避免對目標網站發送過多請求
-            time.sleep(0.5)
-        except Exception as e:
-            print(f"❌ 檢查連結 {absolute_link} 時發生錯誤：{e}")
-            # 將異常連結也加入失效連結清單
-            broken_links_info.append({
-                'url': absolute_link,
-                'error': str(e),
-                'text': link_info['text'],
-                'parent': link_info['parent'],
-                'parent_class': link_info['parent_class'],
-                'parent_id': link_info['parent_id']
-            })
+                logger.debug(f"Google 文件可訪問: {absolute_link} ({message})")
+        # 一般連結檢查
+        elif link_response.status_code not in ok_statuses:
+            logger.warning(f"失效連結：{absolute_link} (狀態碼：{link_response.status_code})",
+                           extra={'fields': {'url': absolute_link, 'status_code': link_response.status_code}})
+            # 儲存失效連結的詳細資訊
+            broken_links_info.append(_broken_entry(
+                link_info, status_code=link_response.status_code))
+        else:
+            logger.debug(f"連結正常: {absolute_link}")
+    except HostUnavailable as e:
+        # 斷路器已打開，開啟時已記錄過一次警告
+        logger.debug(f"略過連結 {absolute_link}：{e}")
+        instrumentation.count('circuit_skipped')
+        broken_links_info.append(_broken_entry(link_info, error=str(e)))
+    except Exception as e:
+        logger.warning(f"檢查連結 {absolute_link} 時發生錯誤：{e}",
+                       extra={'fields': {'url': absolute_link, 'class': 'error'}})
+        # 將異常連結也加入失效連結清單
+        broken_links_info.append(_broken_entry(link_info, error=str(e)))
+    return broken_links_info
+
+def budget_exhausted():
+    """--time-budget 設定的時間已用完"""
+    return RUN_DEADLINE is not None and time.monotonic() >= RUN_DEADLINE
+
+def check_links_concurrently(links_info, fetcher, timeout, delay, deferred=None):
+    """
+    以執行緒池平行檢查連結，依完成順序產生 (索引, 問題清單)
+    同一主機的請求仍間隔 delay 秒；排隊中的工作數有上限，不會一次建立所有工作
+    時間預算用完時不再送出新的檢查 (進行中的仍會完成)，其餘連結加入 deferred
+    """
+    throttle = HostThrottle(delay)
+
+    def check(index, link_info):
+        # 斷路器已打開的主機不會送出請求，不需要等待請求間隔
+        if fetcher.host_available(link_info['url']):
+            throttle.wait(link_info['url'])
+        logger.debug(f"檢查: {link_info['url']} (顯示文字: {link_info['text']})")
+        return index, check_link(link_info, fetcher, timeout)
+
+    with ThreadPoolExecutor(max_workers=LINK_CONCURRENCY) as pool:
+        pending = set()
+        for index, link_info in enumerate(links_info):
+            if budget_exhausted():
+                if deferred is not None:
+                    deferred.extend(links_info[index:])
+                break
+            if len(pending) >= LINK_CONCURRENCY * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(pool.submit(check, index, link_info))
+        for future in as_completed(pending):
+            yield future.result()
+
+def page_links(url, target, session, hosts=None, index=None, changed_only=False):
+    """
+    擷取頁面的連結，傳入 hosts 時加入其中的 HTTPS 主機，傳入 index (LinkIndex) 時更新頁面的連結
+    無法存取頁面時回傳 None；changed_only 且連結沒有變動、上次都正常的頁面回傳空清單
+    """
+    links_info = extract_links(url, target, session)
+    if links_info is None:
+        return None
+    if hosts is not None:
+        collect_https_hosts(hosts, [url] + [info['url'] for info in links_info])
+    if index is not None:
+        fingerprint = links_fingerprint(links_info)
+        if changed_only and index.page_unchanged(url, fingerprint):
+            logger.info(f"頁面的連結沒有變動且上次都正常，略過檢查: {url}")
+            return []
+        index.update_page(url, links_info, fingerprint)
+    return links_info
+
+def check_prioritized(links_info, target, session, delay, index=None, base_url=None, deferred=None):
+    """
+    依失效風險排序 (見 link_priority.py) 後平行檢查，回傳 (排序後的連結, 各連結的問題清單)
+    時間預算用完而未檢查的連結問題清單為 None，並加入 deferred
+    """
+    link_timeout = target.timeout if target else 5
+    # 風險高的連結先檢查 (上次失效、從未檢查過、Google 文件、外部網站、很久沒有正常過)
+    history = index.history(info['url'] for info in links_info) if index is not None else {}
+    links_info = prioritize(links_info, history, base_url)
+
+    by_type = Counter(info.get('type', 'link') for info in links_info)
+    logger.info(f"找到 {len(links_info)} 個連結與資源 (" +
+                "、".join(f"{RESOURCE_LABELS[t]} {n}" for t, n in by_type.items()) + ")，開始檢查...")
+    metrics.set('links_checked', len(links_info), target=target.name if target else base_url)
+    # 逐跳跟隨轉址，永久轉址會記入共用快取供後續連結直接使用
+    fetcher = create_fetcher(session, target)
+    # 平行檢查的結果依排序後的連結順序排列
+    results = [None] * len(links_info)
+    progress = ProgressReporter(len(links_info), logger=logger)
+    skipped = []
+    for i, issues in check_links_concurrently(links_info, fetcher, link_timeout, delay, skipped):
+        results[i] = issues
+        progress.advance(issues=len(issues))
+    progress.finish()
+    if skipped:
+        logger.warning(f"時間預算已用完，{len(skipped)} 個風險較低的連結延後檢查")
+        if deferred is not None:
+            deferred.extend(skipped)
+    if index is not None:
+        index.record_results(index_results(links_info, results))
+    return links_info, results
+
+def check_links(url, target=None, session=None, checked=None, delay=None, hosts=None,
+                index=None, changed_only=False, deferred=None):
+    """
+    檢查頁面上的所有連結，target 提供逾時與 include/exclude 規則
+    傳入共用的 checked (已檢查過的連結集合) 時，其中的連結不再檢查
+    傳入 hosts 集合時會加入頁面與連結中的 HTTPS 主機，供之後掃描憑證
+    傳入 index (LinkIndex) 時更新頁面的連結與檢查結果；changed_only 時略過連結沒有變動且上次都正常的頁面
+    連結依失效風險排序 (見 link_priority.py)，時間預算用完而未檢查的連結加入 deferred
+    """
+    if delay is None:
+        delay = REQUEST_DELAY
+    if session is None:
+        session = create_session()
+    links_info = page_links(url, target, session, hosts, index, changed_only)
+    if not links_info:
+        return []
+
+    # 同一網址 (不論是連結或資源) 只檢查一次
+    total_links = len(links_info)
+    links_info = unique_links(links_info, set() if checked is None else checked)
+    if len(links_info) != total_links:
+        logger.info(f"略過重複或其他頁面已檢查過的 {total_links - len(links_info)} 個連結")
+
+    links_info, results = check_prioritized(links_info, target, session, delay, index, url, deferred)
+    broken_links_info = [info for issues in results if issues for info in issues]
+    instrumentation.count('links_broken', len(broken_links_info))
     return broken_links_info
 
-def send_report_email(recipient_email, subject, broken_links_info, checked_url, elapsed_time):
-    """發送檢測報告郵件"""
+def unique_links(links_info, checked):
+    """去除重複與已在 checked 中的連結，保留的網址加入 checked"""
+    unique = []
+    for info in links_info:
+        if info['url'] not in checked:
+            checked.add(info['url'])
+            unique.append(info)
+    return unique
+
+def index_results(links_info, results):
+    """轉成連結索引記錄的 (網址, 問題說明)，沒有問題時為 None；未檢查 (延後) 的連結不記錄"""
+    return [(info['url'], describe_issue(issues[0]) if issues else None)
+            for info, issues in zip(links_info, results) if issues is not None]
+
+def target_option(target, name, value):
+    """命令列指定的值 (不是 None) 優先，未指定時使用設定檔中目標的設定"""
+    return value if value is not None else target.options.get(name)
+
+def plan_pages(target, session, sitemap=None, max_pages=None, state=None):
+    """
+    決定要檢查的頁面 [(網址, lastmod), ...] 與請求間隔
+    開啟 sitemap 時依 robots.txt 與 sitemap 找出全站頁面，否則只檢查目標網址
+    """
+    sitemap = target_option(target, 'sitemap', sitemap)
+    if sitemap is True and isinstance(target.options.get('sitemap'), str):
+        # 命令列只開啟 sitemap 時沿用設定檔指定的 sitemap 網址
+        sitemap = target.options['sitemap']
+    if not sitemap:
+        return [(target.url, None)], REQUEST_DELAY
+
+    seeder = CrawlSeeder(session)
+    pages = seeder.seed(
+        target.url, state=state, sitemap=sitemap,
+        max_pages=target_option(target, 'max_pages', max_pages))
+    if not pages and not seeder.discovered:
+        logger.warning("sitemap 沒有任何頁面，改為只檢查目標網址")
+        pages = [(target.url, None)]
+    # 遵守 robots.txt 的 Crawl-delay
+    return pages, max(REQUEST_DELAY, seeder.crawl_delay() or 0)
+
+def check_site(target, sitemap=None, max_pages=None, state=None, hosts=None, index=None, changed_only=False,
+               deferred=None):
+    """
+    依 sitemap 檢查全站頁面 (未設定時只檢查目標網址)，失效連結會記錄所在頁面
+    時間預算用完後其餘頁面不再讀取，與未檢查的連結一起加入 deferred
+    """
+    if not target_option(target, 'sitemap', sitemap):
+        return check_links(target.url, target, hosts=hosts, index=index, changed_only=changed_only,
+                           deferred=deferred)
+
+    session = create_session()
+    pages, delay = plan_pages(target, session, sitemap, max_pages, state)
+
+    # 先擷取所有頁面的連結，再一起依失效風險排序，時間預算優先用在全站風險最高的連結
+    checked = set()
+    links_info = []
+    page_urls = {}  # 頁面 -> 頁面上的連結網址，無法存取的頁面不列入
+    for i, (page_url, lastmod) in enumerate(pages, 1):
+        if budget_exhausted():
+            logger.warning(f"時間預算已用完，其餘 {len(pages) - i + 1} 個頁面延後檢查")
+            if deferred is not None:
+                deferred.extend({'url': page, 'text': '', 'type': 'page'} for page, _ in pages[i - 1:])
+            break
+        logger.info(f"=== 頁面 [{i}/{len(pages)}] {page_url} ===")
+        if i > 1:
+            time.sleep(delay)
+        found = page_links(page_url, target, session, hosts, index, changed_only)
+        if found is None:
+            continue
+        page_urls[page_url] = {info['url'] for info in found}
+        links_info.extend(unique_links(found, checked))
+
+    skipped = []
+    links_info, results = check_prioritized(links_info, target, session, delay, index, target.url, skipped)
+    if deferred is not None:
+        deferred.extend(skipped)
+    broken_links_info = [info for issues in results if issues for info in issues]
+    instrumentation.count('links_broken', len(broken_links_info))
+    if state is not None:
+        # 仍有失效連結或延後檢查的頁面不記錄 lastmod，下次執行時會重新檢查
+        unsettled = {info['url'] for info, issues in zip(links_info, results) if issues is None or issues}
+        for page_url, lastmod in pages:
+            if page_url in page_urls and not page_urls[page_url] & unsettled:
+                state.mark_checked(page_url, lastmod)
+    return broken_links_info
+
+def collect_https_hosts(hosts, urls):
+    for url in urls:
+        host = https_host(url)
+        if host is not None:
+            hosts.add(host)
+
+def scan_certificates(target, hosts):
+    """
+    平行掃描所有 HTTPS 主機的憑證 (到期日、憑證鏈、主機名稱、通訊協定版本)，
+    有問題的主機以與失效連結相同的格式回傳，回傳 {(主機, 連接埠): 問題清單}
+    """
+    if not hosts:
+        return {}
+    logger.info(f"掃描 {len(hosts)} 個 HTTPS 主機的憑證...")
+    results = get_cert_scanner().scan_many(sorted(hosts))
+    issues_by_host = {}
+    for (host, port), result in results.items():
+        host_label = host if port == 443 else f"{host}:{port}"
+        issues_by_host[(host, port)] = [
+            {
+                'url': f"https://{host_label}/",
+                'cert_issue': issue,
+                'result_class': 'certificate',
+                'text': host_label,
+                'parent': '',
+                'parent_class': [],
+                'parent_id': '',
+                'page': None,
+                'resource_type': 'certificate',
+            }
+            for issue in certificate_issues(result, target.ssl_warning_days, target.ssl_critical_days)
+        ]
+        for issue in issues_by_host[(host, port)]:
+            logger.warning(f"{issue['cert_issue']}: {host_label}",
+                           extra={'fields': {'url': issue['url'], 'class': 'certificate'}})
+    return issues_by_host
+
+def collect_links(target, pages, session, delay, index=None):
+    """擷取所有頁面上的連結，同一連結只保留第一次出現的位置；傳入 index 時更新各頁面的連結"""
+    links = {}
+    for i, (page_url, _) in enumerate(pages, 1):
+        if len(pages) > 1:
+            logger.info(f"=== 頁面 [{i}/{len(pages)}] {page_url} ===")
+            if i > 1:
+                time.sleep(delay)
+        page_links = extract_links(page_url, target, session) or []
+        if index is not None and page_links:
+            index.update_page(page_url, page_links)
+        for link_info in page_links:
+            links.setdefault(link_info['url'], link_info)
+    return list(links.values())
+
+def run_shard(target, shard_index, shard_count, args):
+    """
+    執行單一分片：只檢查主機落在此分片的連結，每檢查完一個連結就寫入檢查點
+    同一次執行 (run_id 相同) 中斷後重新執行會略過已檢查的連結
+    回傳結束代碼：失效連結由合併步驟回報，分片只在主頁無法存取時失敗、時間預算用完而未完成時有問題
+    """
+    path = checkpoint_path(args.checkpoint_dir, target.name, shard_index, shard_count)
+    checkpoint = ShardCheckpoint(path, args.run_id)
+    resumed = checkpoint.load()
+    if checkpoint.complete:
+        logger.info(f"[{target.name}] 分片 {shard_index + 1}/{shard_count} 已完成，略過")
+        return HEALTHY
+
+    start_time = time.time()
+    session = create_session()
+    if resumed:
+        # 續跑時沿用第一次規劃的頁面，確保各分片看到相同的連結集合
+        pages, delay = checkpoint.pages, checkpoint.delay
+        checkpoint.open()
+    else:
+        pages, delay = plan_pages(target, session, args.sitemap, args.max_pages, CrawlState(args.crawl_state))
+        checkpoint.open(pages, delay)
+
+    ring = HashRing(shard_count)
+    index = open_link_index(args)
+    links_info = [
+        info for info in collect_links(target, pages, session, delay, index)
+        if ring.shard_for(link_host(info['url'])) == shard_index
+    ]
+    todo = [info for info in links_info if info['url'] not in checkpoint.done]
+    history = index.history(info['url'] for info in todo) if index is not None else {}
+    todo = prioritize(todo, history, target.url)
+    logger.info(f"[{target.name}] 分片 {shard_index + 1}/{shard_count}: 共 {len(links_info)} 個連結，"
+          f"已完成 {len(links_info) - len(todo)} 個，剩餘 {len(todo)} 個")
+
+    fetcher = create_fetcher(session, target)
+    try:
+        # 檢查點只由主執行緒寫入
+        progress = ProgressReporter(len(todo), logger=logger)
+        results = [None] * len(todo)
+        deferred = []
+        for i, issues in check_links_concurrently(todo, fetcher, target.timeout, delay, deferred):
+            checkpoint.record(todo[i]['url'], issues)
+            results[i] = issues
+            progress.advance(issues=len(issues))
+        progress.finish()
+        if index is not None:
+            index.record_results(index_results(todo, results))
+        if deferred:
+            # 分片保持未完成，以相同的 run_id 重新執行會從延後的連結繼續
+            logger.warning(f"[{target.name}] 時間預算已用完，{len(deferred)} 個連結延後檢查，分片尚未完成")
+            return DEGRADED
+        if args.scan_certs:
+            # 每個分片只掃描自己負責的主機，結果同樣寫入檢查點
+            hosts = set()
+            collect_https_hosts(hosts, [info['url'] for info in links_info])
+            hosts = {host for host in hosts if f"cert:{host[0]}:{host[1]}" not in checkpoint.done}
+            for (host, port), issues in scan_certificates(target, hosts).items():
+                checkpoint.record(f"cert:{host}:{port}", issues)
+        checkpoint.finish(time.time() - start_time)
+    finally:
+        checkpoint.close()
+        if index is not None:
+            index.close()
+    logger.info(f"分片結果已寫入 {path}")
+    return FAILED if target.url in UNREACHABLE_PAGES else HEALTHY
+
+def _run_shard_process(argv, shard_index, shard_count):
+    """本機多程序執行時每個子程序的進入點，與 CI 的單一分片走相同流程"""
+    args = parse_args(argv)
+    setup_logging(args)
+    apply_runtime_options(args)
+    try:
+        return worst([run_shard(target, shard_index, shard_count, args) for target in build_config(args).link_checks])
+    finally:
+        # 子程序結束前關閉其解析程序池，否則程序池的管理執行緒會讓子程序無法結束
+        cpu_pool.close()
+        get_host_latency().save()
+        shutdown_logging()
+
+def open_link_index(args):
+    """依命令列選項開啟連結索引 (--no-link-index 時為 None)"""
+    return None if args.no_link_index else LinkIndex(args.link_index)
+
+def run_local_shards(argv, shard_count):
+    """在本機以多個程序平行執行所有分片，回傳各分片中最嚴重的結束代碼"""
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=shard_count) as pool:
+        futures = [
+            pool.submit(_run_shard_process, argv, index, shard_count)
+            for index in range(shard_count)
+        ]
+        return worst([future.result() for future in futures])
+
+def merge_shards(config, shard_count, args):
+    """合併各分片的檢查點並寄送報告，所有分片都完成時才刪除檢查點；回傳各目標的結果摘要"""
+    crawl_state = CrawlState(args.crawl_state)
+    summaries = []
+    for target in config.link_checks:
+        result = merge_checkpoints(args.checkpoint_dir, target.name, shard_count, args.run_id)
+        if result['missing']:
+            logger.warning(f"[{target.name}] 分片 {', '.join(map(str, result['missing']))} 尚未完成，報告只包含已完成的部分")
+        else:
+            # 沒有失效連結的頁面記錄 lastmod，下次執行時略過
+            broken_pages = {info.get('page') for info in result['broken']}
+            for page_url, lastmod in result['pages']:
+                if page_url not in broken_pages:
+                    crawl_state.mark_checked(page_url, lastmod)
+
+        metrics.set('links_checked', result['checked'], target=target.name)
+        record_link_metrics(target, result['broken'], result['elapsed'])
+        report_results(target, result['broken'], result['elapsed'])
+        summaries.append(target_summary(target, result['broken'], missing=result['missing']))
+        if not result['missing']:
+            remove_checkpoints(args.checkpoint_dir, target.name, shard_count)
+    crawl_state.save()
+    return summaries
+
+def target_summary(target, broken_links_info, deferred=None, missing=None):
+    """
+    目標的結果摘要 (--format json 輸出)：主頁無法存取為失敗，
+    有失效連結、延後檢查或未完成的分片為有問題
+    """
+    if target.url in UNREACHABLE_PAGES:
+        status = FAILED
+    elif broken_links_info or deferred or missing:
+        status = DEGRADED
+    else:
+        status = HEALTHY
+    return {
+        'target': target.name,
+        'url': target.url,
+        'status': STATUS_NAMES[status],
+        'exit_code': status,
+        'broken': len(broken_links_info),
+        'broken_by_class': dict(Counter(classify_broken_link(info) for info in broken_links_info)),
+        'deferred': len(deferred or []),
+        'missing_shards': list(missing or []),
+    }
+
+def describe_issue(info):
+    """失效連結的問題說明，報告與日誌共用"""
+    if 'google_docs_issue' in info:
+        return f"Google 文件權限問題 - {info['permission_message']}"
+    if 'cert_issue' in info:
+        return info['cert_issue']
+    if 'redirect_issue' in info:
+        return info['redirect_issue']
+    if 'limit_issue' in info:
+        return info['limit_issue']
+    if 'status_code' in info:
+        return f"HTTP 狀態碼: {info['status_code']}"
+    return f"錯誤: {info['error']}"
+
+def group_by_resource_type(broken_links_info):
+    """依資源類型分組 (連結、圖片、腳本……)，回傳 [(類型名稱, 失效項目), ...]，各組內維持原本順序"""
+    groups = {}
+    for info in broken_links_info:
+        groups.setdefault(info.get('resource_type', 'link'), []).append(info)
+    order = list(REPORT_GROUPS)
+    return [
+        (REPORT_GROUPS.get(resource_type, resource_type), groups[resource_type])
+        for resource_type in sorted(groups, key=lambda t: order.index(t) if t in order else len(order))
+    ]
+
+def send_report_email(recipient_email, subject, broken_links_info, checked_url, elapsed_time, deferred=None):
+    """發送檢測報告郵件，deferred 為因時間預算延後檢查的連結與頁面"""
+    from email.mime.text import MIMEText
+    from email.mime.multipart import MIMEMultipart
+
     try:
-        # 取得環境信息
-        hostname = socket.gethostname()
-        ip_address = socket.gethostbyname(hostname)
-        current_user = getpass.getuser()
+        render_start = time.perf_counter()
+        # 取得環境信息 (啟動時已收集，不會在此等待 DNS)
+        runtime_info = get_runtime_info()
+        runner_info = format_runner_info(runtime_info)
         script_path = os.path.abspath(__file__)
         
         # 創建郵件內容
@@ -231,49 +765,82 @@ def send_report_email(recipient_email, subject, broken_links_info, checked_url,
                     <p><strong>耗時:</strong> {elapsed_time:.2f} 秒</p>
                     <p><strong>檢測發起資訊:</strong></p>
                     <ul>
-                        <li>主機名稱: {hostname}</li>
-                        <li>IP 位址: {ip_address}</li>
-                        <li>使用者: {current_user}</li>
+                        <li>主機名稱: {runtime_info['hostname']}</li>
+                        <li>IP 位址: {runtime_info['ip_address']}</li>
+                        <li>使用者: {runtime_info['user']}</li>
                         <li>腳本路徑: {script_path}</li>
+                        {f"<li>GitHub Actions: {runner_info}</li>" if runner_info else ""}
                     </ul>
                 </div>
         """
         
         if broken_links_info:
+            email_body += f"<h3>檢測到 {len(broken_links_info)} 個失效連結:</h3>"
+            
+            # 依資源類型分成多個表格 (連結、圖片、腳本、樣式表、內嵌框架、影音、憑證)
+            for label, group in group_by_resource_type(broken_links_info):
+                email_body += f"""
+                    <h4>{label} ({len(group)})</h4>
+                    <table>
+                        <tr>
+                            <th>#</th>
+                            <th>網址</th>
+                            <th>顯示文字</th>
+                            <th>問題</th>
+                        </tr>
+                """
+                
+                for i, info in enumerate(group, 1):
+                    url = info['url']
+                    text = info['text']
+                    
+                    issue = describe_issue(info)
+                    
+                    page = info.get('page')
+                    page_note = f'<br><small>所在頁面: {page}</small>' if page and page != checked_url else ''
+                    
+                    email_body += f"""
+                        <tr>
+                            <td>{i}</td>
+                            <td><a href="{url}" target="_blank">{url}</a>{page_note}</td>
+                            <td>{text}</td>
+                            <td class="error">{issue}</td>
+                        </tr>
+                    """
+                
+                email_body += "</table>"
+        else:
+            email_body += "<p class='info'>恭喜！沒有發現失效連結。</p>"
+
+        if deferred:
             email_body += f"""
-                <h3>檢測到 {len(broken_links_info)} 個失效連結:</h3>
+                <h3>因時間預算延後檢查 {len(deferred)} 個項目 (依風險由高到低):</h3>
                 <table>
                     <tr>
                         <th>#</th>
-                        <th>連結</th>
-                        <th>顯示文字</th>
-                        <th>問題</th>
+                        <th>類型</th>
+                        <th>網址</th>
+                        <th>風險分數</th>
                     </tr>
             """
-            
-            for i, info in enumerate(broken_links_info, 1):
-                url = info['url']
-                text = info['text']
-                
-                if 'google_docs_issue' in info:
-                    issue = f"Google 文件權限問題 - {info['permission_message']}"
-                elif 'status_code' in info:
-                    issue = f"HTTP 狀態碼: {info['status_code']}"
-                else:
-                    issue = f"錯誤: {info['error']}"
-                
+            for i, info in enumerate(deferred[:MAX_DEFERRED_REPORTED], 1):
+                label = DEFERRED_LABELS.get(info.get('type', 'link'), info.get('type'))
                 email_body += f"""
                     <tr>
                         <td>{i}</td>
-                        <td><a href="{url}" target="_blank">{url}</a></td>
-                        <td>{text}</td>
-                        <td class="error">{issue}</td>
+                        <td>{label}</td>
+                        <td><a href="{info['url']}" target="_blank">{info['url']}</a></td>
+                        <td>{info.get('risk', '')}</td>
                     </tr>
                 """
-            
             email_body += "</table>"
-        else:
-            email_body += "<p class='info'>恭喜！沒有發現失效連結。</p>"
+            if len(deferred) > MAX_DEFERRED_REPORTED:
+                email_body += f"<p>其餘 {len(deferred) - MAX_DEFERRED_REPORTED} 個項目未列出</p>"
+
+        # 附加各階段耗時 (以 --instrument 開啟時)
+        if instrumentation.enabled:
+            instrumentation.observe('render_report', time.perf_counter() - render_start)
+            email_body += instrumentation.format_html()
         
         email_body += """
             </div>
@@ -283,77 +850,181 @@ def send_report_email(recipient_email, subject, broken_links_info, checked_url,
         
         msg.attach(MIMEText(email_body, 'html'))
         
-        # 連接到 SMTP 伺服器並發送郵件
-        print(f"\n正在發送報告郵件到 {recipient_email}...")
-        
-        # 郵件伺服器設定
-        smtp_server = 'smtp.gmail.com'  # 假設使用 Gmail SMTP
-        smtp_port = 587  # TLS 端口
-        
-        # 郵件帳號設定
-        smtp_user = 'mailer@tea.nknush.kh.edu.tw'
-        
-        # 安全地獲取應用程式密碼
-        # 方法 1: 環境變數
-        app_password = os.environ.get('EMAIL_APP_PASSWORD')
-              
-        # 如果環境變數未設置，則提示輸入
-        if not app_password:
-            app_password = getpass.getpass('請輸入應用程式密碼: ')
-        
-        # 連接到 SMTP 伺服器並發送郵件
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.ehlo()  # 向郵件伺服器打招呼
-            server.starttls()  # 啟用 TLS 加密
-            server.ehlo()  # 再次打招呼
-            server.login(smtp_user, app_password)  # 使用應用程式密碼登入
-            server.send_message(msg)
-            
-        print(f"報告郵件已成功發送到 {recipient_email}")
+        # 放入背景寄送佇列，不阻塞檢測流程
+        logger.info(f"正在發送報告郵件到 {recipient_email}...")
+        get_mail_sender().submit(msg)
         return True
     except Exception as e:
-        print(f"發送報告郵件時發生錯誤: {e}")
+        logger.error(f"發送報告郵件時發生錯誤: {e}")
         return False
 
-# 主程式
-def main():
-    # 指定要檢查的網站主頁
-    url = 'https://www.nknush.kh.edu.tw'
-    recipient_email = '555@tea.nknush.kh.edu.tw'  # 目標郵件地址
-    
-    # 如果有命令列參數，使用第一個參數作為網站 URL
-    if len(sys.argv) > 1:
-        url = sys.argv[1]
-    
-    print("開始檢查網站連結...")
-    print("注意：已停用 SSL 憑證驗證，這可能存在安全風險")
-    start_time = time.time()
-    broken_links_info = check_links(url)
-    elapsed_time = time.time() - start_time
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='檢查網站頁面上的失效連結')
+    parser.add_argument('url', nargs='?', help='要檢查的網站主頁 (預設使用設定檔中的 link_checks)')
+    parser.add_argument('--config', help=f'設定檔路徑 (預設 {DEFAULT_CONFIG_FILE})')
+    parser.add_argument('--recipient', action='append',
+                        help=f'以命令列指定網址時的報告收件者，可重複指定 (預設 REPORT_RECIPIENT 或 {DEFAULT_RECIPIENT})')
+    parser.add_argument('--sitemap', nargs='?', const=True, default=None,
+                        help='依 robots.txt 與 sitemap 檢查全站頁面 (可指定 sitemap 網址)')
+    parser.add_argument('--max-pages', type=int, help='每次最多檢查的 sitemap 頁面數')
+    parser.add_argument('--crawl-state', default=os.getenv('CRAWL_STATE_FILE', DEFAULT_STATE_FILE),
+                        help='記錄頁面 lastmod 的狀態檔，未變動的頁面下次略過')
+    parser.add_argument('--link-index', default=os.getenv('LINK_INDEX_FILE', DEFAULT_INDEX_FILE),
+                        help='記錄各頁面連結與檢查結果的 SQLite 索引 (可用 link_index.py 查詢哪些頁面連到某個網址)')
+    parser.add_argument('--no-link-index', action='store_true', help='不更新連結索引')
+    parser.add_argument('--changed-only', action='store_true',
+                        help='略過連結與上次相同且上次都正常的頁面 (依連結索引判斷)')
+    parser.add_argument('--time-budget', type=float, metavar='SECONDS',
+                        help='整次執行的時間上限，連結依風險由高到低檢查，時間用完時其餘連結延後並列在報告中')
+    parser.add_argument('--concurrency', type=int, default=LINK_CONCURRENCY,
+                        help=f'同時檢查的連結數，同一主機仍依序間隔 (預設 {LINK_CONCURRENCY})')
+    parser.add_argument('--parse-workers', type=int, default=os.cpu_count() or 1,
+                        help='HTML 解析與 Google 文件判斷的程序數 (預設為 CPU 核心數，1 表示不使用子程序)')
+    parser.add_argument('--shard', type=parse_shard, metavar='I/N',
+                        help='只執行第 I 個分片 (共 N 個)，結果寫入檢查點，不寄送報告')
+    parser.add_argument('--merge', type=int, metavar='N', help='合併 N 個分片的檢查點並寄送報告')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='在本機以多個程序分片執行後合併 (預設 1，不分片)')
+    parser.add_argument('--checkpoint-dir', default=DEFAULT_CHECKPOINT_DIR, help='分片檢查點目錄')
+    parser.add_argument('--run-id', default=os.getenv('GITHUB_RUN_ID', 'local'),
+                        help='執行識別碼，相同識別碼的檢查點可以續跑 (預設 GITHUB_RUN_ID)')
+    parser.add_argument('--fixed-timeouts', action='store_true',
+                        help='一律使用設定檔的逾時，不依主機延遲紀錄調整，也不略過連續連線失敗的主機')
+    parser.add_argument('--no-assets', action='store_true',
+                        help='只檢查 <a> 連結，不檢查圖片、腳本、樣式表、內嵌框架與影音')
+    parser.add_argument('--no-script-links', action='store_true',
+                        help='不掃描內嵌腳本與其引用的 JSON 中的網址')
+    parser.add_argument('--scan-certs', action='store_true',
+                        help='掃描連結中所有 HTTPS 主機的憑證 (結果快取於 CERT_CACHE_FILE，預設 .cert_cache.json)')
+    add_logging_arguments(parser)
+    add_metrics_arguments(parser)
+    add_instrumentation_arguments(parser)
+    add_output_arguments(parser)
+    return parser.parse_args(argv)
+
+def apply_runtime_options(args):
+    """套用平行檢查相關的命令列選項"""
+    global LINK_CONCURRENCY, CHECK_ASSETS, SCAN_SCRIPTS, ADAPTIVE_TIMEOUTS, RUN_DEADLINE
+    LINK_CONCURRENCY = max(1, args.concurrency)
+    RUN_DEADLINE = time.monotonic() + args.time_budget if args.time_budget else None
+    CHECK_ASSETS = not args.no_assets
+    SCAN_SCRIPTS = not args.no_script_links
+    ADAPTIVE_TIMEOUTS = not args.fixed_timeouts
+    cpu_pool.workers = max(1, args.parse_workers)
 
-    print("\n檢測完成！")
-    print(f"總計耗時: {elapsed_time:.2f} 秒")
+def build_config(args):
+    """如果有命令列參數，使用該網址作為檢查目標；否則從設定檔載入"""
+    if args.url:
+        return SiteConfig.from_urls(
+            [args.url], section='link_checks',
+            defaults={'timeout': 5, 'notify': {'email': args.recipient or [DEFAULT_RECIPIENT]}})
+    return load_config(args.config)
+
+def record_link_metrics(target, broken_links_info, elapsed_time):
+    """依失效類型更新連結檢查的 Prometheus 指標"""
+    metrics.clear('links_broken', target=target.name)
+    by_class = Counter(classify_broken_link(info) for info in broken_links_info)
+    for failure_class in ('http_4xx', 'http_5xx', 'google_permission', 'redirect', 'oversized', 'too_slow', 'certificate', 'error'):
+        by_class.setdefault(failure_class, 0)
+    for failure_class, count in by_class.items():
+        metrics.set('links_broken', count, target=target.name, **{'class': failure_class})
+    metrics.set('link_check_duration_seconds', elapsed_time, target=target.name)
+    metrics.set('link_check_last_run_timestamp_seconds', time.time(), target=target.name)
+
+def report_results(target, broken_links_info, elapsed_time, deferred=None):
+    """輸出檢測結果並寄送報告給目標設定的收件者，deferred 為因時間預算延後檢查的項目"""
+    url = target.url
+    logger.info(f"[{target.name}] 檢測完成！總計耗時: {elapsed_time:.2f} 秒")
     if broken_links_info:
-        print(f"檢測到 {len(broken_links_info)} 個失效連結：")
-        for i, info in enumerate(broken_links_info, 1):
-            print(f"\n{i}. 失效連結：{info['url']}")
-            print(f"   顯示文字：{info['text']}")
-            print(f"   父元素：{info['parent']}" + 
-                (f", ID: {info['parent_id']}" if info['parent_id'] else "") + 
-                (f", 類別: {', '.join(info['parent_class'])}" if info['parent_class'] else ""))
-                
-            if 'google_docs_issue' in info:
-                print(f"   問題：Google 文件權限問題 - {info['permission_message']}")
-            elif 'status_code' in info:
-                print(f"   狀態碼：{info['status_code']}")
-            else:
-                print(f"   錯誤：{info['error']}")
+        groups = group_by_resource_type(broken_links_info)
+        logger.warning(f"[{target.name}] 檢測到 {len(broken_links_info)} 個失效連結 (" +
+                       "、".join(f"{label} {len(group)}" for label, group in groups) + ")")
+        for label, group in groups:
+            for i, info in enumerate(group, 1):
+                # 每個失效連結一筆日誌，JSON 格式時附上完整欄位
+                details = [f"顯示文字：{info['text']}"]
+                if info.get('page') and info['page'] != url:
+                    details.append(f"所在頁面：{info['page']}")
+                if info['parent']:
+                    details.append(f"父元素：{info['parent']}" +
+                        (f", ID: {info['parent_id']}" if info['parent_id'] else "") +
+                        (f", 類別: {', '.join(info['parent_class'])}" if info['parent_class'] else ""))
+                details.append(f"問題：{describe_issue(info)}")
+                logger.warning(f"[{label}] {i}. {info['url']} | " + " | ".join(details),
+                               extra={'fields': {'target': target.name, 'class': classify_broken_link(info), **info}})
     else:
-        print("恭喜！沒有發現失效連結。")
+        logger.info("恭喜！沒有發現失效連結。")
+    if deferred:
+        counts = Counter(info.get('type', 'link') for info in deferred)
+        logger.warning(f"[{target.name}] 因時間預算延後檢查 " +
+                       "、".join(f"{DEFERRED_LABELS.get(t, t)} {n}" for t, n in counts.items()),
+                       extra={'fields': {'target': target.name, 'deferred': [info['url'] for info in deferred]}})
     
     # 發送報告郵件
     email_subject = f"網站連結檢測報告 - {datetime.now().strftime('%Y-%m-%d')}"
-    send_report_email(recipient_email, email_subject, broken_links_info, url, elapsed_time)
+    for recipient_email in target.email:
+        send_report_email(recipient_email, email_subject, broken_links_info, url, elapsed_time, deferred)
+
+# 主程式
+def main(argv=None):
+    """執行連結檢查，回傳結束代碼 (見 run_status.py)"""
+    argv = sys.argv[1:] if argv is None else list(argv)
+    args = parse_args(argv)
+    setup_logging(args)
+    setup_instrumentation(args)
+    apply_runtime_options(args)
+
+    config = build_config(args)
+
+    logger.info("開始檢查網站連結...")
+    logger.warning("注意：已停用 SSL 憑證驗證，這可能存在安全風險")
+    summaries = []
+    if args.shard:
+        # 分片只寫入檢查點，由合併步驟寄送報告
+        shard_index, shard_count = args.shard
+        status = worst([run_shard(target, shard_index, shard_count, args) for target in config.link_checks])
+    elif args.merge or args.workers > 1:
+        status = HEALTHY
+        if not args.merge:
+            status = run_local_shards(argv, args.workers)
+        prefetch_runtime_info()
+        summaries = merge_shards(config, args.merge or args.workers, args)
+        status = worst([status, *(summary['exit_code'] for summary in summaries)])
+    else:
+        # 在背景解析本機資訊，與連結檢查同時進行
+        prefetch_runtime_info()
+        crawl_state = CrawlState(args.crawl_state)
+        index = open_link_index(args)
+        for target in config.link_checks:
+            start_time = time.time()
+            hosts = set() if args.scan_certs else None
+            deferred = []
+            broken_links_info = check_site(target, args.sitemap, args.max_pages, crawl_state, hosts,
+                                           index, args.changed_only, deferred)
+            if hosts:
+                for issues in scan_certificates(target, hosts).values():
+                    broken_links_info.extend(issues)
+            elapsed_time = time.time() - start_time
+            record_link_metrics(target, broken_links_info, elapsed_time)
+            report_results(target, broken_links_info, elapsed_time, deferred)
+            summaries.append(target_summary(target, broken_links_info, deferred))
+        crawl_state.save()
+        if index is not None:
+            index.close()
+        status = worst(summary['exit_code'] for summary in summaries)
+    if UNREACHABLE_PAGES:
+        # sitemap 中個別頁面無法存取時整體為有問題
+        status = worst([status, DEGRADED])
+
+    if args.metrics_textfile:
+        metrics.write_textfile(args.metrics_textfile)
+
+    cpu_pool.close()
+    # 等待背景寄送完成 (逾時的郵件會留待下次重新寄送)
+    shutdown_mail_sender()
+    finish_instrumentation(args)
+    return finish_run(args, status, command='check-links', targets=summaries,
+                      unreachable_pages=sorted(UNREACHABLE_PAGES))
 
 if __name__ == "__main__":
-    main()
+    run_main(main)
@@ -1,15 +1,45 @@
 import requests
 import time
 import urllib3
-import ssl
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from datetime import datetime
-import socket
 import os
 import sys
-import getpass
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from runtime_env import format_runner_info, get_runtime_info, prefetch_runtime_info
+from mail_sender import get_mail_sender, shutdown_mail_sender
+from metrics import registry as metrics, add_arguments as add_metrics_arguments
+from instrumentation import (
+    instrumentation,
+    add_arguments as add_instrumentation_arguments,
+    setup_from_args as setup_instrumentation,
+    finish_from_args as finish_instrumentation,
+)
+from log_setup import (
+    add_arguments as add_logging_arguments,
+    setup_from_args as setup_logging,
+)
+from site_config import DEFAULT_CONFIG_FILE, SiteConfig, load_config
+from telegram_notifier import TelegramNotifier
+from cert_scanner import certificate_issues, get_cert_scanner
+from host_latency import get_host_latency
+from run_status import HEALTHY, add_arguments as add_output_arguments, finish as finish_run, run_main
+from result_table import CERT_CRITICAL, CERT_EXPIRED, CERT_UNKNOWN, CERT_WARNING, ONLINE, TIMEOUT, ResultTable
+from probe_quorum import (
+    DEFAULT_MAX_AGE, DEFAULT_QUORUM, DEFAULT_WAIT, ProbeAggregator, make_report, push_report,
+)
+
+# 以命令列指定網址且未加 --recipient 時的收件者
+DEFAULT_RECIPIENT = os.getenv("REPORT_RECIPIENT", "555@tea.nknush.kh.edu.tw")
+# 同時檢測可用性的網站數 (--concurrency)
+PROBE_CONCURRENCY = 8
+
+logger = logging.getLogger("checkWebsite")
+
+# 最後一次發送日報的日期
+_last_daily_report = None
 
 # 停用 SSL 警告訊息
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -25,10 +55,15 @@ except AttributeError:
     pass
 
 
-def check_website(url, timeout=10):
-    """檢查網站是否正常運作"""
+def check_website(url, timeout=10, expected_status=(200,), assertions=None):
+    """
+    檢查網站是否正常運作，assertions 為內容斷言 (以串流方式檢查網頁內容)
+    逾時依該主機過去的回應時間調整 (見 host_latency.py)，timeout 為沒有紀錄時的預設值
+    """
+    latency = get_host_latency()
+    timeout = latency.timeout(url, timeout)
     try:
-        print(f"正在檢查網站：{url}...")
+        logger.debug(f"正在檢查網站：{url}...")
         # 建立自訂的 Session，設定特定的 SSL 選項
         session = requests.Session()
         session.verify = False  # 停用 SSL 驗證
@@ -40,13 +75,31 @@ def check_website(url, timeout=10):
         )
 
         start_time = time.time()
-        response = session.get(url, timeout=timeout)
+        # 以串流方式取得回應，只在需要檢查內容時才讀取內容
+        with instrumentation.stage("site_request"):
+            response = session.get(url, timeout=timeout, stream=True)
         response_time = time.time() - start_time
+        latency.record(url, response.elapsed.total_seconds())
 
         status_code = response.status_code
-        if status_code == 200:
-            print(
-                f"✓ {url} 網站正常 (狀態碼: {status_code}, 回應時間: {response_time:.2f}秒)"
+        if status_code in expected_status and assertions is not None:
+            with instrumentation.stage("content_check"):
+                passed, content_error, read_bytes = assertions.evaluate(response)
+            if not passed:
+                logger.warning(f"{url} 網頁內容異常: {content_error} (已讀取 {read_bytes} 位元組)")
+                return {
+                    "url": url,
+                    "status": "error",
+                    "status_code": status_code,
+                    "response_time": response_time,
+                    "error": content_error,
+                }
+        response.close()
+
+        if status_code in expected_status:
+            logger.info(
+                f"{url} 網站正常 (狀態碼: {status_code}, 回應時間: {response_time:.2f}秒)",
+                extra={"fields": {"url": url, "status_code": status_code, "response_time": response_time}},
             )
             return {
                 "url": url,
@@ -56,7 +109,10 @@ def check_website(url, timeout=10):
                 "error": None,
             }
         else:
-            print(f"⚠️ {url} 網站回應異常 (狀態碼: {status_code})")
+            logger.warning(
+                f"{url} 網站回應異常 (狀態碼: {status_code})",
+                extra={"fields": {"url": url, "status_code": status_code}},
+            )
             return {
                 "url": url,
                 "status": "error",
@@ -64,8 +120,10 @@ def check_website(url, timeout=10):
                 "response_time": response_time,
                 "error": f"HTTP 狀態碼 {status_code}",
             }
-    except requests.exceptions.Timeout:
-        print(f"❌ {url} 網站回應逾時")
+    except requests.exceptions.Timeout as e:
+        # 連線逾時表示主機可能已停止服務，只有讀取逾時 (回應太慢) 計入延遲
+        latency.failure(url, e, timeout=None if isinstance(e, requests.exceptions.ConnectTimeout) else timeout)
+        logger.error(f"{url} 網站回應逾時 ({timeout:.1f} 秒)", extra={"fields": {"url": url, "status": "timeout"}})
         return {
             "url": url,
             "status": "timeout",
@@ -74,7 +132,7 @@ def check_website(url, timeout=10):
             "error": "連線逾時",
         }
     except requests.exceptions.ConnectionError as e:
-        print(f"❌ {url} 網站無法連接: {e}")
+        logger.error(f"{url} 網站無法連接: {e}", extra={"fields": {"url": url, "status": "offline"}})
         return {
             "url": url,
             "status": "offline",
@@ -83,7 +141,7 @@ def check_website(url, timeout=10):
             "error": f"連線錯誤: {str(e)}",
         }
     except Exception as e:
-        print(f"❌ {url} 網站檢測發生錯誤: {e}")
+        logger.error(f"{url} 網站檢測發生錯誤: {e}", extra={"fields": {"url": url, "status": "error"}})
         return {
             "url": url,
             "status": "error",
@@ -93,48 +151,67 @@ def check_website(url, timeout=10):
         }
 
 
-def check_ssl_certificate(url):
+def check_ssl_certificate(url, warning_days=14, critical_days=7):
     """檢查網站 SSL 憑證狀態及到期日"""
     try:
         # 從 URL 提取域名
         from urllib.parse import urlparse
 
-        hostname = urlparse(url).netloc
+        parsed = urlparse(url)
+        hostname = parsed.netloc
 
-        print(f"正在檢查 {hostname} 的 SSL 憑證...")
-        expiry_date = get_ssl_expiry_date(hostname)
+        logger.debug(f"正在檢查 {hostname} 的 SSL 憑證...")
+        with instrumentation.stage("ssl_check"):
+            scan = get_cert_scanner().scan(parsed.hostname, parsed.port or 443)
+        if scan["error"]:
+            raise RuntimeError(scan["error"])
 
-        # 計算剩餘天數
-        now = datetime.now()
-        remaining_days = (expiry_date - now).days
+        expiry_date = scan["expiry_date"]
+        remaining_days = scan["remaining_days"]
 
-        if remaining_days <= 0:
+        if scan["chain_valid"] is False or scan["hostname_match"] is False:
+            status = "憑證無效"
+            alert_level = "danger"
+        elif remaining_days <= 0:
             status = "已過期"
             alert_level = "danger"
-        elif remaining_days <= 14:
+        elif remaining_days <= warning_days:
             status = "即將到期"
             alert_level = "warning"
         else:
             status = "有效"
             alert_level = "success"
 
-        print(f"✓ {hostname} SSL 憑證: {status}, 剩餘 {remaining_days} 天")
+        logger.log(
+            logging.INFO if alert_level == "success" else logging.WARNING,
+            f"{hostname} SSL 憑證: {status}, 剩餘 {remaining_days} 天",
+            extra={"fields": {"hostname": hostname, "remaining_days": remaining_days, "status": status}},
+        )
         return {
             "hostname": hostname,
             "expiry_date": expiry_date,
             "remaining_days": remaining_days,
             "status": status,
             "alert_level": alert_level,
+            "warning_days": warning_days,
+            "critical_days": critical_days,
+            "chain_valid": scan["chain_valid"],
+            "hostname_match": scan["hostname_match"],
+            "protocol": scan["protocol"],
+            "ocsp_stapled": scan["ocsp_stapled"],
+            "issues": certificate_issues(scan, warning_days, critical_days),
         }
 
     except Exception as e:
-        print(f"❌ 檢查 {url} 的 SSL 憑證時發生錯誤: {e}")
+        logger.error(f"檢查 {url} 的 SSL 憑證時發生錯誤: {e}")
         return {
             "hostname": urlparse(url).netloc if url.startswith("http") else url,
             "expiry_date": None,
             "remaining_days": None,
             "status": "檢查失敗",
             "alert_level": "danger",
+            "warning_days": warning_days,
+            "critical_days": critical_days,
             "error": str(e),
         }
 
@@ -143,11 +220,15 @@ def send_report_email(
     recipient_email, subject, websites_status, elapsed_time, ssl_results=None
 ):
     """發送檢測報告郵件，包含 SSL 憑證資訊"""
+    # 網站都正常時不會寄信，email 套件到這裡才載入
+    from email.mime.text import MIMEText
+    from email.mime.multipart import MIMEMultipart
+
     try:
-        # 取得環境信息
-        hostname = socket.gethostname()
-        ip_address = socket.gethostbyname(hostname)
-        current_user = getpass.getuser()
+        render_start = time.perf_counter()
+        # 取得環境信息 (啟動時已收集，不會在此等待 DNS)
+        runtime_info = get_runtime_info()
+        runner_info = format_runner_info(runtime_info)
         script_path = os.path.abspath(__file__)
 
         # 創建郵件內容
@@ -184,10 +265,11 @@ def send_report_email(
                     <p><strong>耗時:</strong> {elapsed_time:.2f} 秒</p>
                     <p><strong>檢測發起資訊:</strong></p>
                     <ul>
-                        <li>主機名稱: {hostname}</li>
-                        <li>IP 位址: {ip_address}</li>
-                        <li>使用者: {current_user}</li>
+                        <li>主機名稱: {runtime_info['hostname']}</li>
+                        <li>IP 位址: {runtime_info['ip_address']}</li>
+                        <li>使用者: {runtime_info['user']}</li>
                         <li>腳本路徑: {script_path}</li>
+                        {f"<li>GitHub Actions: {runner_info}</li>" if runner_info else ""}
                     </ul>
                 </div>
 
@@ -293,12 +375,17 @@ def send_report_email(
                     status_text = "已過期"
                     expiry_date = cert["expiry_date"].strftime("%Y-%m-%d")
                     remaining_days = f"{cert['remaining_days']} 天"
-                elif cert["remaining_days"] <= 7:
+                elif cert.get("chain_valid") is False or cert.get("hostname_match") is False:
+                    status_class = "error"
+                    status_text = "; ".join(cert["issues"])
+                    expiry_date = cert["expiry_date"].strftime("%Y-%m-%d")
+                    remaining_days = f"{cert['remaining_days']} 天"
+                elif cert["remaining_days"] <= cert.get("critical_days", 7):
                     status_class = "error"
                     status_text = "即將到期 (緊急)"
                     expiry_date = cert["expiry_date"].strftime("%Y-%m-%d")
                     remaining_days = f"{cert['remaining_days']} 天"
-                elif cert["remaining_days"] <= 14:
+                elif cert["remaining_days"] <= cert.get("warning_days", 14):
                     status_class = "warning"
                     status_text = "即將到期"
                     expiry_date = cert["expiry_date"].strftime("%Y-%m-%d")
@@ -322,102 +409,60 @@ def send_report_email(
                 </table>
             """
 
-        msg.attach(MIMEText(email_body, "html"))
-
-        # 連接到 SMTP 伺服器並發送郵件
-        print(f"\n正在發送報告郵件到 {recipient_email}...")
+        # 附加各階段耗時 (以 --instrument 開啟時)
+        if instrumentation.enabled:
+            instrumentation.observe("render_report", time.perf_counter() - render_start)
+            email_body += instrumentation.format_html()
 
-        # 郵件伺服器設定
-        smtp_server = "smtp.gmail.com"
-        smtp_port = 587
+        msg.attach(MIMEText(email_body, "html"))
 
-        # 郵件帳號設定
-        smtp_user = "mailer@tea.nknush.kh.edu.tw"
+        # 放入背景寄送佇列，不阻塞檢測流程
+        logger.info(f"正在發送報告郵件到 {recipient_email}...")
+        get_mail_sender().submit(msg)
+        return True
+    except Exception as e:
+        logger.error(f"發送報告郵件時發生錯誤: {e}")
+        return False
 
-        # 安全地獲取應用程式密碼
-        app_password = os.environ.get("EMAIL_APP_PASSWORD")
 
-        # 如果環境變數未設置，則提示輸入
-        if not app_password:
-            app_password = getpass.getpass("請輸入應用程式密碼: ")
+_telegram_notifier = None
 
-        # 連接到 SMTP 伺服器並發送郵件
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.ehlo()
-            server.starttls()
-            server.ehlo()
-            server.login(smtp_user, app_password)
-            server.send_message(msg)
 
-        print(f"報告郵件已成功發送到 {recipient_email}")
-        return True
-    except Exception as e:
-        print(f"發送報告郵件時發生錯誤: {e}")
-        return False
+def get_telegram_notifier():
+    """取得共用的 Telegram 通知器，讓同一次執行的多則訊息共用連線"""
+    global _telegram_notifier
+    if _telegram_notifier is None:
+        _telegram_notifier = TelegramNotifier.from_env()
+    return _telegram_notifier
 
 
-def send_telegram_message(message):
-    """發送消息到 Telegram"""
+def send_telegram_message(message, dedup_key=None):
+    """發送消息到 Telegram，過長的訊息會自動分段"""
     try:
-        # 檢查是否設定了 Telegram 相關環境變數
-        telegram_bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
-        telegram_chat_id = os.getenv("TELEGRAM_CHAT_ID")
+        notifier = get_telegram_notifier()
 
         # 如果未設定 Telegram 相關資訊，則直接返回
-        if not telegram_bot_token or not telegram_chat_id:
-            print("未設定 Telegram Bot Token 或 Chat ID，跳過 Telegram 通知")
+        if notifier is None:
+            logger.info("未設定 Telegram Bot Token 或 Chat ID，跳過 Telegram 通知")
             return
 
-        print("準備發送 Telegram 通知...")
-        
-        # 發送消息到 Telegram
-        telegram_api_url = f"https://api.telegram.org/bot{telegram_bot_token}/sendMessage"
-        payload = {
-            "chat_id": telegram_chat_id,
-            "text": message,
-            "parse_mode": "HTML",  # 支援 HTML 格式
-        }
-
-        response = requests.post(telegram_api_url, json=payload, timeout=10)
-
-        if response.status_code == 200:
-            print(f"已成功發送 Telegram 通知")
-        else:
-            print(f"發送 Telegram 通知失敗，狀態碼: {response.status_code}, 回應: {response.text}")
-
-            # 如果 HTML 解析失敗，嘗試發送純文本
-            if "can't parse entities" in response.text:
-                print("Telegram HTML 解析失敗，嘗試以純文本格式重新發送...")
-                # 移除所有 HTML 標籤
-                import re
-                plain_text = re.sub(r"<[^>]+>", "", message)
-                
-                payload = {
-                    "chat_id": telegram_chat_id,
-                    "text": plain_text,
-                    "parse_mode": "",  # 不使用任何解析模式
-                }
-
-                response = requests.post(telegram_api_url, json=payload, timeout=10)
-                if response.status_code == 200:
-                    print(f"已成功以純文本格式發送 Telegram 通知")
-                else:
-                    print(f"純文本發送也失敗，狀態碼: {response.status_code}, 回應: {response.text}")
+        logger.info("準備發送 Telegram 通知...")
+        notifier.send(message, dedup_key=dedup_key)
 
     except Exception as e:
-        print(f"發送 Telegram 通知時發生錯誤: {str(e)}")
+        logger.error(f"發送 Telegram 通知時發生錯誤: {str(e)}")
 
 
-def format_telegram_message(websites_status, elapsed_time, ssl_results=None):
-    """格式化 Telegram 訊息內容，包含 SSL 憑證資訊"""
+def format_telegram_message(table, elapsed_time):
+    """格式化 Telegram 訊息內容，table 為要通知的網站的結果表 (包含 SSL 憑證資訊)"""
     # 取得環境信息
-    hostname = socket.gethostname()
-    ip_address = socket.gethostbyname(hostname)
-    current_user = getpass.getuser()
+    runtime_info = get_runtime_info()
+    runner_info = format_runner_info(runtime_info)
 
     # 統計結果
-    total_sites = len(websites_status)
-    online_sites = sum(1 for site in websites_status if site["status"] == "online")
+    summary = table.summary()
+    total_sites = summary["total"]
+    online_sites = summary["online"]
     offline_sites = total_sites - online_sites
 
     # 建立訊息標頭
@@ -429,7 +474,13 @@ def format_telegram_message(websites_status, elapsed_time, ssl_results=None):
     # 添加摘要資訊
     message += f"<b>檢測時間:</b> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
     message += f"<b>耗時:</b> {elapsed_time:.2f} 秒\n"
-    message += f"<b>檢測資訊:</b> {hostname} ({ip_address}), 使用者: {current_user}\n\n"
+    message += (
+        f"<b>檢測資訊:</b> {runtime_info['hostname']} ({runtime_info['ip_address']}), "
+        f"使用者: {runtime_info['user']}\n"
+    )
+    if runner_info:
+        message += f"<b>GitHub Actions:</b> {runner_info}\n"
+    message += "\n"
 
     # 添加統計資訊
     message += f"<b>檢測結果:</b> {online_sites}/{total_sites} 個網站運作正常\n\n"
@@ -437,9 +488,9 @@ def format_telegram_message(websites_status, elapsed_time, ssl_results=None):
     # 如果有網站異常，列出它們
     if offline_sites > 0:
         message += "<b>異常網站:</b>\n"
-        for site in websites_status:
-            if site["status"] != "online":
-                status_text = "逾時" if site["status"] == "timeout" else "異常"
+        for site, state in zip(table.results, table.state):
+            if state != ONLINE:
+                status_text = "逾時" if state == TIMEOUT else "異常"
                 error_detail = site.get("error") or "無詳細資訊"
                 response_time = (
                     f", 回應時間: {site['response_time']:.2f}秒"
@@ -453,66 +504,43 @@ def format_telegram_message(websites_status, elapsed_time, ssl_results=None):
                 message += f"❌ <a href='{site['url']}'>{site['url']}</a>: {status_text}{response_time}{status_code}\n"
                 message += f"   錯誤: {error_detail}\n"
 
-    # 如果有 SSL 憑證資訊，添加到報告中
-    if ssl_results:
-        # 創建一個網址到 SSL 結果的映射，方便查找
-        ssl_map = {cert["hostname"]: cert for cert in ssl_results}
-
+    # 如果有 SSL 憑證資訊，添加到報告中 (結果表已依主機對應好各網站的憑證)
+    if table.certs:
         message += "\n<b>SSL 憑證狀態:</b>\n"
-        print(websites_status, websites_status)
-        for site in websites_status:
-            if site["status"] == "online" and site["url"].startswith("https"):
-                from urllib.parse import urlparse
-
-                hostname = urlparse(site["url"]).netloc
-
-                if hostname in ssl_map:
-                    cert = ssl_map[hostname]
-
-                    # 根據剩餘天數決定顯示圖標
-                    if cert["remaining_days"] is None:
-                        icon = "❓"  # 未知
-                        status_text = "無法檢查"
-                    elif cert["remaining_days"] <= 0:
-                        icon = "🚨"  # 已過期
-                        status_text = f"已過期 ({cert['remaining_days']} 天)"
-                    elif cert["remaining_days"] <= 7:
-                        icon = "⚠️"  # 7天內到期
-                        status_text = f"即將到期 (剩餘 {cert['remaining_days']} 天)"
-                    elif cert["remaining_days"] <= 14:
-                        icon = "⚠️"  # 14天內到期
-                        status_text = f"即將到期 (剩餘 {cert['remaining_days']} 天)"
-                    else:
-                        icon = "✅"  # 有效
-                        status_text = f"有效 (剩餘 {cert['remaining_days']} 天)"
-
-                    # 到期日期
-                    expires_text = (
-                        f", 到期日: {cert['expiry_date'].strftime('%Y-%m-%d')}"
-                        if cert["expiry_date"]
-                        else ""
-                    )
-
-                    message += (
-                        f"{icon} https://{hostname}: {status_text}{expires_text}\n"
-                    )
-
-    # 如果訊息過長，截斷它，並加上說明
-    if len(message) > 4000:
-        message = message[:3950] + "\n\n... (訊息因長度限制而被截斷)"
+        for target, state, cert_row in zip(table.targets, table.state, table.cert_row):
+            if state != ONLINE or cert_row < 0 or not target.url.startswith("https"):
+                continue
+            cert = table.certs[cert_row]
+            level = table.cert_level[cert_row]
+
+            # 根據憑證等級決定顯示圖標
+            if level == CERT_UNKNOWN:
+                icon = "❓"  # 未知
+                status_text = "無法檢查"
+            elif level == CERT_EXPIRED:
+                icon = "🚨"  # 已過期
+                status_text = f"已過期 ({cert['remaining_days']} 天)"
+            elif level >= CERT_WARNING:
+                icon = "⚠️"  # 達到警告或緊急天數
+                status_text = f"即將到期 (剩餘 {cert['remaining_days']} 天)"
+            else:
+                icon = "✅"  # 有效
+                status_text = f"有效 (剩餘 {cert['remaining_days']} 天)"
+
+            # 到期日期
+            expires_text = (
+                f", 到期日: {cert['expiry_date'].strftime('%Y-%m-%d')}"
+                if cert["expiry_date"]
+                else ""
+            )
 
-    return message
+            message += f"{icon} https://{target.host}: {status_text}{expires_text}\n"
 
+    return message
 
-def format_ssl_telegram_message(ssl_results):
-    """格式化 SSL 憑證檢查的 Telegram 訊息"""
-    # 檢查是否有需要提醒的憑證
-    warning_certs = [
-        cert
-        for cert in ssl_results
-        if cert["remaining_days"] is not None and cert["remaining_days"] <= 14
-    ]
 
+def format_ssl_telegram_message(warning_certs):
+    """格式化 SSL 憑證檢查的 Telegram 訊息，warning_certs 為已達警告天數的憑證"""
     if not warning_certs:
         return None  # 如果沒有需要提醒的憑證，返回 None
 
@@ -531,7 +559,7 @@ def format_ssl_telegram_message(ssl_results):
         # 依剩餘天數決定警告級別
         if cert["remaining_days"] <= 0:
             icon = "🚨"  # 已過期
-        elif cert["remaining_days"] <= 7:
+        elif cert["remaining_days"] <= cert.get("critical_days", 7):
             icon = "⚠️"  # 7天內到期
         else:
             icon = "⚠️"  # 14天內到期
@@ -542,123 +570,334 @@ def format_ssl_telegram_message(ssl_results):
     return message
 
 
-def get_ssl_expiry_date(hostname, port=443):
-    context = ssl.create_default_context()
-    with socket.create_connection((hostname, port)) as sock:
-        with context.wrap_socket(sock, server_hostname=hostname) as ssock:
-            cert = ssock.getpeercert()
-            expiry_date = datetime.strptime(cert["notAfter"], "%b %d %H:%M:%S %Y %Z")
-            return expiry_date
-
-
-def main():
-    # 定義要檢測的重要網站清單
-    websites = [
-        "https://www.nknush.kh.edu.tw",
-        "https://zerojudge.tw",
-        "https://ashs.zerojudge.tw",
-        "https://slave1.zerojudge.tw",
-        "https://dump.zerojudge.tw/Login",
-        "https://apcs.zerojudge.tw",
-    ]
-
-    # 如果有命令列參數，使用提供的網站列表
-    if len(sys.argv) > 1:
-        websites = sys.argv[1:]
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="檢查重要網站的可用性與 SSL 憑證")
+    parser.add_argument("websites", nargs="*", help="要檢查的網址 (預設使用設定檔中的網站)")
+    parser.add_argument("--config", help=f"設定檔路徑 (預設 {DEFAULT_CONFIG_FILE})")
+    parser.add_argument(
+        "--recipient", action="append",
+        help=f"以命令列指定網址時的報告收件者，可重複指定 (預設 REPORT_RECIPIENT 或 {DEFAULT_RECIPIENT})",
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=PROBE_CONCURRENCY,
+        help=f"同時檢測可用性的網站數 (預設 {PROBE_CONCURRENCY})",
+    )
+    parser.add_argument(
+        "--daemon", action="store_true", help="常駐執行，依各網站的 interval 重複檢測"
+    )
+    parser.add_argument(
+        "--metrics-port", type=int, help="常駐模式下提供 /metrics 的連接埠 (例如 9108)"
+    )
+    probe = parser.add_argument_group("多地點探測", "由多個地點同時檢測，達到法定數的地點都異常才發出警報")
+    probe.add_argument("--location", help="以探測地點執行 (地點名稱)，只檢測並推送結果，需搭配 --push")
+    probe.add_argument("--push", help="探測結果的推送目標：彙整端網址 (http://host:port/probe) 或共用目錄")
+    probe.add_argument("--aggregate", action="store_true", help="以彙整端執行：合併各地點的結果後再發送通知")
+    probe.add_argument("--quorum", type=int, default=DEFAULT_QUORUM, help=f"確認故障所需的異常地點數 (預設 {DEFAULT_QUORUM})")
+    probe.add_argument("--expect", type=int, help="等待回報的地點數 (預設為 --local-probes 或 --quorum)")
+    probe.add_argument("--listen", type=int, help="彙整端接收回報的連接埠")
+    probe.add_argument("--collect", help="從目錄讀取各地點寫入的結果")
+    probe.add_argument("--local-probes", type=int, default=0, help="在本機啟動指定數量的程序模擬多個探測地點")
+    probe.add_argument("--wait", type=float, default=DEFAULT_WAIT, help=f"等待各地點回報的秒數 (預設 {DEFAULT_WAIT})")
+    probe.add_argument("--max-age", type=float, default=DEFAULT_MAX_AGE, help=f"超過此秒數的結果不列入判斷 (預設 {DEFAULT_MAX_AGE})")
+    add_logging_arguments(parser)
+    add_metrics_arguments(parser)
+    add_instrumentation_arguments(parser)
+    add_output_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.location and not args.push:
+        parser.error("--location 需要搭配 --push")
+    if args.aggregate and args.daemon:
+        parser.error("--aggregate 不能與 --daemon 同時使用")
+    if args.aggregate and not (args.listen is not None or args.collect or args.local_probes):
+        parser.error("--aggregate 需要 --listen、--collect 或 --local-probes 其中之一")
+    return args
+
+
+def record_site_metrics(target, result, total_time, ssl_result=None, ssl_time=None):
+    """更新網站的 Prometheus 指標"""
+    labels = {"site": target.name, "url": target.url}
+    metrics.set("site_up", 1 if result["status"] == "online" else 0, **labels)
+    metrics.set("site_status_code", result["status_code"] or 0, **labels)
+    metrics.set("site_phase_seconds", result["response_time"], phase="response", **labels)
+    metrics.set("site_phase_seconds", total_time, phase="total", **labels)
+    metrics.set("site_last_check_timestamp_seconds", time.time(), **labels)
+    metrics.inc("site_checks_total", status=result["status"], **labels)
+    if ssl_result is not None:
+        metrics.set("site_phase_seconds", ssl_time, phase="ssl", **labels)
+        metrics.set(
+            "ssl_cert_days_remaining",
+            ssl_result["remaining_days"],
+            host=ssl_result["hostname"],
+        )
 
-    recipient_email = "555@tea.nknush.kh.edu.tw"
 
-    print("開始檢查網站運作狀態...")
+def run_checks(config, websites, probe_results=None):
+    """
+    檢測指定的網站並依設定發送通知，回傳結果表 (ResultTable)
+    probe_results 為多地點彙整後的結果 (網址 -> 結果)，提供時不再自行檢測可用性
+    """
+    logger.info("開始檢查網站運作狀態...")
     start_time = time.time()
+    if probe_results is None:
+        # 可用性同時檢測，憑證檢查與通知仍依網站順序處理
+        probe_results = {result["url"]: result for result in probe_sites(websites)}
 
     # 儲存所有網站的檢測結果
     all_results = []
     ssl_results = []
 
     # 檢測每個網站
-    for website in websites:
-        # 檢查網站可用性
-        result = check_website(website)
+    for target in websites:
+        result = probe_results[target.url]
+        site_time = result["response_time"] or 0
         all_results.append(result)
 
         # 如果網站可連接且是 HTTPS，檢查 SSL 憑證
-        if result["status"] == "online" and website.startswith("https"):
+        ssl_result = ssl_time = None
+        if result["status"] == "online" and target.url.startswith("https"):
             try:
-                from urllib.parse import urlparse
-
-                hostname = urlparse(website).netloc
-                ssl_result = check_ssl_certificate(website)
+                ssl_start = time.perf_counter()
+                ssl_result = check_ssl_certificate(
+                    target.url,
+                    warning_days=target.ssl_warning_days,
+                    critical_days=target.ssl_critical_days,
+                )
+                ssl_time = time.perf_counter() - ssl_start
                 ssl_results.append(ssl_result)
             except Exception as e:
-                print(f"無法檢查 {website} 的 SSL 憑證: {e}")
+                logger.error(f"無法檢查 {target.url} 的 SSL 憑證: {e}")
+
+        record_site_metrics(target, result, site_time, ssl_result, ssl_time)
 
     elapsed_time = time.time() - start_time
+    # 建立結果表時依主機對應憑證一次，以下的統計與分派都從表中取得
+    table = ResultTable(websites, all_results, ssl_results)
 
     # 統計結果
-    total_sites = len(all_results)
-    online_sites = sum(1 for site in all_results if site["status"] == "online")
-    offline_sites = total_sites - online_sites
-
-    print("\n檢測完成！")
-    print(f"總計耗時: {elapsed_time:.2f} 秒")
-    print(f"檢測結果: {online_sites}/{total_sites} 個網站正常運作")
+    summary = table.summary()
+    logger.info(
+        f"檢測完成！總計耗時: {elapsed_time:.2f} 秒，{summary['online']}/{summary['total']} 個網站正常運作",
+        extra={"fields": {"online": summary["online"], "total": summary["total"], "elapsed_seconds": elapsed_time}},
+    )
 
-    if offline_sites > 0:
-        print("\n異常網站列表:")
-        for site in all_results:
-            if site["status"] != "online":
-                print(f"- {site['url']}: {site['error']}")
+    # 多地點模式下未達法定數的異常不列入通知
+    outages = table.outages()
+    for site in outages:
+        logger.warning(f"異常網站 {site['url']}: {site['error']}", extra={"fields": site})
 
     # 檢查是否有即將到期的 SSL 憑證
-    ssl_warnings = [
-        cert
-        for cert in ssl_results
-        if cert["remaining_days"] is not None and cert["remaining_days"] <= 14
-    ]
-    if ssl_warnings:
-        print("\nSSL 憑證警告:")
-        for cert in ssl_warnings:
-            print(
-                f"- {cert['hostname']}: 剩餘 {cert['remaining_days']} 天，到期日: {cert['expiry_date'].strftime('%Y-%m-%d')}"
-            )
+    for cert in table.certs_at_least(CERT_WARNING):
+        logger.warning(
+            f"SSL 憑證警告 {cert['hostname']}: 剩餘 {cert['remaining_days']} 天，到期日: {cert['expiry_date'].strftime('%Y-%m-%d')}"
+        )
 
-    # 準備網站可用性的 Telegram 訊息，將 SSL 結果一併傳入
-    telegram_message = format_telegram_message(all_results, elapsed_time, ssl_results)
+    # 依設定分派通知：每位收件者只收到自己負責的網站，Telegram 只包含啟用通知的網站
+    by_recipient = table.rollup(config.recipients(websites))
+    telegram = table.filter(lambda target: target.telegram)
 
     # 準備單獨的 SSL 憑證警告訊息 (僅包含即將到期的憑證)
-    ssl_warning_message = format_ssl_telegram_message(ssl_results)
+    # 網站可用性的 Telegram 訊息需要執行環境資訊 (可能等待 DNS)，只在確定發送時才產生
+    ssl_warning_message = format_ssl_telegram_message(telegram.certs_at_least(CERT_WARNING))
 
     # 處理網站可用性通知 (已包含 SSL 狀態)
-    if offline_sites > 0:
+    if outages:
         email_subject = (
             f"⚠️ 網站可用性警報 - {datetime.now().strftime('%Y-%m-%d %H:%M')}"
         )
-        send_report_email(
-            recipient_email, email_subject, all_results, elapsed_time, ssl_results
-        )  # 加入 ssl_results 參數
-        send_telegram_message(telegram_message)  # 發送 Telegram 通知
+        for recipient_email, (rows, outage_count) in by_recipient.items():
+            if outage_count:
+                subset = table.take(rows)
+                send_report_email(
+                    recipient_email, email_subject, subset.results, elapsed_time, subset.certs
+                )
+        # 同一組異常網站在合併時間窗內只通知一次，避免網站時好時壞洗版
+        telegram_outages = telegram.outages()
+        if telegram_outages:
+            outage_key = "outage:" + ",".join(sorted(site["url"] for site in telegram_outages))
+            send_telegram_message(format_telegram_message(telegram, elapsed_time), dedup_key=outage_key)
     else:
+        global _last_daily_report
         current_hour = datetime.now().hour
-        if 8 <= current_hour < 9:
+        today = datetime.now().date()
+        # 常駐模式下每天只發送一次日報
+        if 8 <= current_hour < 9 and _last_daily_report != today:
+            _last_daily_report = today
             email_subject = f"✓ 網站可用性日報 - {datetime.now().strftime('%Y-%m-%d')}"
-            send_report_email(
-                recipient_email, email_subject, all_results, elapsed_time, ssl_results
-            )  # 加入 ssl_results 參數
-            send_telegram_message(telegram_message)  # 發送 Telegram 通知
+            for recipient_email, (rows, _) in by_recipient.items():
+                subset = table.take(rows)
+                send_report_email(
+                    recipient_email, email_subject, subset.results, elapsed_time, subset.certs
+                )
+            if len(telegram):
+                # 發送 Telegram 通知
+                send_telegram_message(format_telegram_message(telegram, elapsed_time))
 
     # 處理 SSL 憑證到期警告 (只有即將到期的憑證才需要額外單獨發送)
     if ssl_warning_message:
-        print("\n發送 SSL 憑證到期警告...")
+        logger.info("發送 SSL 憑證到期警告...")
         # 如果不想重複發送，可以考慮只在非報告日或有特別緊急情況時發送
         # 例如，只在憑證剩餘天數 <= 7 天時才發送額外警告
-        critical_ssl_warnings = [
-            cert
-            for cert in ssl_results
-            if cert["remaining_days"] is not None and cert["remaining_days"] <= 7
-        ]
+        critical_ssl_warnings = telegram.certs_at_least(CERT_CRITICAL)
         if critical_ssl_warnings:
-            send_telegram_message(ssl_warning_message)  # 發送 SSL 憑證警告
+            ssl_key = "ssl:" + ",".join(
+                sorted(cert["hostname"] for cert in critical_ssl_warnings)
+            )
+            send_telegram_message(ssl_warning_message, dedup_key=ssl_key)
+
+    return table
+
+
+def run_daemon(config, args):
+    """常駐模式：依各網站的 interval 排程檢測，並持續提供指標"""
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+
+    last_run = {}
+    while True:
+        now = time.time()
+        due = [t for t in config.sites if now - last_run.get(t.name, 0) >= t.interval]
+        if due:
+            for target in due:
+                last_run[target.name] = now
+            run_checks(config, due)
+            # 常駐模式不一定正常結束，每輪檢測後就寫入延遲紀錄
+            get_host_latency().save()
+            if args.metrics_textfile:
+                metrics.write_textfile(args.metrics_textfile)
+
+        # 等到下一個網站需要檢測為止
+        now = time.time()
+        wait = min(last_run[t.name] + t.interval - now for t in config.sites)
+        time.sleep(max(1, wait))
+
+
+def build_config(args):
+    """如果有命令列參數，使用提供的網站列表；否則從設定檔載入"""
+    if args.websites:
+        return SiteConfig.from_urls(
+            args.websites, defaults={"notify": {"email": args.recipient or [DEFAULT_RECIPIENT]}}
+        )
+    return load_config(args.config)
+
+
+def probe_sites(websites):
+    """同時檢測所有網站的可用性 (不檢查憑證、不發送通知)，結果依網站順序排列"""
+    with ThreadPoolExecutor(max_workers=PROBE_CONCURRENCY) as pool:
+        return list(
+            pool.map(
+                lambda target: check_website(
+                    target.url,
+                    timeout=target.timeout,
+                    expected_status=target.expected_status,
+                    assertions=target.content,
+                ),
+                websites,
+            )
+        )
+
+
+def run_probe(config, location, destination):
+    """探測地點：檢測所有網站並把結果推送到彙整端"""
+    report = make_report(location, probe_sites(config.sites))
+    push_report(report, destination, token=os.getenv("PROBE_TOKEN"))
+    down = sum(1 for result in report["results"] if result["status"] != "online")
+    logger.info(f"[{location}] 已推送 {len(report['results'])} 個網站的結果到 {destination} ({down} 個異常)")
+
+
+def _run_probe_process(argv, location, destination):
+    """本機多程序模擬多個探測地點時每個子程序的進入點"""
+    args = parse_args(argv)
+    setup_logging(args)
+    run_probe(build_config(args), location, destination)
+
+
+def run_aggregated(config, args, argv):
+    """
+    彙整模式：等待各地點回報 (或由本機程序模擬多個地點同時探測)，
+    依法定數確認故障後，與單一地點相同地檢查憑證並發送通知
+    """
+    aggregator = ProbeAggregator(quorum=args.quorum, max_age=args.max_age, token=os.getenv("PROBE_TOKEN"))
+    expected = args.expect or args.local_probes or args.quorum
+    server = None
+    if args.listen is not None or args.local_probes:
+        server = aggregator.serve(args.listen or 0, host="127.0.0.1" if args.listen is None else "0.0.0.0")
+
+    pool = None
+    try:
+        if args.local_probes:
+            # 各地點同時探測，確認故障不會增加等待時間
+            push_url = f"http://127.0.0.1:{server.server_address[1]}/probe"
+            from concurrent.futures import ProcessPoolExecutor
+
+            pool = ProcessPoolExecutor(max_workers=args.local_probes)
+            for index in range(1, args.local_probes + 1):
+                pool.submit(_run_probe_process, argv, f"local-{index}", push_url)
+        if args.collect:
+            aggregator.load_dir(args.collect)
+
+        reported = aggregator.wait_for(expected, timeout=args.wait)
+        if reported < expected:
+            logger.warning(f"只有 {reported}/{expected} 個地點回報: {', '.join(aggregator.locations) or '無'}")
+        merged = aggregator.merge([target.url for target in config.sites])
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        if server is not None:
+            server.shutdown()
+    return run_checks(config, config.sites, {result["url"]: result for result in merged})
+
+
+def main(argv=None):
+    """執行網站檢測，回傳結束代碼 (見 run_status.py)"""
+    global PROBE_CONCURRENCY
+    argv = sys.argv[1:] if argv is None else list(argv)
+    args = parse_args(argv)
+    setup_logging(args)
+    setup_instrumentation(args)
+    PROBE_CONCURRENCY = max(1, args.concurrency)
+
+    config = build_config(args)
+
+    # 探測地點只回報結果，不檢查憑證也不發送通知
+    if args.location:
+        run_probe(config, args.location, args.push)
+        return finish_run(args, HEALTHY, command="check-sites", location=args.location)
+
+    # 在背景解析本機資訊，與網站檢測同時進行
+    prefetch_runtime_info()
+
+    table = ResultTable()
+    try:
+        if args.daemon:
+            run_daemon(config, args)
+        elif args.aggregate:
+            table = run_aggregated(config, args, argv)
+            if args.metrics_textfile:
+                metrics.write_textfile(args.metrics_textfile)
+        else:
+            table = run_checks(config, config.sites)
+            if args.metrics_textfile:
+                metrics.write_textfile(args.metrics_textfile)
+    except KeyboardInterrupt:
+        logger.info("已停止")
+    finally:
+        # 等待背景寄送完成 (逾時的郵件會留待下次重新寄送)
+        shutdown_mail_sender()
+        finish_instrumentation(args)
+
+    return finish_run(
+        args,
+        table.status(),
+        command="check-sites",
+        sites=[
+            {key: result.get(key) for key in ("url", "status", "status_code", "response_time", "error", "confirmed")}
+            for result in table.results
+        ],
+        certificates=[
+            {"hostname": cert["hostname"], "remaining_days": cert["remaining_days"]} for cert in table.certs
+        ],
+    )
 
 
 if __name__ == "__main__":
-    main()
+    run_main(main)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+網頁內容檢查
+以串流方式讀取回應內容，用預先編譯的單一正規表示式同時比對必要與禁止關鍵字，
+一旦可以確定結果就停止下載，避免每次檢測都抓取整個頁面
+"""
+
+import re
+import json
+
+CHUNK_SIZE = 16 * 1024
+
+# 關鍵字種類
+REQUIRED = "required"
+FORBIDDEN = "forbidden"
+
+
+def _response_encoding(response):
+    """只採用 Content-Type 中明確宣告的編碼，否則視為 UTF-8"""
+    content_type = response.headers.get("Content-Type", "")
+    match = re.search(r"charset=([\w-]+)", content_type, re.IGNORECASE)
+    return match.group(1).lower() if match else "utf-8"
+
+
+def _encode_keyword(keyword, encoding):
+    """
+    以頁面的編碼表示關鍵字；編碼無法表示 (例如 latin-1 頁面上的中文) 或不認得該編碼時改用 UTF-8，
+    不會產生空的比對群組而讓每個關鍵字都在開頭比對成功
+    """
+    try:
+        encoded = keyword.encode(encoding)
+    except (UnicodeEncodeError, LookupError):
+        encoded = b""
+    return encoded or keyword.encode("utf-8")
+
+
+class ContentAssertions:
+    """網頁內容斷言：必要關鍵字、禁止關鍵字、內容大小上限與 JSON 欄位檢查"""
+
+    def __init__(
+        self,
+        required=(),
+        forbidden=(),
+        max_body_size=None,
+        json_field=None,
+        json_value=None,
+    ):
+        self.required = list(required)
+        self.forbidden = list(forbidden)
+        self.max_body_size = max_body_size
+        self.json_field = json_field
+        self.json_value = json_value
+        # 每個群組對應的 (種類, 關鍵字)
+        self._keywords = [(REQUIRED, k) for k in self.required] + [
+            (FORBIDDEN, k) for k in self.forbidden
+        ]
+        # 依編碼快取編譯好的比對器，通常只會用到 UTF-8
+        self._matchers = {}
+        self._matcher("utf-8")
+
+    @classmethod
+    def from_settings(cls, settings, expected_keyword=None):
+        """由設定檔的 content 區塊建立斷言，沒有任何檢查時回傳 None"""
+        settings = dict(settings or {})
+        required = settings.get("required", [])
+        if isinstance(required, str):
+            required = [required]
+        if expected_keyword:
+            required = [expected_keyword] + list(required)
+        forbidden = settings.get("forbidden", [])
+        if isinstance(forbidden, str):
+            forbidden = [forbidden]
+
+        if not (
+            required
+            or forbidden
+            or settings.get("max_body_size")
+            or settings.get("json_field")
+        ):
+            return None
+        return cls(
+            required=required,
+            forbidden=forbidden,
+            max_body_size=settings.get("max_body_size"),
+            json_field=settings.get("json_field"),
+            json_value=settings.get("json_value"),
+        )
+
+    def _matcher(self, encoding):
+        if encoding not in self._matchers:
+            if not self._keywords:
+                self._matchers[encoding] = (None, 0)
+            else:
+                encoded = [_encode_keyword(k, encoding) for _, k in self._keywords]
+                pattern = re.compile(b"|".join(b"(" + re.escape(k) + b")" for k in encoded))
+                self._matchers[encoding] = (pattern, max(len(k) for k in encoded))
+        return self._matchers[encoding]
+
+    def _check_json(self, body):
+        try:
+            value = json.loads(body)
+            for key in self.json_field.split("."):
+                value = value[int(key)] if isinstance(value, list) else value[key]
+        except (ValueError, KeyError, IndexError, TypeError):
+            return False, f"JSON 欄位 {self.json_field} 不存在或內容無法解析"
+        if self.json_value is not None and value != self.json_value:
+            return False, f"JSON 欄位 {self.json_field} 為 {value!r}，預期 {self.json_value!r}"
+        return True, None
+
+    def evaluate(self, response, chunk_size=CHUNK_SIZE):
+        """
+        串流讀取 response (需以 stream=True 取得) 並判斷內容是否正常
+        回傳 (是否通過, 錯誤訊息, 已讀取位元組數)
+        """
+        pattern, max_keyword_len = self._matcher(_response_encoding(response))
+        found = set()
+        tail = b""
+        size = 0
+        body = bytearray() if self.json_field else None
+
+        # 有 Content-Length 時不必下載就能判斷是否超過大小上限
+        content_length = response.headers.get("Content-Length", "")
+        if content_length.isdigit() and self.max_body_size:
+            if int(content_length) > self.max_body_size:
+                response.close()
+                return False, f"網頁內容超過大小上限 {self.max_body_size} 位元組", 0
+
+        # 只有必要關鍵字時，全部找到即可提前結束
+        stop_when_found = (
+            not self.forbidden
+            and not self.json_field
+            and (not self.max_body_size or content_length.isdigit())
+        )
+        required_count = len(set(self.required))
+
+        try:
+            for chunk in response.iter_content(chunk_size):
+                size += len(chunk)
+                if self.max_body_size and size > self.max_body_size:
+                    return False, f"網頁內容超過大小上限 {self.max_body_size} 位元組", size
+
+                if body is not None:
+                    body += chunk
+
+                if pattern is not None:
+                    # 保留上一段結尾，避免關鍵字剛好被切在兩段之間
+                    window = tail + chunk
+                    for match in pattern.finditer(window):
+                        kind, keyword = self._keywords[match.lastindex - 1]
+                        if kind == FORBIDDEN:
+                            return False, f"網頁內容包含禁止關鍵字: {keyword}", size
+                        found.add(keyword)
+                    tail = window[-(max_keyword_len - 1):] if max_keyword_len > 1 else b""
+
+                if stop_when_found and len(found) == required_count:
+                    return True, None, size
+        finally:
+            response.close()
+
+        missing = [k for k in self.required if k not in found]
+        if missing:
+            return False, f"網頁內容缺少關鍵字: {', '.join(missing)}", size
+
+        if self.json_field:
+            ok, message = self._check_json(bytes(body))
+            if not ok:
+                return False, message, size
+
+        return True, None, size
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+CPU 密集工作的程序池
+HTML 解析與 Google 文件權限判斷會佔住 GIL，交給子程序處理才能用到多個核心；
+網路請求仍在執行緒中進行，回應內容以 bytes 傳給子程序，不先在主程序解碼成字串
+同時送出的工作數以信號量限制，子程序忙碌時請求端會等待，不會無限堆積回應內容
+"""
+
+import os
+import atexit
+import threading
+
+
+class CpuPool:
+    """延遲建立的程序池，只有一個工作程序時直接在本程序執行"""
+
+    def __init__(self, workers=None, max_pending=None):
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.max_pending = max_pending
+        self._slots = None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+
+                # 主程序已有背景執行緒 (郵件、DNS 預先解析)，以 forkserver 避免直接 fork
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context("forkserver") if "forkserver" in methods else None
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                self._slots = threading.BoundedSemaphore(self.max_pending or self.workers * 2)
+                atexit.register(self.close)
+            return self._executor
+
+    def run(self, fn, *args):
+        """在子程序執行 fn(*args) 並等待結果，fn 與參數必須可以 pickle"""
+        if self.workers <= 1:
+            return fn(*args)
+        executor = self._get_executor()
+        with self._slots:
+            return executor.submit(fn, *args).result()
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+
+# 整個程序共用的程序池，工作程序數由命令列 --parse-workers 設定
+cpu_pool = CpuPool()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+全站檢查的頁面來源
+讀取 robots.txt 的規則與 Crawl-delay，從其中列出的 sitemap (或預設的 /sitemap.xml)
+找出所有頁面，以 iterparse 串流解析 sitemap 與 sitemap index，大型 sitemap 也只占用固定記憶體
+<lastmod> 與上次執行時相同的頁面可以略過不檢查
+"""
+
+import os
+import gzip
+import json
+import urllib.parse
+import urllib.robotparser
+import logging
+import xml.etree.ElementTree as ET
+
+from instrumentation import instrumentation
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STATE_FILE = ".crawl_state.json"
+# 避免設定錯誤的 sitemap index 無限展開
+MAX_SITEMAP_DEPTH = 3
+SITEMAP_NAMESPACE_PREFIX = "{http://www.sitemaps.org/schemas/sitemap/"
+
+
+def _sitemap_name(tag):
+    """
+    回傳 sitemap 命名空間 (或無命名空間) 標籤的名稱，{http://www.sitemaps.org/...}loc -> loc
+    其他命名空間 (例如 image:loc) 回傳 None，避免覆蓋頁面網址
+    """
+    if not tag.startswith("{"):
+        return tag
+    if tag.startswith(SITEMAP_NAMESPACE_PREFIX):
+        return tag.rsplit("}", 1)[-1]
+    return None
+
+
+class CrawlState:
+    """記錄每個頁面上次檢查時的 lastmod，供下次執行判斷是否需要重新檢查"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lastmod = {}
+        self._changed = False
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._lastmod = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"無法讀取爬取狀態檔 {path}，將重新檢查所有頁面: {e}")
+
+    def unchanged(self, url, lastmod):
+        """頁面提供 lastmod 且與上次檢查時相同"""
+        return bool(lastmod) and self._lastmod.get(url) == lastmod
+
+    def mark_checked(self, url, lastmod):
+        if lastmod and self._lastmod.get(url) != lastmod:
+            self._lastmod[url] = lastmod
+            self._changed = True
+
+    def save(self):
+        if not self.path or not self._changed:
+            return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._lastmod, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"無法寫入爬取狀態檔 {self.path}: {e}")
+
+
+class CrawlSeeder:
+    """依 robots.txt 與 sitemap 產生要檢查的頁面清單"""
+
+    def __init__(self, session, user_agent="CheckWeblink", timeout=10):
+        self.session = session
+        # robots.txt 以此名稱比對規則，沒有專屬規則時套用 User-agent: *
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self.robots = None
+        self.discovered = 0
+
+    def load_robots(self, site_url):
+        """讀取 robots.txt，無法取得時視為全部允許"""
+        robots_url = urllib.parse.urljoin(site_url, "/robots.txt")
+        self.robots = urllib.robotparser.RobotFileParser(robots_url)
+        try:
+            with instrumentation.stage("robots"):
+                response = self.session.get(robots_url, timeout=self.timeout)
+        except Exception as e:
+            logger.warning(f"無法讀取 {robots_url}，視為允許所有頁面: {e}")
+            self.robots.parse([])
+            return self.robots
+
+        if response.status_code in (401, 403):
+            self.robots.disallow_all = True
+        elif response.status_code >= 400:
+            self.robots.allow_all = True
+        else:
+            self.robots.parse(response.text.splitlines())
+        return self.robots
+
+    def can_fetch(self, url):
+        return self.robots is None or self.robots.can_fetch(self.user_agent, url)
+
+    def crawl_delay(self):
+        """robots.txt 要求的請求間隔 (秒)，未設定時回傳 None"""
+        if self.robots is None:
+            return None
+        delay = self.robots.crawl_delay(self.user_agent)
+        if delay is None:
+            rate = self.robots.request_rate(self.user_agent)
+            if rate is not None and rate.requests:
+                delay = rate.seconds / rate.requests
+        return float(delay) if delay is not None else None
+
+    def sitemap_urls(self, site_url):
+        """robots.txt 列出的 sitemap，沒有時使用 /sitemap.xml"""
+        listed = self.robots.site_maps() if self.robots is not None else None
+        return listed or [urllib.parse.urljoin(site_url, "/sitemap.xml")]
+
+    def _open_stream(self, sitemap_url):
+        """以串流方式開啟 sitemap，.gz 檔在讀取時解壓縮"""
+        response = self.session.get(sitemap_url, timeout=self.timeout, stream=True)
+        response.raise_for_status()
+        # 依 Content-Encoding 自動解壓縮 (gzip 傳輸編碼)
+        response.raw.decode_content = True
+        stream = response.raw
+        if urllib.parse.urlparse(sitemap_url).path.endswith(".gz"):
+            stream = gzip.GzipFile(fileobj=stream)
+        return response, stream
+
+    def iter_sitemap(self, sitemap_url, depth=0):
+        """逐筆產生 (頁面網址, lastmod)，遇到 sitemap index 時展開其中的 sitemap"""
+        try:
+            response, stream = self._open_stream(sitemap_url)
+        except Exception as e:
+            logger.warning(f"無法讀取 sitemap {sitemap_url}: {e}")
+            return
+
+        nested = []
+        try:
+            root = None
+            loc = lastmod = None
+            for event, elem in ET.iterparse(stream, events=("start", "end")):
+                if root is None:
+                    root = elem
+                if event == "start":
+                    continue
+                name = _sitemap_name(elem.tag)
+                if name == "loc":
+                    loc = (elem.text or "").strip()
+                elif name == "lastmod":
+                    lastmod = (elem.text or "").strip()
+                elif name in ("url", "sitemap"):
+                    if loc:
+                        if name == "sitemap":
+                            nested.append(loc)
+                        else:
+                            yield loc, lastmod
+                    loc = lastmod = None
+                    # 處理完的項目立即從根節點移除，記憶體用量與 sitemap 大小無關
+                    root.clear()
+        except ET.ParseError as e:
+            logger.warning(f"sitemap {sitemap_url} 格式錯誤: {e}")
+        finally:
+            response.close()
+
+        for child_url in nested:
+            if depth + 1 >= MAX_SITEMAP_DEPTH:
+                logger.warning(f"sitemap index 層數過深，略過 {child_url}")
+                continue
+            yield from self.iter_sitemap(child_url, depth + 1)
+
+    def seed(self, site_url, state=None, sitemap=None, max_pages=None):
+        """
+        產生要檢查的頁面清單 [(網址, lastmod), ...]
+        略過 robots.txt 不允許的頁面，以及 lastmod 未變動的頁面
+        """
+        self.load_robots(site_url)
+        sitemaps = [sitemap] if isinstance(sitemap, str) else self.sitemap_urls(site_url)
+
+        pages = []
+        seen = set()
+        disallowed = unchanged = 0
+        for sitemap_url in sitemaps:
+            for url, lastmod in self.iter_sitemap(sitemap_url):
+                if url in seen:
+                    continue
+                seen.add(url)
+                if not self.can_fetch(url):
+                    disallowed += 1
+                    continue
+                if state is not None and state.unchanged(url, lastmod):
+                    unchanged += 1
+                    continue
+                pages.append((url, lastmod))
+                if max_pages and len(pages) >= max_pages:
+                    break
+            if max_pages and len(pages) >= max_pages:
+                logger.info(f"已達頁面上限 {max_pages}，其餘頁面留待下次檢查")
+                break
+
+        self.discovered = len(seen)
+        logger.info(
+            f"sitemap 共 {len(seen)} 個頁面：待檢查 {len(pages)}，"
+            f"robots.txt 不允許 {disallowed}，未變動略過 {unchanged}"
+        )
+        return pages
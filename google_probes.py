@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Google 文件的輕量探測
+未登入時開啟私人的表單、文件、試算表、簡報或 Drive 檔案，Google 一律轉址到 accounts.google.com 登入頁，
+因此這幾類連結只送 HEAD (不支援時改用不讀內容的 GET)，看到轉往登入頁的轉址就停下，不必下載並解析整個頁面；
+Drive 資料夾與無法辨識的網址仍讀取頁面以文字判斷 (page_parser.classify_google_docs_page)
+
+匯出網址 (export?format=...) 雖然回應更小，但擁有者停用下載時公開的檔案也會回應 403，不能用來判斷權限
+
+使用方法:
+  python google_probes.py --validate                      # 以錄製的回應 (google_fixtures.json) 離線驗證探測表
+  python google_probes.py --record google_fixtures.json   # 重新向 Google 請求並更新錄製的回應
+"""
+
+import io
+import re
+import sys
+import json
+import argparse
+
+import requests
+
+from page_parser import classify_google_docs_page
+
+DEFAULT_FIXTURES = "google_fixtures.json"
+
+# 轉往這些網址表示需要登入
+LOGIN_URL_PATTERN = re.compile(r"accounts\.google\.com/|google\.com/accounts/")
+
+# 只取標頭的探測：伺服器不支援 HEAD 時改用 GET (不讀內容)
+HEAD_UNSUPPORTED_STATUSES = {405, 501}
+# 表示需要權限的狀態碼
+PERMISSION_STATUSES = {401, 403}
+
+# 判斷結果
+ACCESSIBLE = "accessible"
+PERMISSION = "permission"
+STATUS = "status"  # 輕量探測無法判斷 (例如 404)，與一般連結相同地依狀態碼回報
+PAGE = "page"
+
+# 錄製回應時保留的標頭與內容大小上限
+RECORDED_HEADERS = ("Location", "Content-Type")
+MAX_RECORDED_BODY = 256 * 1024
+
+
+def is_login_url(url):
+    return LOGIN_URL_PATTERN.search(url) is not None
+
+
+class GoogleProbe:
+    """一類 Google 資源的網址格式與探測方式"""
+
+    def __init__(self, kind, label, pattern, signal="headers"):
+        self.kind = kind
+        self.label = label
+        self.pattern = re.compile(pattern)
+        # headers: 只看狀態碼與轉址，page: 讀取整個頁面
+        self.signal = signal
+
+    def fetch(self, fetcher, url, timeout):
+        """只取標頭並在轉往登入頁時停下，回傳 (response, 結果)"""
+        response, result = fetcher.fetch(url, timeout=timeout, method="HEAD", stop_at=is_login_url)
+        if response.status_code in HEAD_UNSUPPORTED_STATUSES:
+            response, result = fetcher.fetch(url, timeout=timeout, stop_at=is_login_url)
+        return response, result
+
+    def decides(self, response, result):
+        """狀態碼或轉址足以判斷權限 (否則交給一般的狀態碼檢查)"""
+        return result["stopped"] or response.status_code == 200 or response.status_code in PERMISSION_STATUSES
+
+    def classify(self, response, result):
+        """回傳 (是否可存取, 說明)，與 classify_google_docs_page 相同"""
+        if result["stopped"]:
+            return False, f"{self.label}需要登入 (轉址到 Google 登入頁)"
+        if response.status_code in PERMISSION_STATUSES:
+            return False, f"{self.label}需要權限 (狀態碼 {response.status_code})"
+        return True, f"{self.label}可公開存取"
+
+
+# 依序比對，第一個符合的為準；未列出的 Google 網址讀取整個頁面判斷
+PROBES = [
+    GoogleProbe("form", "Google 表單", r"(?:docs|forms)\.google\.com/forms/(?:u/\d+/)?d/(?:e/)?[\w-]+"),
+    # 已發佈到網路的文件 (/d/e/.../pub) 不需要登入，取消發佈後回應 404
+    GoogleProbe(
+        "published", "已發佈的 Google 文件",
+        r"docs\.google\.com/(?:document|spreadsheets|presentation)/(?:u/\d+/)?d/e/[\w-]+",
+    ),
+    GoogleProbe("document", "Google 文件", r"docs\.google\.com/document/(?:u/\d+/)?d/[\w-]+"),
+    GoogleProbe("spreadsheet", "Google 試算表", r"docs\.google\.com/spreadsheets/(?:u/\d+/)?d/[\w-]+"),
+    GoogleProbe("presentation", "Google 簡報", r"docs\.google\.com/presentation/(?:u/\d+/)?d/[\w-]+"),
+    GoogleProbe(
+        "drive_file", "Google Drive 檔案",
+        r"drive\.google\.com/(?:file/(?:u/\d+/)?d/[\w-]+|(?:open|uc)\?(?:[^#]*&)?id=[\w-]+)",
+    ),
+    # 私人資料夾可能以登入頁或「需要權限」頁面回應，需要讀取內容判斷
+    GoogleProbe("drive_folder", "Google Drive 資料夾", r"drive\.google\.com/drive/(?:u/\d+/)?folders/", signal="page"),
+]
+
+
+def match(url):
+    """網址對應的探測方式，無法辨識時回傳 None"""
+    for probe in PROBES:
+        if probe.pattern.search(url):
+            return probe
+    return None
+
+
+def probe_for(url):
+    """可以只取標頭判斷的 Google 網址回傳其探測方式，需要讀取整個頁面時回傳 None"""
+    probe = match(url)
+    return probe if probe is not None and probe.signal == "headers" else None
+
+
+def evaluate(url, fetcher, timeout=10):
+    """
+    與 checkWeblink.check_link 相同地判斷一個 Google 連結，回傳 (類型, 結果, 說明)
+    結果為 ACCESSIBLE、PERMISSION 或 STATUS (依狀態碼回報)
+    """
+    probe = probe_for(url)
+    if probe is None:
+        matched = match(url)
+        response, result = fetcher.fetch(url, timeout=timeout, keep_body=True)
+        if result["body"] is None:
+            return matched.kind if matched else PAGE, STATUS, fetcher.limit_issue(result) or "無法讀取內容"
+        accessible, message = classify_google_docs_page(result["body"], response.encoding, response.url)
+        return matched.kind if matched else PAGE, ACCESSIBLE if accessible else PERMISSION, message
+
+    response, result = probe.fetch(fetcher, url, timeout)
+    if not probe.decides(response, result):
+        return probe.kind, STATUS, f"狀態碼 {response.status_code}"
+    accessible, message = probe.classify(response, result)
+    return probe.kind, ACCESSIBLE if accessible else PERMISSION, message
+
+
+def _replay_response(method, url, record):
+    """把錄製的回應還原成串流讀取的 requests.Response"""
+    response = requests.Response()
+    response.status_code = record["status"]
+    response.url = url
+    response.headers.update(record.get("headers", {}))
+    body = b"" if method == "HEAD" else record.get("body", "").encode("utf-8")
+    response.headers.setdefault("Content-Length", str(len(body)))
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    response.raw = io.BytesIO(body)
+    return response
+
+
+class ReplaySession:
+    """依 (方法, 網址) 回放錄製的回應，探測送出未錄製的請求時引發 KeyError"""
+
+    def __init__(self, responses):
+        self.responses = {(record["method"], record["url"]): record for record in responses}
+        self.requests = []
+
+    def request(self, method, url, **kwargs):
+        self.requests.append((method, url))
+        record = self.responses.get((method, url))
+        if record is None:
+            raise KeyError(f"沒有錄製的回應: {method} {url}")
+        return _replay_response(method, url, record)
+
+
+class RecordingSession:
+    """實際送出請求並記錄每個回應 (狀態碼、轉址與內容)，再以錄製的內容回傳"""
+
+    def __init__(self, session):
+        self.session = session
+        self.recorded = []
+
+    def request(self, method, url, headers=None, timeout=None, **kwargs):
+        response = self.session.request(method, url, headers=headers, timeout=timeout, allow_redirects=False)
+        record = {
+            "method": method,
+            "url": url,
+            "status": response.status_code,
+            "headers": {key: response.headers[key] for key in RECORDED_HEADERS if key in response.headers},
+        }
+        if method != "HEAD" and response.content:
+            record["body"] = response.content[:MAX_RECORDED_BODY].decode(response.encoding or "utf-8", "replace")
+        self.recorded.append(record)
+        return _replay_response(method, url, record)
+
+
+def _fetcher(session):
+    from link_fetcher import LinkFetcher, RedirectCache
+
+    # 每個案例各自的轉址快取，避免前一個案例的永久轉址影響結果
+    return LinkFetcher(session, cache=RedirectCache())
+
+
+def validate(cases):
+    """以錄製的回應逐一判斷，回傳不符合預期的案例說明"""
+    failures = []
+    for case in cases:
+        session = ReplaySession(case["responses"])
+        try:
+            kind, outcome, message = evaluate(case["url"], _fetcher(session))
+        except KeyError as e:
+            failures.append(f"{case['url']}: {e.args[0]}")
+            continue
+        expected = (case["kind"], case["expected"])
+        if (kind, outcome) != expected:
+            failures.append(f"{case['url']}: 預期 {expected}，實際為 ({kind}, {outcome}) {message}")
+        elif "requests" in case and len(session.requests) != case["requests"]:
+            failures.append(f"{case['url']}: 預期 {case['requests']} 個請求，實際為 {len(session.requests)} 個")
+    return failures
+
+
+def record(cases, session):
+    """重新請求每個案例並以實際的回應取代錄製內容 (預期結果不變)"""
+    for case in cases:
+        recorder = RecordingSession(session)
+        try:
+            evaluate(case["url"], _fetcher(recorder))
+        except requests.exceptions.RequestException as e:
+            print(f"無法請求 {case['url']}: {e}", file=sys.stderr)
+            continue
+        case["responses"] = recorder.recorded
+        case["requests"] = len(recorder.recorded)
+    return cases
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="以錄製的回應驗證 Google 文件的輕量探測")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--validate", nargs="?", const=DEFAULT_FIXTURES, metavar="FILE", help=f"驗證錄製的回應 (預設 {DEFAULT_FIXTURES})")
+    group.add_argument("--record", metavar="FILE", help="重新向 Google 請求並更新錄製的回應")
+    args = parser.parse_args(argv)
+
+    if args.record:
+        with open(args.record, "r", encoding="utf-8") as f:
+            fixtures = json.load(f)
+        from checkWeblink import create_session
+
+        record(fixtures["cases"], create_session())
+        with open(args.record, "w", encoding="utf-8") as f:
+            json.dump(fixtures, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"已更新 {len(fixtures['cases'])} 個案例的錄製回應: {args.record}")
+        return 0
+
+    path = args.validate or DEFAULT_FIXTURES
+    with open(path, "r", encoding="utf-8") as f:
+        cases = json.load(f)["cases"]
+    failures = validate(cases)
+    for failure in failures:
+        print(f"✗ {failure}")
+    print(f"{len(cases) - len(failures)}/{len(cases)} 個案例符合預期")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+主機延遲與斷路器
+記錄每個主機的回應延遲 (平滑平均與變異，與 TCP 計算重傳逾時的方法相同)，
+依此決定每個主機的逾時：很慢但正常的主機可以等久一點，快速的主機不必等滿預設逾時；
+延遲紀錄存檔供下次執行使用
+
+某個主機連續連線失敗達到上限後，斷路器打開，該主機其餘的連結不再送出請求，直接以相同的錯誤回報；
+冷卻時間過後放行一個試探請求 (半開)，成功即關閉斷路器，失敗則再等一個冷卻時間，
+常駐模式或同一主機出現在多個目標時，恢復的主機不會一直被略過
+"""
+
+import os
+import json
+import time
+import atexit
+import threading
+import logging
+import urllib.parse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LATENCY_FILE = ".host_latency.json"
+# 平滑係數 (RFC 6298)
+SRTT_GAIN = 1 / 8
+RTTVAR_GAIN = 1 / 4
+# 樣本數達到此值才依延遲決定逾時，之前使用預設逾時
+MIN_SAMPLES = 3
+# 逾時的下限 (秒) 與上限 (預設逾時的倍數)
+MIN_TIMEOUT = 2.0
+MAX_TIMEOUT_FACTOR = 3
+# 超過此天數沒有更新的主機不再保留
+EXPIRE_DAYS = 30
+# 連續連線失敗幾次後打開斷路器
+FAILURE_THRESHOLD = 3
+# 斷路器打開多久 (秒) 後放行一個試探請求
+BREAKER_COOLDOWN = 60
+
+
+class HostUnavailable(Exception):
+    """斷路器已打開，不再對該主機送出請求"""
+
+
+def _host(url):
+    """以主機名稱 (指定連接埠時加上連接埠) 區分主機"""
+    parsed = urllib.parse.urlparse(url)
+    host = parsed.hostname or ""
+    return f"{host}:{parsed.port}" if parsed.port else host
+
+
+class HostLatency:
+    """每個主機的延遲估計 (可存檔) 與本次執行的斷路器狀態"""
+
+    def __init__(self, path=None, failure_threshold=FAILURE_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.path = path
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._hosts = {}
+        self._failures = {}  # 主機 -> (連續失敗次數, 最後的錯誤, 斷路器打開或上次試探的時間)
+        self._lock = threading.Lock()
+        self._changed = False
+        self._load()
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        kwargs.setdefault("path", os.getenv("HOST_LATENCY_FILE", DEFAULT_LATENCY_FILE))
+        return cls(**kwargs)
+
+    def _read(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"無法讀取主機延遲紀錄 {self.path}: {e}")
+            return {}
+
+    def _load(self):
+        expire_before = time.time() - EXPIRE_DAYS * 86400
+        self._hosts = {
+            host: entry for host, entry in self._read().items() if entry.get("updated", 0) > expire_before
+        }
+
+    def save(self):
+        """寫入延遲紀錄；與檔案中其他程序 (分片) 寫入的主機合併，同一主機保留較新的紀錄"""
+        if not self.path or not self._changed:
+            return
+        entries = self._read()
+        with self._lock:
+            for host, entry in self._hosts.items():
+                if entry["updated"] >= entries.get(host, {}).get("updated", 0):
+                    entries[host] = dict(entry)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._changed = False
+        except OSError as e:
+            logger.warning(f"無法寫入主機延遲紀錄 {self.path}: {e}")
+
+    def timeout(self, url, default):
+        """
+        主機的逾時：平滑延遲加上 4 倍變異 (RFC 6298 的重傳逾時)，
+        介於 MIN_TIMEOUT 與預設逾時的 MAX_TIMEOUT_FACTOR 倍之間；樣本不足時使用預設逾時
+        """
+        entry = self._hosts.get(_host(url))
+        if entry is None or entry["samples"] < MIN_SAMPLES:
+            return default
+        estimate = entry["srtt"] + 4 * entry["rttvar"]
+        return min(max(MIN_TIMEOUT, estimate), default * MAX_TIMEOUT_FACTOR)
+
+    def record(self, url, seconds):
+        """記錄一次成功請求的延遲 (到收到回應標頭為止)，並重設該主機的連續失敗次數"""
+        host = _host(url)
+        with self._lock:
+            self._failures.pop(host, None)
+            self._update(host, seconds)
+
+    def _update(self, host, seconds):
+        entry = self._hosts.get(host)
+        if entry is None:
+            entry = self._hosts[host] = {"srtt": seconds, "rttvar": seconds / 2, "samples": 0}
+        else:
+            entry["rttvar"] += RTTVAR_GAIN * (abs(entry["srtt"] - seconds) - entry["rttvar"])
+            entry["srtt"] += SRTT_GAIN * (seconds - entry["srtt"])
+        entry["samples"] += 1
+        entry["updated"] = time.time()
+        self._changed = True
+
+    def failure(self, url, error, timeout=None):
+        """
+        記錄一次連線失敗，連續失敗達到上限時打開斷路器；
+        逾時也計入延遲 (以當次逾時作為樣本)，下次執行會給這個主機較長的逾時
+        """
+        host = _host(url)
+        with self._lock:
+            if timeout is not None:
+                self._update(host, timeout)
+            count = self._failures.get(host, (0, None, None))[0] + 1
+            opened_at = time.monotonic() if count >= self.failure_threshold else None
+            self._failures[host] = (count, str(error), opened_at)
+        if count == self.failure_threshold:
+            logger.warning(
+                f"主機 {host} 連續 {count} 次連線失敗，略過此主機其餘的連結: {error}",
+                extra={"fields": {"host": host, "failures": count}},
+            )
+
+    def _cooling(self, count, opened_at):
+        return count >= self.failure_threshold and time.monotonic() - opened_at < self.cooldown
+
+    def check(self, url):
+        """
+        斷路器打開時引發 HostUnavailable (訊息包含最後一次的錯誤)；
+        冷卻時間已過則放行這一個請求作為試探，其他請求再等一個冷卻時間
+        """
+        host = _host(url)
+        with self._lock:
+            count, error, opened_at = self._failures.get(host, (0, None, None))
+            if count < self.failure_threshold:
+                return
+            if not self._cooling(count, opened_at):
+                self._failures[host] = (count, error, time.monotonic())
+                logger.info(f"主機 {host} 的斷路器冷卻時間已過，送出試探請求")
+                return
+        raise HostUnavailable(f"主機 {host} 連續 {count} 次連線失敗，未再請求 (最後錯誤: {error})")
+
+    def available(self, url):
+        count, _, opened_at = self._failures.get(_host(url), (0, None, None))
+        return not self._cooling(count, opened_at)
+
+    def __len__(self):
+        return len(self._hosts)
+
+
+_default_latency = None
+
+
+def get_host_latency():
+    """取得共用的主機延遲紀錄，程式結束時自動存檔"""
+    global _default_latency
+    if _default_latency is None:
+        _default_latency = HostLatency.from_env()
+        atexit.register(_default_latency.save)
+    return _default_latency
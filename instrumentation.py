@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+效能量測工具
+以旗標開啟後記錄各階段耗時 (抓取主頁、解析並擷取連結、DNS、單一連結請求、
+Google 權限判斷、報告產生、SMTP/Telegram 發送)、計數器與直方圖，
+並可搭配 cProfile 或取樣式分析器輸出火焰圖 (collapsed stack) 檔案
+未開啟時所有量測呼叫幾乎沒有額外負擔
+"""
+
+import sys
+import time
+import socket
+import threading
+import contextlib
+import logging
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# 直方圖的區間上限 (秒)，從 0.1ms 開始每格加倍
+BUCKET_BOUNDS = [0.0001 * (2 ** i) for i in range(20)]
+
+_NULL_CONTEXT = contextlib.nullcontext()
+
+
+class Histogram:
+    """固定區間的直方圖，記憶體用量與觀測次數無關"""
+
+    __slots__ = ("count", "total", "min", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        for index, bound in enumerate(BUCKET_BOUNDS):
+            if value <= bound:
+                self.buckets[index] += 1
+                return
+        self.buckets[-1] += 1
+
+    def percentile(self, pct):
+        """以區間上限估計百分位數"""
+        if not self.count:
+            return None
+        rank = pct / 100 * self.count
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= rank:
+                if index < len(BUCKET_BOUNDS):
+                    return min(BUCKET_BOUNDS[index], self.max)
+                return self.max
+        return self.max
+
+
+class SamplingProfiler:
+    """定時擷取所有執行緒的呼叫堆疊，輸出 flamegraph.pl / speedscope 可讀的 collapsed 格式"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class Instrumentation:
+    """各階段耗時、計數器與直方圖的集合"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.stages = {}
+        self.counters = Counter()
+        self._lock = threading.Lock()
+        self._profiler = None
+        self._profile_mode = None
+        self._original_getaddrinfo = None
+
+    def enable(self):
+        self.enabled = True
+        self._instrument_dns()
+
+    def _instrument_dns(self):
+        """包裝 socket.getaddrinfo 以量測 DNS 解析時間"""
+        if self._original_getaddrinfo is not None:
+            return
+        original = self._original_getaddrinfo = socket.getaddrinfo
+
+        def timed_getaddrinfo(*args, **kwargs):
+            with self.stage("dns"):
+                return original(*args, **kwargs)
+
+        socket.getaddrinfo = timed_getaddrinfo
+
+    def stage(self, name):
+        """量測一個階段的耗時，用法: with instrumentation.stage("parse"): ..."""
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return self._timed(name)
+
+    @contextlib.contextmanager
+    def _timed(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def observe(self, name, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.stages.get(name)
+            if histogram is None:
+                histogram = self.stages[name] = Histogram()
+            histogram.observe(value)
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            self.counters[name] += amount
+
+    def start_profiler(self, mode="cprofile"):
+        """開始 cProfile 或取樣式分析"""
+        self._profile_mode = mode
+        if mode == "sample":
+            self._profiler = SamplingProfiler()
+            self._profiler.start()
+        else:
+            import cProfile
+
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def stop_profiler(self, output_prefix="profile"):
+        """停止分析並輸出檔案，回傳輸出的檔案路徑"""
+        if self._profiler is None:
+            return None
+        if self._profile_mode == "sample":
+            self._profiler.stop()
+            path = f"{output_prefix}.collapsed"
+            self._profiler.dump(path)
+        else:
+            self._profiler.disable()
+            path = f"{output_prefix}.prof"
+            self._profiler.dump_stats(path)
+            import pstats
+
+            pstats.Stats(self._profiler).sort_stats("cumulative").print_stats(15)
+        self._profiler = None
+        logger.info(f"效能分析結果已輸出到 {path}")
+        return path
+
+    def summary(self):
+        """各階段統計，依總耗時排序"""
+        rows = []
+        with self._lock:
+            for name, histogram in self.stages.items():
+                rows.append(
+                    {
+                        "stage": name,
+                        "count": histogram.count,
+                        "total": histogram.total,
+                        "mean": histogram.total / histogram.count,
+                        "p95": histogram.percentile(95),
+                        "max": histogram.max,
+                    }
+                )
+        return sorted(rows, key=lambda row: row["total"], reverse=True)
+
+    def format_text(self):
+        lines = [f"{'階段':<18}{'次數':>8}{'總耗時':>10}{'平均':>10}{'p95':>10}{'最大':>10}"]
+        for row in self.summary():
+            lines.append(
+                f"{row['stage']:<20}{row['count']:>8}{row['total']:>10.3f}"
+                f"{row['mean'] * 1000:>9.1f}ms{row['p95'] * 1000:>8.1f}ms{row['max'] * 1000:>8.1f}ms"
+            )
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"{name}: {value}")
+        return "\n".join(lines)
+
+    def format_html(self):
+        """產生附加在郵件報告中的階段耗時表格"""
+        rows = self.summary()
+        if not rows:
+            return ""
+        html = """
+                <h3>各階段耗時:</h3>
+                <table>
+                    <tr>
+                        <th>階段</th>
+                        <th>次數</th>
+                        <th>總耗時</th>
+                        <th>平均</th>
+                        <th>p95</th>
+                        <th>最大</th>
+                    </tr>
+        """
+        for row in rows:
+            html += f"""
+                    <tr>
+                        <td>{row['stage']}</td>
+                        <td>{row['count']}</td>
+                        <td>{row['total']:.3f} 秒</td>
+                        <td>{row['mean'] * 1000:.1f} ms</td>
+                        <td>{row['p95'] * 1000:.1f} ms</td>
+                        <td>{row['max'] * 1000:.1f} ms</td>
+                    </tr>
+            """
+        html += "</table>"
+        if self.counters:
+            html += "<ul>" + "".join(
+                f"<li>{name}: {value}</li>" for name, value in sorted(self.counters.items())
+            ) + "</ul>"
+        return html
+
+
+# 整個程序共用的量測物件
+instrumentation = Instrumentation()
+
+
+def add_arguments(parser):
+    """在命令列加入量測相關選項"""
+    parser.add_argument("--instrument", action="store_true", help="記錄各階段耗時並附加到報告中")
+    parser.add_argument(
+        "--profile", choices=["cprofile", "sample"], help="以 cProfile 或取樣式分析器分析整個執行過程"
+    )
+    parser.add_argument("--profile-output", default="profile", help="分析結果輸出檔名前綴")
+
+
+def setup_from_args(args):
+    """依命令列選項開啟量測與分析"""
+    if args.instrument or args.profile:
+        instrumentation.enable()
+    if args.profile:
+        instrumentation.start_profiler(args.profile)
+
+
+def finish_from_args(args):
+    """輸出量測摘要並停止分析"""
+    if args.profile:
+        instrumentation.stop_profiler(args.profile_output)
+    if instrumentation.enabled:
+        logger.info("各階段耗時:\n" + instrumentation.format_text())
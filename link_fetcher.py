@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+連結抓取
+自行跟隨轉址並記錄完整的轉址鏈 (每一跳的狀態碼與最終網址)，
+永久轉址 (301/308) 會存入共用快取，之後遇到相同網址直接請求最終目標
+內容以串流讀取並限制大小與總時限，平行檢查時以 HostThrottle 維持每個主機的請求間隔
+傳入 HostLatency 時每一跳依主機的延遲紀錄決定逾時，並在主機連續連線失敗後不再請求
+"""
+
+import time
+import socket
+import threading
+import urllib.parse
+
+import requests
+
+REDIRECT_STATUSES = frozenset({301, 302, 303, 307, 308})
+PERMANENT_REDIRECT_STATUSES = frozenset({301, 308})
+
+# 轉址次數達到此值即視為效能問題
+LONG_CHAIN_THRESHOLD = 3
+MAX_REDIRECTS = 10
+
+# 需要讀取內容時 (頁面、Google 文件) 的大小上限與每個請求的總時限 (秒)
+MAX_BODY_SIZE = 5 * 1024 * 1024
+FETCH_DEADLINE = 30
+CHUNK_SIZE = 64 * 1024
+# 不需要內容時，小於此大小的回應會讀完以重複使用連線
+DRAIN_LIMIT = 64 * 1024
+
+
+class RedirectCache:
+    """永久轉址快取：網址 -> (轉址目標, 狀態碼)"""
+
+    def __init__(self):
+        self._targets = {}
+        self.hits = 0
+
+    def add(self, url, location, status):
+        self._targets[url] = (location, status)
+
+    def resolve(self, url):
+        """
+        沿著已知的永久轉址找到最終網址，回傳 (網址, 略過的轉址)
+        遇到迴圈時停在迴圈起點，交由實際請求判斷
+        """
+        skipped = []
+        seen = set()
+        while url in self._targets and url not in seen:
+            seen.add(url)
+            location, status = self._targets[url]
+            skipped.append({"url": url, "status": status})
+            url = location
+        if skipped:
+            self.hits += 1
+        return url, skipped
+
+    def __len__(self):
+        return len(self._targets)
+
+
+# 同一次執行中所有頁面共用的轉址快取
+redirect_cache = RedirectCache()
+
+# 讀取內容用的緩衝區，每個執行緒一個並由所有 LinkFetcher 共用
+_local = threading.local()
+
+
+def _thread_buffer():
+    """
+    目前執行緒的緩衝區，一開始是空的，讀取時依實際內容大小成長 (最多到讀取時的大小上限)，
+    不會因每個頁面建立新的 LinkFetcher 而重複配置
+    """
+    buffer = getattr(_local, "buffer", None)
+    if buffer is None:
+        buffer = _local.buffer = bytearray()
+    return buffer
+
+
+class LinkFetcher:
+    """
+    以 allow_redirects=False 逐跳請求並記錄轉址鏈
+    所有請求都以串流方式進行：需要內容時讀入每個執行緒共用的緩衝區，最多 max_body_size，
+    不需要內容時只讀完很小的回應以重複使用連線，其餘直接關閉 (宣告的大小超過上限時同樣回報 oversized)；
+    整個請求 (含轉址與讀取內容) 不超過 deadline 秒，每個進行中的檢查占用的記憶體因此有固定上限
+    """
+
+    def __init__(
+        self,
+        session,
+        cache=None,
+        max_redirects=MAX_REDIRECTS,
+        long_chain_threshold=LONG_CHAIN_THRESHOLD,
+        max_body_size=MAX_BODY_SIZE,
+        deadline=FETCH_DEADLINE,
+        latency=None,
+    ):
+        self.session = session
+        self.latency = latency
+        self.cache = redirect_cache if cache is None else cache
+        self.max_redirects = max_redirects
+        self.long_chain_threshold = long_chain_threshold
+        self.max_body_size = max_body_size
+        self.deadline = deadline
+
+    @staticmethod
+    def _abort(response):
+        """中斷底層連線，讓阻塞中的讀取立即結束"""
+        connection = getattr(response.raw, "_connection", None)
+        sock = getattr(connection, "sock", None)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _watchdog(self, response, deadline_at):
+        """到達總時限時中斷連線，緩慢送出內容的伺服器也不會讓讀取超過時限"""
+        timer = threading.Timer(max(0.0, deadline_at - time.monotonic()), self._abort, (response,))
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    def _discard(self, response, deadline_at):
+        """
+        不需要的內容：很小時讀完以便連線重複使用，否則直接關閉連線，回傳 (結果, 宣告的內容大小)
+        宣告的大小超過上限時為 oversized，讀完之前發生錯誤或超過時限時為 too_slow
+        """
+        length = response.headers.get("Content-Length")
+        size = int(length) if length is not None and length.isdigit() else 0
+        outcome = "ok"
+        if size > self.max_body_size:
+            outcome = "oversized"
+        elif length is not None and length.isdigit() and size <= DRAIN_LIMIT:
+            timer = self._watchdog(response, deadline_at)
+            try:
+                for _ in response.iter_content(CHUNK_SIZE):
+                    pass
+            except Exception:
+                outcome = "too_slow"
+            finally:
+                timer.cancel()
+            if time.monotonic() >= deadline_at:
+                outcome = "too_slow"
+        response.close()
+        return outcome, size
+
+    def _read_body(self, response, deadline_at):
+        """讀取內容到緩衝區，回傳 (內容, 已讀取位元組數, 結果)，超過上限或時限時停止讀取"""
+        length = response.headers.get("Content-Length")
+        if length is not None and length.isdigit() and int(length) > self.max_body_size:
+            response.close()
+            return None, int(length), "oversized"
+
+        buffer = _thread_buffer()
+        size = 0
+        timer = self._watchdog(response, deadline_at)
+        try:
+            # iter_content 會先解壓縮，大小上限以解壓縮後的內容計算
+            for chunk in response.iter_content(CHUNK_SIZE):
+                end = size + len(chunk)
+                if end > self.max_body_size:
+                    return None, end, "oversized"
+                # 超出目前長度的部分會讓緩衝區成長
+                buffer[size:end] = chunk
+                size = end
+        except Exception:
+            if time.monotonic() < deadline_at:
+                raise
+        finally:
+            timer.cancel()
+            response.close()
+        if time.monotonic() >= deadline_at:
+            return None, size, "too_slow"
+        # 只複製一次讀到的內容
+        view = memoryview(buffer)
+        try:
+            return bytes(view[:size]), size, "ok"
+        finally:
+            view.release()
+
+    def host_available(self, url):
+        """主機的斷路器未打開 (沒有 latency 時一律視為可用)"""
+        return self.latency is None or self.latency.available(url)
+
+    def _request(self, method, url, headers, timeout, remaining):
+        """送出單一請求 (不跟隨轉址)，有 latency 時使用主機的逾時並記錄延遲或連線失敗"""
+        if self.latency is None:
+            return self.session.request(
+                method, url, headers=headers, timeout=min(timeout, remaining), allow_redirects=False, stream=True
+            )
+        self.latency.check(url)
+        host_timeout = min(self.latency.timeout(url, timeout), remaining)
+        try:
+            response = self.session.request(
+                method, url, headers=headers, timeout=host_timeout, allow_redirects=False, stream=True
+            )
+        except requests.exceptions.ReadTimeout as e:
+            # 已連上但回應太慢：以逾時作為延遲樣本，下次給這個主機較長的逾時
+            self.latency.failure(url, e, timeout=host_timeout)
+            raise
+        except requests.exceptions.ConnectionError as e:
+            self.latency.failure(url, e)
+            raise
+        self.latency.record(url, response.elapsed.total_seconds())
+        return response
+
+    def fetch(self, url, timeout, method="GET", keep_body=False, headers=None, stop_at=None):
+        """
+        請求網址並跟隨轉址，回傳 (最後的 response, 結果)，headers 為額外的請求標頭 (例如 Range)
+        stop_at(轉址目標) 為真時不再請求該目標 (例如 Google 登入頁)，最後的 response 為該次轉址
+        主機的斷路器已打開時引發 HostUnavailable
+        結果: hops 轉址次數、chain 每一跳 (url, status)、final_url、
+        cached 是否經由快取略過已知轉址 (略過的轉址仍列在 chain 中)、loop 是否形成迴圈、too_many 是否超過上限、
+        stopped 是否因 stop_at 停在轉址 (final_url 為未請求的轉址目標)、
+        outcome 為 ok / oversized (內容超過上限) / too_slow (超過總時限)、
+        body 為 keep_body 時讀取的內容 (bytes)、body_size 已讀取或宣告的內容大小
+        response 的內容已讀取或關閉，請改用結果中的 body
+        """
+        deadline_at = time.monotonic() + self.deadline
+        # 已知的永久轉址不再實際請求，但仍計入轉址鏈以便回報
+        current, chain = self.cache.resolve(url)
+        cached = bool(chain)
+        seen = {hop["url"] for hop in chain}
+        seen.add(current)
+        loop = False
+        too_many = False
+        stopped = False
+        outcome = "ok"
+        response = None
+
+        while True:
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                outcome = "too_slow"
+                break
+            response = self._request(method, current, headers, timeout, remaining)
+            location = response.headers.get("Location")
+            if response.status_code not in REDIRECT_STATUSES or not location:
+                break
+
+            next_url = urllib.parse.urljoin(current, location)
+            chain.append({"url": current, "status": response.status_code})
+            if response.status_code in PERMANENT_REDIRECT_STATUSES:
+                self.cache.add(current, next_url, response.status_code)
+
+            if stop_at is not None and stop_at(next_url):
+                stopped = True
+                current = next_url
+                break
+            if next_url in seen:
+                loop = True
+                break
+            if len(chain) >= self.max_redirects:
+                too_many = True
+                break
+
+            outcome, _ = self._discard(response, deadline_at)
+            if outcome == "too_slow":
+                break
+            outcome = "ok"
+            seen.add(next_url)
+            current = next_url
+            # 303 之後改用 GET (與 requests 相同，HEAD 維持 HEAD，只取標頭的探測不會因此下載內容)
+            if response.status_code == 303 and method != "HEAD":
+                method = "GET"
+
+        body = None
+        body_size = 0
+        if response is not None:
+            if keep_body and outcome == "ok" and not (loop or too_many or stopped):
+                body, body_size, outcome = self._read_body(response, deadline_at)
+            else:
+                discarded, size = self._discard(response, deadline_at)
+                if outcome == "ok":
+                    outcome, body_size = discarded, size
+
+        result = {
+            "hops": len(chain),
+            "chain": chain,
+            "final_url": current,
+            "cached": cached,
+            "loop": loop,
+            "too_many": too_many,
+            "stopped": stopped,
+            "outcome": outcome,
+            "body": body,
+            "body_size": body_size,
+        }
+        return response, result
+
+    def limit_issue(self, result):
+        """內容超過上限或超過總時限時回傳說明文字，否則回傳 None"""
+        if result["outcome"] == "oversized":
+            return f"回應內容過大 ({result['body_size'] / 1048576:.1f} MB，上限 {self.max_body_size / 1048576:.1f} MB)"
+        if result["outcome"] == "too_slow":
+            return f"回應過慢 (超過總時限 {self.deadline} 秒)"
+        return None
+
+    def redirect_issue(self, redirect):
+        """轉址鏈有問題時回傳說明文字，否則回傳 None"""
+        if redirect["loop"]:
+            return f"轉址迴圈 ({redirect['hops']} 次): {format_chain(redirect)}"
+        if redirect["too_many"]:
+            return f"轉址次數超過上限 {self.max_redirects} 次: {format_chain(redirect)}"
+        if redirect["hops"] >= self.long_chain_threshold:
+            return f"轉址鏈過長 ({redirect['hops']} 次): {format_chain(redirect)}"
+        return None
+
+
+def format_chain(redirect):
+    """以 網址 (狀態碼) → ... → 最終網址 表示轉址鏈"""
+    parts = [f"{hop['url']} ({hop['status']})" for hop in redirect["chain"]]
+    parts.append(redirect["final_url"])
+    return " → ".join(parts)
+
+
+class HostThrottle:
+    """平行檢查時讓同一主機的請求之間至少間隔 delay 秒，不同主機互不影響"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        """預約該主機下一個可用的時間並等待到那時候"""
+        host = urllib.parse.urlparse(url).hostname or ""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = start + self.delay
+        if start > now:
+            time.sleep(start - now)
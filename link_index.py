@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+連結索引
+以 SQLite 保存每次檢查時各頁面的連結 (來源頁面 → 顯示文字 → 正規化後的目標網址) 與每個目標最近的檢查結果，
+網址只存一次並以整數 ID 互相參照，目標網址另建索引，可在毫秒內查出「哪些頁面連到這個網址」；
+每個頁面記錄連結集合的指紋，連結沒有變動且上次都正常的頁面可以不再重新檢查其連結
+
+使用方法:
+  python link_index.py linking-to https://example.com/dead.pdf
+  python link_index.py links https://www.nknush.kh.edu.tw/
+  python link_index.py broken
+  python link_index.py stats
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+import logging
+import urllib.parse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_FILE = ".link_index.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS pages (
+    url_id INTEGER PRIMARY KEY REFERENCES urls(id),
+    fingerprint TEXT,
+    crawled_at REAL
+);
+CREATE TABLE IF NOT EXISTS links (
+    source_id INTEGER NOT NULL,
+    target_id INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    text TEXT,
+    PRIMARY KEY (source_id, target_id, type)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS links_by_target ON links (target_id);
+CREATE TABLE IF NOT EXISTS status (
+    url_id INTEGER PRIMARY KEY REFERENCES urls(id),
+    ok INTEGER NOT NULL,
+    issue TEXT,
+    checked_at REAL,
+    last_ok_at REAL
+);
+"""
+
+
+def canonical_url(url):
+    """正規化目標網址：去掉 #片段、協定與主機轉小寫、省略預設連接埠"""
+    url, _ = urllib.parse.urldefrag(url)
+    parsed = urllib.parse.urlsplit(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        return url
+    netloc = parsed.hostname
+    if parsed.port and parsed.port != {"http": 80, "https": 443}[parsed.scheme]:
+        netloc = f"{netloc}:{parsed.port}"
+    return urllib.parse.urlunsplit((parsed.scheme, netloc, parsed.path or "/", parsed.query, ""))
+
+
+def links_fingerprint(links_info):
+    """頁面連結集合的指紋 (與連結順序無關)，用來判斷頁面的連結是否有變動"""
+    digest = hashlib.sha1()
+    for item in sorted(f"{info.get('type', 'link')}\t{info['url']}\t{info['text']}" for info in links_info):
+        digest.update(item.encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+class LinkIndex:
+    """以 SQLite 保存的連結圖，多個執行緒共用同一個連線 (寫入以鎖保護)"""
+
+    def __init__(self, path=DEFAULT_INDEX_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        # 多個分片程序可能同時寫入同一個檔案，等待鎖定最多 30 秒
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        # 舊版索引沒有 last_ok_at 欄位
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(status)")}
+        if "last_ok_at" not in columns:
+            self._db.execute("ALTER TABLE status ADD COLUMN last_ok_at REAL")
+
+    @classmethod
+    def from_env(cls):
+        return cls(os.getenv("LINK_INDEX_FILE", DEFAULT_INDEX_FILE))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _intern(self, urls):
+        """取得網址的 ID (沒有的先新增)，回傳 {網址: ID}"""
+        self._db.executemany("INSERT OR IGNORE INTO urls (url) VALUES (?)", ((url,) for url in urls))
+        ids = {}
+        urls = list(urls)
+        # SQLite 一次最多綁定 999 個參數
+        for start in range(0, len(urls), 900):
+            chunk = urls[start:start + 900]
+            rows = self._db.execute(
+                f"SELECT url, id FROM urls WHERE url IN ({','.join('?' * len(chunk))})", chunk
+            )
+            ids.update(rows)
+        return ids
+
+    def _url_id(self, url):
+        row = self._db.execute("SELECT id FROM urls WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def page_unchanged(self, page_url, fingerprint):
+        """頁面的連結與上次相同，且每個連結都有檢查紀錄並且正常 (延後或從未檢查的連結不算正常)"""
+        with self._lock:
+            page_id = self._url_id(canonical_url(page_url))
+            if page_id is None:
+                return False
+            row = self._db.execute("SELECT fingerprint FROM pages WHERE url_id = ?", (page_id,)).fetchone()
+            if row is None or row[0] != fingerprint:
+                return False
+            unverified = self._db.execute(
+                "SELECT 1 FROM links LEFT JOIN status ON status.url_id = links.target_id "
+                "WHERE links.source_id = ? AND (status.url_id IS NULL OR status.ok != 1) LIMIT 1",
+                (page_id,),
+            ).fetchone()
+            return unverified is None
+
+    def update_page(self, page_url, links_info, fingerprint=None):
+        """以這次擷取到的連結取代頁面原有的連結 (同一交易中完成)"""
+        fingerprint = fingerprint or links_fingerprint(links_info)
+        page = canonical_url(page_url)
+        edges = {}
+        for info in links_info:
+            edges.setdefault((canonical_url(info["url"]), info.get("type", "link")), info["text"])
+        with self._lock, self._db:
+            ids = self._intern({page} | {target for target, _ in edges})
+            page_id = ids[page]
+            self._db.execute("DELETE FROM links WHERE source_id = ?", (page_id,))
+            self._db.executemany(
+                "INSERT INTO links (source_id, target_id, type, text) VALUES (?, ?, ?, ?)",
+                ((page_id, ids[target], resource_type, text) for (target, resource_type), text in edges.items()),
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages (url_id, fingerprint, crawled_at) VALUES (?, ?, ?)",
+                (page_id, fingerprint, time.time()),
+            )
+
+    def record_results(self, results):
+        """記錄檢查結果，results 為 [(網址, 問題說明或 None), ...]；失效時保留最後一次正常的時間"""
+        now = time.time()
+        rows = {canonical_url(url): issue for url, issue in results}
+        if not rows:
+            return
+        with self._lock, self._db:
+            ids = self._intern(rows)
+            self._db.executemany(
+                "INSERT INTO status (url_id, ok, issue, checked_at, last_ok_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (url_id) DO UPDATE SET ok = excluded.ok, issue = excluded.issue, "
+                "checked_at = excluded.checked_at, last_ok_at = COALESCE(excluded.last_ok_at, status.last_ok_at)",
+                ((ids[url], issue is None, issue, now, now if issue is None else None) for url, issue in rows.items()),
+            )
+
+    def history(self, urls):
+        """網址最近的檢查紀錄，回傳 {正規化網址: (是否正常, 檢查時間, 最後一次正常的時間)}，沒有紀錄的網址不列入"""
+        urls = list({canonical_url(url) for url in urls})
+        history = {}
+        with self._lock:
+            for start in range(0, len(urls), 900):
+                chunk = urls[start:start + 900]
+                rows = self._db.execute(
+                    "SELECT urls.url, status.ok, status.checked_at, status.last_ok_at FROM status "
+                    f"JOIN urls ON urls.id = status.url_id WHERE urls.url IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                )
+                history.update((url, (bool(ok), checked_at, last_ok_at)) for url, ok, checked_at, last_ok_at in rows)
+        return history
+
+    def pages_linking_to(self, url):
+        """連到此網址的所有頁面，回傳 [(頁面, 顯示文字, 資源類型), ...]"""
+        with self._lock:
+            target_id = self._url_id(canonical_url(url))
+            if target_id is None:
+                return []
+            return self._db.execute(
+                "SELECT urls.url, links.text, links.type FROM links JOIN urls ON urls.id = links.source_id "
+                "WHERE links.target_id = ? ORDER BY urls.url",
+                (target_id,),
+            ).fetchall()
+
+    def links_on(self, page_url):
+        """頁面上的所有連結與最近的檢查結果，回傳 [(目標網址, 顯示文字, 資源類型, 是否正常, 問題), ...]"""
+        with self._lock:
+            page_id = self._url_id(canonical_url(page_url))
+            if page_id is None:
+                return []
+            return self._db.execute(
+                "SELECT urls.url, links.text, links.type, status.ok, status.issue FROM links "
+                "JOIN urls ON urls.id = links.target_id LEFT JOIN status ON status.url_id = links.target_id "
+                "WHERE links.source_id = ? ORDER BY urls.url",
+                (page_id,),
+            ).fetchall()
+
+    def broken(self):
+        """最近一次檢查失效、且仍有頁面連到的網址，回傳 [(網址, 問題, 來源頁面數), ...]"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT urls.url, status.issue, COUNT(DISTINCT links.source_id) FROM status "
+                "JOIN urls ON urls.id = status.url_id JOIN links ON links.target_id = status.url_id "
+                "WHERE status.ok = 0 GROUP BY status.url_id ORDER BY 3 DESC, urls.url"
+            ).fetchall()
+
+    def stats(self):
+        with self._lock:
+            count = lambda table: self._db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            return {"urls": count("urls"), "pages": count("pages"), "links": count("links"), "checked": count("status")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查詢連結索引")
+    parser.add_argument("--index", default=os.getenv("LINK_INDEX_FILE", DEFAULT_INDEX_FILE), help="索引檔路徑")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("linking-to", help="列出連到指定網址的頁面").add_argument("url")
+    commands.add_parser("links", help="列出頁面上的連結與最近的檢查結果").add_argument("page")
+    commands.add_parser("broken", help="列出失效的網址與連到它的頁面數")
+    commands.add_parser("stats", help="索引中的網址、頁面與連結數")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.index):
+        print(f"找不到索引檔 {args.index}")
+        sys.exit(1)
+    index = LinkIndex(args.index)
+    start = time.perf_counter()
+    if args.command == "linking-to":
+        rows = index.pages_linking_to(args.url)
+        for page, text, resource_type in rows:
+            print(f"{page}\t[{resource_type}] {text}")
+        print(f"共 {len(rows)} 個頁面 ({(time.perf_counter() - start) * 1000:.1f} ms)")
+    elif args.command == "links":
+        rows = index.links_on(args.page)
+        for url, text, resource_type, ok, issue in rows:
+            state = "未檢查" if ok is None else ("正常" if ok else f"失效: {issue}")
+            print(f"{url}\t[{resource_type}] {text}\t{state}")
+        print(f"共 {len(rows)} 個連結")
+    elif args.command == "broken":
+        for url, issue, pages in index.broken():
+            print(f"{url}\t{issue}\t{pages} 個頁面")
+    else:
+        for key, value in index.stats().items():
+            print(f"{key}: {value}")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
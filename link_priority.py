@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+連結檢查的優先順序
+依失效風險排序要檢查的連結：上次失效、從未檢查過、Google 文件、外部網站，以及距離最後一次正常越久的連結越先檢查；
+設定總時間預算時，時間用完前已先檢查最可能失效的連結，其餘列為延後檢查
+"""
+
+import time
+import urllib.parse
+
+from link_index import canonical_url
+from page_parser import is_google_docs_link
+
+# 各項風險的分數
+SCORE_PREVIOUSLY_BROKEN = 100
+SCORE_NEVER_SEEN = 50
+SCORE_GOOGLE_DOCS = 30
+SCORE_EXTERNAL = 20
+# 距離最後一次正常每過一天加 1 分，最多加到此值
+MAX_AGE_SCORE = 30
+
+
+def risk_score(link_info, history, page_host, now=None):
+    """
+    連結的風險分數，history 為連結索引的 {正規化網址: (是否正常, 檢查時間, 最後一次正常的時間)}
+    page_host 為所在頁面的主機，連到其他主機的連結視為外部連結
+    """
+    now = time.time() if now is None else now
+    url = link_info["url"]
+    score = 0
+    record = history.get(canonical_url(url))
+    if record is None:
+        score += SCORE_NEVER_SEEN
+    else:
+        ok, _, last_ok_at = record
+        if not ok:
+            score += SCORE_PREVIOUSLY_BROKEN
+        if last_ok_at is not None:
+            score += min(MAX_AGE_SCORE, (now - last_ok_at) / 86400)
+        else:
+            score += MAX_AGE_SCORE
+    if is_google_docs_link(url):
+        score += SCORE_GOOGLE_DOCS
+    host = urllib.parse.urlparse(url).hostname
+    if host and host != page_host:
+        score += SCORE_EXTERNAL
+    return score
+
+
+def prioritize(links_info, history, page_url):
+    """依風險分數由高到低排序 (分數相同時維持頁面上的順序)，每個連結加上 risk 欄位"""
+    page_host = urllib.parse.urlparse(page_url).hostname
+    now = time.time()
+    for info in links_info:
+        info["risk"] = round(risk_score(info, history, page_host, now), 1)
+    return sorted(links_info, key=lambda info: -info["risk"])
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+分片執行連結檢查
+依連結主機的一致性雜湊將連結分配到固定數量的分片，同一主機永遠落在同一分片，
+平行執行時對每個主機的請求間隔不變；每個分片檢查完一個連結就寫入檢查點，
+中斷後重新執行會從檢查點繼續，最後由合併步驟彙整所有分片的結果
+"""
+
+import os
+import re
+import json
+import bisect
+import hashlib
+import logging
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT_DIR = ".link_shards"
+
+
+def _hash(key):
+    # 不使用內建 hash()，其結果在不同程序間會不同
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """一致性雜湊環，以虛擬節點平均分配主機，分片數改變時只有少數主機需要移動"""
+
+    def __init__(self, shard_count, replicas=64):
+        self.shard_count = shard_count
+        points = sorted(
+            (_hash(f"shard-{shard}-{replica}"), shard)
+            for shard in range(shard_count)
+            for replica in range(replicas)
+        )
+        self._keys = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def shard_for(self, host):
+        """回傳主機所屬的分片 (從 0 開始)"""
+        index = bisect.bisect(self._keys, _hash(host)) % len(self._keys)
+        return self._shards[index]
+
+
+def parse_shard(value):
+    """解析命令列的 I/N (第 I 個分片，共 N 個)，回傳從 0 開始的 (index, count)"""
+    try:
+        index, count = (int(part) for part in value.split("/", 1))
+    except ValueError:
+        raise ValueError(f"分片格式應為 I/N: {value}")
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"分片編號必須介於 1 與 {count} 之間: {value}")
+    return index - 1, count
+
+
+def link_host(url):
+    return urlparse(url).hostname or ""
+
+
+def checkpoint_path(directory, target_name, index, count):
+    safe_name = re.sub(r"[^\w.-]+", "_", target_name)
+    return os.path.join(directory, safe_name, f"shard-{index + 1}-of-{count}.jsonl")
+
+
+class ShardCheckpoint:
+    """
+    單一分片的檢查點 (JSON Lines)
+    第一行為執行資訊 (run_id、頁面清單、請求間隔)，之後每行為一個已檢查的連結與其問題，
+    分片完成時最後寫入完成標記
+    """
+
+    def __init__(self, path, run_id=None):
+        self.path = path
+        self.run_id = run_id
+        self.pages = []
+        self.delay = None
+        self.done = {}
+        self.complete = False
+        self.elapsed = 0.0
+        self._resumed = False
+        self._valid_length = 0
+        self._file = None
+
+    def load(self):
+        """讀取同一次執行 (run_id 相同) 留下的檢查點，回傳是否可以續跑"""
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, "rb") as f:
+                first_line = f.readline()
+                header = json.loads(first_line or b"{}")
+                if self.run_id is not None and header.get("run_id") != self.run_id:
+                    return False
+                records = []
+                valid_length = len(first_line)
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # 中斷時寫到一半的最後一行
+                        break
+                    valid_length += len(line)
+        except (OSError, ValueError) as e:
+            logger.warning(f"無法讀取檢查點 {self.path}，將重新開始: {e}")
+            return False
+
+        self.pages = header.get("pages", [])
+        self.delay = header.get("delay")
+        for record in records:
+            if record.get("complete"):
+                self.complete = True
+                self.elapsed = record.get("elapsed", 0.0)
+            else:
+                self.done[record["url"]] = record["issues"]
+        self._resumed = True
+        self._valid_length = valid_length
+        return True
+
+    def open(self, pages=None, delay=None):
+        """開始寫入檢查點，續跑時接在原檔案後面，否則寫入新的執行資訊"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if self._resumed:
+            self._file = open(self.path, "a", encoding="utf-8")
+            # 截掉寫到一半的最後一行再接著寫
+            self._file.truncate(self._valid_length)
+            return
+        self.pages = pages or []
+        self.delay = delay
+        self._file = open(self.path, "w", encoding="utf-8")
+        self._write({"run_id": self.run_id, "pages": self.pages, "delay": delay})
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        # 每筆都立即寫出，程序被中止時最多只損失一個連結
+        self._file.flush()
+
+    def record(self, url, issues):
+        self.done[url] = issues
+        self._write({"url": url, "issues": issues})
+
+    def finish(self, elapsed):
+        self.complete = True
+        self.elapsed = elapsed
+        self._write({"complete": True, "elapsed": elapsed})
+        self.close()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def merge_checkpoints(directory, target_name, count, run_id=None):
+    """
+    合併所有分片的檢查點，回傳 dict:
+    broken 失效連結、pages 頁面清單、checked 已檢查連結數、
+    elapsed 最慢分片的耗時、missing 缺少或未完成的分片編號
+    """
+    result = {"broken": [], "pages": [], "checked": 0, "elapsed": 0.0, "missing": []}
+    seen_pages = set()
+    for index in range(count):
+        checkpoint = ShardCheckpoint(checkpoint_path(directory, target_name, index, count), run_id)
+        if not checkpoint.load():
+            result["missing"].append(index + 1)
+            continue
+        if not checkpoint.complete:
+            result["missing"].append(index + 1)
+        for page in checkpoint.pages:
+            if page[0] not in seen_pages:
+                seen_pages.add(page[0])
+                result["pages"].append(page)
+        for issues in checkpoint.done.values():
+            result["broken"].extend(issues)
+        # 憑證掃描的結果以 cert: 開頭記錄，不計入連結數
+        result["checked"] += sum(1 for key in checkpoint.done if not key.startswith("cert:"))
+        result["elapsed"] = max(result["elapsed"], checkpoint.elapsed)
+
+    # 依頁面順序排列，報告與單一程序執行時一致
+    page_order = {page[0]: i for i, page in enumerate(result["pages"])}
+    result["broken"].sort(key=lambda info: page_order.get(info.get("page"), len(page_order)))
+    return result
+
+
+def remove_checkpoints(directory, target_name, count):
+    """合併完成後刪除檢查點，下次執行重新開始"""
+    for index in range(count):
+        path = checkpoint_path(directory, target_name, index, count)
+        if os.path.exists(path):
+            os.remove(path)
+    try:
+        os.rmdir(os.path.dirname(path))
+    except OSError:
+        pass
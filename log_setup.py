@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+日誌設定
+各腳本共用的日誌設定，文字格式與 update_github_actions_ips.py 相同 (時間 - 等級 - 訊息)，
+也可改為每行一筆 JSON 供機器處理；所有日誌先放入佇列，由背景執行緒 (QueueListener) 寫出，
+檢查連結的執行緒不會因輸出而阻塞
+大量項目不逐一輸出，改由 ProgressReporter 定期回報進度、速率與預估剩餘時間
+"""
+
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import logging.handlers
+from datetime import datetime
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+# 進度回報的間隔 (秒)
+DEFAULT_PROGRESS_INTERVAL = 10.0
+
+progress_interval = DEFAULT_PROGRESS_INTERVAL
+_listener = None
+_listener_pid = None
+
+
+class JsonFormatter(logging.Formatter):
+    """每筆日誌輸出為一行 JSON，以 extra={"fields": {...}} 傳入的欄位一併輸出"""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(level="INFO", json_format=False, log_file=None, interval=None):
+    """設定根 logger：日誌經由佇列交給背景執行緒寫到 stderr (與選用的檔案)"""
+    global _listener, _listener_pid, progress_interval
+    if interval is not None:
+        progress_interval = interval
+    # fork 出的子程序沒有父程序的背景執行緒，需要重新建立
+    if _listener is not None and _listener_pid == os.getpid():
+        return
+
+    formatter = JsonFormatter() if json_format else logging.Formatter(LOG_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers[:] = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(level)
+    # 第三方套件的除錯訊息過多，只在 DEBUG 模式下保留
+    if root.level > logging.DEBUG:
+        logging.getLogger("urllib3").setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    if _listener_pid is None:
+        atexit.register(shutdown_logging)
+    _listener_pid = os.getpid()
+
+
+def shutdown_logging():
+    """寫出佇列中剩餘的日誌並停止背景執行緒"""
+    global _listener
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+        _listener = None
+
+
+def add_arguments(parser):
+    """在命令列加入日誌相關選項"""
+    parser.add_argument(
+        "--log-level",
+        type=str.upper,
+        choices=LOG_LEVELS,
+        default=os.getenv("LOG_LEVEL", "INFO").upper(),
+        help="日誌等級，DEBUG 會列出每個連結的檢查結果 (預設 INFO 或環境變數 LOG_LEVEL)",
+    )
+    parser.add_argument(
+        "--log-json",
+        action="store_true",
+        default=os.getenv("LOG_JSON") == "1",
+        help="每行輸出一筆 JSON 格式的日誌 (或設定環境變數 LOG_JSON=1)",
+    )
+    parser.add_argument("--log-file", help="同時將日誌寫入檔案")
+    parser.add_argument(
+        "--progress-interval",
+        type=float,
+        default=DEFAULT_PROGRESS_INTERVAL,
+        help=f"進度回報的間隔秒數 (預設 {DEFAULT_PROGRESS_INTERVAL:g})",
+    )
+
+
+def setup_from_args(args):
+    """依命令列選項設定日誌"""
+    setup_logging(args.log_level, args.log_json, args.log_file, args.progress_interval)
+
+
+def _format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes} 分 {seconds} 秒" if minutes else f"{seconds} 秒"
+
+
+class ProgressReporter:
+    """定期回報處理進度 (完成數、速率、預估剩餘時間與發現的問題數)，取代逐一輸出每個項目"""
+
+    def __init__(self, total, label="連結", logger=None, interval=None):
+        self.total = total
+        self.label = label
+        self.logger = logger or logging.getLogger(__name__)
+        self.interval = progress_interval if interval is None else interval
+        self.done = 0
+        self.issues = 0
+        self._start = self._last = time.monotonic()
+
+    def advance(self, count=1, issues=0):
+        self.done += count
+        self.issues += issues
+        now = time.monotonic()
+        if now - self._last >= self.interval and self.done < self.total:
+            self._last = now
+            self._report(now)
+
+    def finish(self):
+        self._report(time.monotonic(), final=True)
+
+    def _report(self, now, final=False):
+        elapsed = now - self._start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - self.done) / rate if rate else None
+        fields = {
+            "progress": self.label,
+            "done": self.done,
+            "total": self.total,
+            "issues": self.issues,
+            "rate": round(rate, 2),
+            "elapsed_seconds": round(elapsed, 2),
+        }
+        if final:
+            message = (
+                f"已檢查 {self.done} 個{self.label}，耗時 {_format_duration(elapsed)} "
+                f"({rate:.1f} 個/秒)，發現 {self.issues} 個問題"
+            )
+        else:
+            fields["eta_seconds"] = round(eta, 1) if eta is not None else None
+            percent = self.done * 100 / self.total if self.total else 100
+            message = (
+                f"進度 {self.done}/{self.total} ({percent:.0f}%)，{rate:.1f} 個/秒，"
+                f"預估剩餘 {_format_duration(eta) if eta is not None else '未知'}，發現 {self.issues} 個問題"
+            )
+        self.logger.info(message, extra={"fields": fields})
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+報告郵件背景寄送工具
+郵件放入佇列後立即返回，由背景執行緒透過同一個已登入的 SMTP 連線依序寄出，
+寄送失敗的郵件會存到待寄目錄，下次啟動時重新寄送；
+超過保留天數或重試次數的待寄郵件直接丟棄，待寄目錄的郵件數也有上限，不會一直重送過時的報告
+smtplib 與 email 套件在實際寄信時才載入，沒有郵件要寄的執行不需付出載入時間
+"""
+
+import os
+import time
+import queue
+import atexit
+import threading
+import logging
+
+from instrumentation import instrumentation
+
+logger = logging.getLogger(__name__)
+
+# 佇列結束標記
+_STOP = object()
+
+# 待寄郵件的保留天數、最多寄送次數與待寄目錄最多保留的郵件數 (超過時丟棄最舊的)
+SPOOL_MAX_AGE_DAYS = 3
+SPOOL_MAX_ATTEMPTS = 5
+SPOOL_MAX_FILES = 50
+
+
+def _spool_attempts(path):
+    """待寄郵件已寄送失敗的次數，記在檔名中 (建立時間-識別碼.次數.eml)"""
+    parts = os.path.basename(path).split(".")
+    return int(parts[1]) if len(parts) == 3 and parts[1].isdigit() else 1
+
+
+class MailSender:
+    """背景寄送郵件，多封郵件共用同一個 SMTP 連線"""
+
+    def __init__(
+        self,
+        smtp_server="smtp.gmail.com",
+        smtp_port=587,
+        smtp_user="mailer@tea.nknush.kh.edu.tw",
+        password=None,
+        use_starttls=True,
+        require_auth=True,
+        spool_dir=".mail_spool",
+        timeout=30,
+        idle_timeout=30,
+        spool_max_age_days=SPOOL_MAX_AGE_DAYS,
+        spool_max_attempts=SPOOL_MAX_ATTEMPTS,
+        spool_max_files=SPOOL_MAX_FILES,
+    ):
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.smtp_user = smtp_user
+        self.password = password
+        self.use_starttls = use_starttls
+        self.require_auth = require_auth
+        self.spool_dir = spool_dir
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.spool_max_age_days = spool_max_age_days
+        self.spool_max_attempts = spool_max_attempts
+        self.spool_max_files = spool_max_files
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._server = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        """由環境變數建立寄件器，未設定密碼時不會互動式提示輸入"""
+        kwargs.setdefault("smtp_server", os.environ.get("SMTP_SERVER", "smtp.gmail.com"))
+        kwargs.setdefault("smtp_port", int(os.environ.get("SMTP_PORT", "587")))
+        kwargs.setdefault("password", os.environ.get("EMAIL_APP_PASSWORD"))
+        kwargs.setdefault("spool_dir", os.environ.get("MAIL_SPOOL_DIR", ".mail_spool"))
+        return cls(**kwargs)
+
+    def start(self):
+        """啟動背景寄送執行緒，並將上次未寄出的郵件重新排入佇列"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            for path in self._pending_spool_files():
+                self._queue.put((None, path))
+            self._thread = threading.Thread(
+                target=self._worker, name="mail-sender", daemon=True
+            )
+            self._thread.start()
+
+    def submit(self, msg):
+        """將郵件放入寄送佇列，不等待寄送結果"""
+        self.start()
+        self._queue.put((msg, None))
+
+    def close(self, timeout=60):
+        """等待佇列寄完，逾時仍未寄出的郵件存入待寄目錄"""
+        if self._thread is None:
+            return
+        self._queue.put((_STOP, None))
+        self._thread.join(timeout)
+
+        if self._thread.is_alive():
+            logger.warning(f"郵件寄送逾時 ({timeout} 秒)，剩餘郵件將於下次執行時重新寄送")
+            while True:
+                try:
+                    msg, path = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if msg is not _STOP and path is None:
+                    self._spool(msg)
+        self._thread = None
+
+    def _pending_spool_files(self):
+        """待寄目錄中仍要重送的郵件 (由舊到新)，過期、重試太多次或超過數量上限的直接丟棄"""
+        if not self.spool_dir or not os.path.isdir(self.spool_dir):
+            return []
+        expire_before = time.time() - self.spool_max_age_days * 86400
+        pending = []
+        for name in sorted(os.listdir(self.spool_dir)):
+            if not name.endswith(".eml"):
+                continue
+            path = os.path.join(self.spool_dir, name)
+            try:
+                expired = os.path.getmtime(path) < expire_before
+            except OSError:
+                continue
+            if expired:
+                self._drop(path, f"超過 {self.spool_max_age_days} 天")
+            elif _spool_attempts(path) >= self.spool_max_attempts:
+                self._drop(path, f"已寄送失敗 {self.spool_max_attempts} 次")
+            else:
+                pending.append(path)
+        overflow = max(0, len(pending) - self.spool_max_files)
+        for path in pending[:overflow]:
+            self._drop(path, f"待寄郵件超過 {self.spool_max_files} 封")
+        return pending[overflow:]
+
+    def _drop(self, path, reason):
+        try:
+            os.remove(path)
+            logger.warning(f"丟棄待寄郵件 {path} ({reason})")
+        except OSError as e:
+            logger.error(f"無法刪除待寄郵件 {path}: {e}")
+
+    def _retry_failed(self, path):
+        """重送失敗：在檔名記錄失敗次數，達到上限時丟棄"""
+        attempts = _spool_attempts(path) + 1
+        if attempts >= self.spool_max_attempts:
+            self._drop(path, f"已寄送失敗 {attempts} 次")
+            return
+        name = os.path.basename(path).split(".")[0]
+        try:
+            os.replace(path, os.path.join(os.path.dirname(path), f"{name}.{attempts}.eml"))
+        except OSError as e:
+            logger.error(f"無法更新待寄郵件 {path}: {e}")
+
+    def _spool(self, msg):
+        """將寄送失敗的郵件存到待寄目錄"""
+        if not self.spool_dir:
+            return None
+        try:
+            import uuid
+
+            os.makedirs(self.spool_dir, exist_ok=True)
+            name = f"{int(time.time())}-{uuid.uuid4().hex}.eml"
+            path = os.path.join(self.spool_dir, name)
+            with open(path, "wb") as f:
+                f.write(msg.as_bytes())
+            logger.info(f"郵件已存入待寄目錄: {path}")
+            return path
+        except OSError as e:
+            logger.error(f"無法將郵件存入待寄目錄: {e}")
+            return None
+
+    def _connect(self):
+        import smtplib
+
+        if self.require_auth and not self.password:
+            raise RuntimeError("未設定 EMAIL_APP_PASSWORD，無法登入郵件伺服器")
+
+        server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=self.timeout)
+        server.ehlo()
+        if self.use_starttls:
+            server.starttls()
+            server.ehlo()
+        if self.password:
+            server.login(self.smtp_user, self.password)
+        return server
+
+    def _disconnect(self):
+        if self._server is None:
+            return
+        import smtplib
+
+        try:
+            self._server.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self._server = None
+
+    def _deliver(self, msg):
+        """透過共用連線寄出郵件，連線中斷時重新連線一次"""
+        import smtplib
+
+        for attempt in range(2):
+            if self._server is None:
+                with instrumentation.stage("smtp_connect"):
+                    self._server = self._connect()
+            try:
+                with instrumentation.stage("smtp_send"):
+                    self._server.send_message(msg)
+                return
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                self._server = None
+                if attempt == 1:
+                    raise
+
+    def _worker(self):
+        from email import message_from_bytes, policy
+
+        while True:
+            try:
+                msg, path = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                # 閒置太久就先關閉連線，下次有郵件時再重新連線
+                self._disconnect()
+                continue
+
+            if msg is _STOP:
+                break
+
+            if path is not None:
+                try:
+                    with open(path, "rb") as f:
+                        msg = message_from_bytes(f.read(), policy=policy.SMTP)
+                except OSError as e:
+                    logger.error(f"無法讀取待寄郵件 {path}: {e}")
+                    continue
+
+            recipient = msg["To"]
+            try:
+                self._deliver(msg)
+                logger.info(f"報告郵件已成功發送到 {recipient}")
+                if path is not None:
+                    os.remove(path)
+            except Exception as e:
+                logger.error(f"發送報告郵件到 {recipient} 時發生錯誤: {e}")
+                self._disconnect()
+                if path is None:
+                    self._spool(msg)
+                else:
+                    self._retry_failed(path)
+
+        self._disconnect()
+
+
+_default_sender = None
+
+
+def get_mail_sender():
+    """取得共用的背景寄件器，程式結束前會自動等待郵件寄出"""
+    global _default_sender
+    if _default_sender is None:
+        _default_sender = MailSender.from_env()
+        atexit.register(shutdown_mail_sender)
+    return _default_sender
+
+
+def shutdown_mail_sender(timeout=60):
+    """等待共用寄件器的佇列寄完"""
+    global _default_sender
+    if _default_sender is not None:
+        _default_sender.close(timeout)
+        _default_sender = None
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Prometheus / OpenMetrics 指標輸出
+常駐模式以 HTTP /metrics 提供指標，排程模式則寫成 node_exporter 的 textfile 檔案
+
+更新指標只是一次字典賦值 (在 GIL 下為原子操作)，不需要鎖，
+輸出時先複製一份快照再格式化，不會拖慢檢測迴圈
+"""
+
+import os
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+class MetricsRegistry:
+    """指標集合，每個指標以 (名稱, 標籤) 為鍵"""
+
+    def __init__(self, prefix="weblink_"):
+        self.prefix = prefix
+        self._meta = {}
+        self._values = {}
+
+    def describe(self, name, metric_type, help_text):
+        """登記指標類型 (gauge / counter) 與說明"""
+        self._meta[self.prefix + name] = (metric_type, help_text)
+
+    def set(self, name, value, **labels):
+        """設定 gauge 的值"""
+        self._values[(self.prefix + name, tuple(sorted(labels.items())))] = value
+
+    def inc(self, name, amount=1, **labels):
+        """累加 counter，同一指標只應由單一執行緒更新"""
+        key = (self.prefix + name, tuple(sorted(labels.items())))
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def clear(self, name, **labels):
+        """移除符合標籤的指標 (例如已從設定檔刪除的網站)"""
+        full_name = self.prefix + name
+        wanted = set(labels.items())
+        for key in list(self._values):
+            if key[0] == full_name and wanted <= set(key[1]):
+                self._values.pop(key, None)
+
+    def render(self):
+        """輸出 Prometheus 文字格式"""
+        snapshot = dict(self._values)
+        by_name = {}
+        for (name, labels), value in snapshot.items():
+            by_name.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name in sorted(by_name):
+            metric_type, help_text = self._meta.get(name, ("gauge", ""))
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in sorted(by_name[name]):
+                if value is None:
+                    continue
+                lines.append(f"{name}{_format_labels(labels)} {float(value)!r}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        """寫入 node_exporter textfile collector 檔案，先寫暫存檔再取代避免讀到一半"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def serve(self, port, host="0.0.0.0"):
+        """在背景執行緒啟動 /metrics HTTP 服務"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        server.daemon_threads = True
+        thread = threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True)
+        thread.start()
+        logger.info(f"指標服務已啟動: http://{host}:{server.server_address[1]}/metrics")
+        return server
+
+
+# 整個程序共用的指標集合
+registry = MetricsRegistry()
+
+registry.describe("site_up", "gauge", "網站是否正常 (1 正常, 0 異常)")
+registry.describe("site_status_code", "gauge", "網站最後一次回應的 HTTP 狀態碼")
+registry.describe("site_phase_seconds", "gauge", "網站檢測各階段耗時 (秒)")
+registry.describe("site_last_check_timestamp_seconds", "gauge", "網站最後一次檢測的時間")
+registry.describe("site_checks_total", "counter", "網站檢測次數")
+registry.describe("ssl_cert_days_remaining", "gauge", "SSL 憑證剩餘天數")
+registry.describe("links_checked", "gauge", "最後一次連結檢查的連結數")
+registry.describe("links_broken", "gauge", "最後一次連結檢查的失效連結數 (依失效類型)")
+registry.describe("link_check_duration_seconds", "gauge", "最後一次連結檢查的總耗時 (秒)")
+registry.describe("link_check_last_run_timestamp_seconds", "gauge", "最後一次連結檢查的時間")
+
+
+def add_arguments(parser):
+    """在命令列加入指標輸出選項"""
+    parser.add_argument("--metrics-textfile", help="將指標寫入 node_exporter textfile collector 檔案")
+
+
+def classify_broken_link(info):
+    """將失效連結分類，作為指標的 class 標籤"""
+    if "google_docs_issue" in info:
+        return "google_permission"
+    if "redirect_issue" in info:
+        return "redirect"
+    if "result_class" in info:
+        return info["result_class"]
+    if "status_code" in info:
+        return f"http_{info['status_code'] // 100}xx"
+    return "error"
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+本地模擬網站
+提供可設定延遲與狀態碼比例的 HTTP/HTTPS 測試伺服器，用來在不連線到學校與
+Google 伺服器的情況下測量連結檢查的效能
+
+路徑說明:
+  /page/<連結數>                 產生含指定數量連結的頁面
+  /assets/<資源數>               產生含圖片、srcset、腳本、樣式表、內嵌框架與影音的頁面
+  /static/<編號>.<副檔名>        依狀態碼比例回應的靜態資源，支援 Range 請求 (206)
+  /nohead/<編號>.<副檔名>        不支援 HEAD (回應 405) 的靜態資源
+  /menu/<連結數>                 以內嵌 JavaScript 產生選單的頁面 (一半網址在腳本中，一半在 /menu/<連結數>.json)
+  /menu/<連結數>.json            選單資料 (JSON，網址中的 / 跳脫成 \\/)
+  /link/<編號>                   依狀態碼比例回應
+  /redirect/<次數>/<編號>        經過指定次數 301 轉址後到達 /link/<編號>
+  /large/<位元組>                回應指定大小的內容
+  /drip/<秒數>                   在指定秒數內慢慢送出內容
+  /docs.google.com/public/<編號> 模擬公開的 Google 文件
+  /docs.google.com/login/<編號>  模擬需要登入的 Google 文件
+  /docs.google.com/<類型>/d/<id>/edit  與 Google 相同網址格式的表單、文件、試算表與簡報 (<類型>/d/e/<id>/... 為已發佈)：
+                                 id 以 private 開頭時轉址到登入頁，以 missing 開頭時回應 404，其餘為公開文件
+  /accounts.google.com/<路徑>    模擬 Google 登入頁
+  /robots.txt                    列出 /sitemap.xml，不允許 /private/
+  /sitemap.xml                   sitemap index，指向 /sitemap/<頁面數>.xml
+  /sitemap/<頁面數>.xml          列出 /page/<n> 頁面 (含 lastmod)
+"""
+
+import os
+import ssl
+import sys
+import socket
+import time
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 預設狀態碼比例
+DEFAULT_STATUS_MIX = {200: 0.9, 404: 0.05, 500: 0.03, 403: 0.02}
+
+GOOGLE_PUBLIC_PAGE = """<html><head><title>Document - Google Docs</title></head>
+<body><div role="presentation" class="drive-viewer-content">
+<p>document viewer</p>{filler}</div></body></html>"""
+
+GOOGLE_LOGIN_PAGE = """<html><head><title>Sign in - Google Accounts</title></head>
+<body><form action="/signin"><p>Sign in to continue to Google Docs</p>
+<p>Use your Google Account</p><input type="email" name="identifier">
+<input type="password" name="password"></form>{filler}</body></html>"""
+
+
+def _build_status_table(status_mix, size=1000):
+    """將狀態碼比例展開成查表用的清單，依編號取值可重現相同結果"""
+    table = []
+    for status, ratio in sorted(status_mix.items()):
+        table.extend([int(status)] * int(round(ratio * size)))
+    return table or [200]
+
+
+def generate_page(link_count, seed=0, redirect_ratio=0.02, google_ratio=0.02):
+    """產生含 link_count 個連結的頁面，包含一般連結、轉址與 Google 文件連結"""
+    rng = random.Random(seed)
+    parts = ["<html><head><title>Mock page</title></head><body><ul>"]
+    for i in range(link_count):
+        roll = rng.random()
+        if roll < google_ratio:
+            kind = "login" if rng.random() < 0.3 else "public"
+            href = f"/docs.google.com/{kind}/{i}"
+        elif roll < google_ratio + redirect_ratio:
+            href = f"/redirect/{rng.randint(1, 4)}/{i}"
+        else:
+            href = f"/link/{i}"
+        parts.append(f'<li class="item"><a href="{href}">連結 {i}</a></li>')
+    parts.append("</ul></body></html>")
+    return "\n".join(parts).encode("utf-8")
+
+
+def generate_asset_page(count, seed=0):
+    """產生含 count 組資源的頁面，每組包含圖片 (含 srcset)、腳本、樣式表、影音與內嵌框架，另含重複引用的資源"""
+    rng = random.Random(seed)
+    head = ['<html><head><title>Mock assets</title>', '<link rel="icon" href="/static/0.ico">']
+    body = ["</head><body>"]
+    for i in range(count):
+        head.append(f'<link rel="stylesheet" href="/static/{i}.css">')
+        body.append(f'<script src="/static/{i}.js"></script>')
+        body.append(
+            f'<img src="/static/{i}.png" srcset="/static/{i}-2x.png 2x, /static/{i}-3x.png 3x" alt="圖片 {i}">'
+        )
+        body.append(f'<img src="/nohead/{i}.jpg" alt="不支援 HEAD {i}">')
+        body.append(f'<video poster="/static/{i}.jpg"><source src="/static/{i}.mp4" type="video/mp4"></video>')
+        body.append(f'<audio src="/static/{i}.mp3"></audio>')
+        kind = "login" if rng.random() < 0.3 else "public"
+        body.append(f'<iframe src="/docs.google.com/{kind}/{i}"></iframe>')
+        # 同一個資源在頁面中出現多次只需檢查一次
+        body.append('<img src="/static/0.png" alt="重複圖片">')
+    body.append("</body></html>")
+    return "\n".join(head + body).encode("utf-8")
+
+
+def generate_menu_page(count, script_kb=0):
+    """
+    產生以 JavaScript 建立選單的頁面：沒有 <a> 連結，前一半網址寫在內嵌腳本中，
+    後一半由腳本讀取 /menu/<count>.json；script_kb 大於 0 時在腳本中加入指定 KB 的不含網址的程式碼
+    """
+    half = count // 2
+    items = ",\n".join(f'  {{title: "選單 {i}", url: "/link/{i}"}}' for i in range(half))
+    filler = ""
+    if script_kb:
+        line = "function pad{0}(x) {{ return x * {0} + Math.floor(x / 3); }}\n"
+        lines = []
+        size = 0
+        while size < script_kb * 1024:
+            lines.append(line.format(len(lines)))
+            size += len(lines[-1])
+        filler = "".join(lines)
+    script = (
+        f"var menu = [\n{items}\n];\n{filler}"
+        f'fetch("/menu/{count}.json").then(r => r.json()).then(data => menu.push(...data));\n'
+        "menu.forEach(item => document.write(`<a href=\"${item.url}\">${item.title}</a>`));\n"
+    )
+    page = f'<html><head><title>Mock menu</title></head><body><nav id="menu"></nav><script>\n{script}</script></body></html>'
+    return page.encode("utf-8")
+
+
+def generate_menu_json(count):
+    """選單的後一半網址 (JSON)，與 PHP 的 json_encode 相同把 / 跳脫成 \\/"""
+    items = [f'{{"title": "選單 {i}", "url": "\\/link\\/{i}"}}' for i in range(count // 2, count)]
+    return ("[" + ",".join(items) + "]").encode("utf-8")
+
+
+class MockWebFarmHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # 標頭與內容分開寫出，關閉 Nagle 避免 keep-alive 連線出現 40ms 延遲
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        # 效能測試時不輸出存取紀錄
+        pass
+
+    def _send(self, status, body=b"", content_type="text/html; charset=utf-8", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def _send_static(self, status, body, content_type="application/octet-stream"):
+        """靜態資源支援單一範圍的 Range 請求 (bytes=起點-終點)，範圍超出內容時回應 416"""
+        range_header = self.headers.get("Range", "")
+        if status != 200 or not range_header.startswith("bytes="):
+            self._send(status, body, content_type)
+            return
+        start, _, end = range_header[len("bytes="):].partition("-")
+        start = int(start or 0)
+        end = min(int(end) if end else len(body) - 1, len(body) - 1)
+        if start >= len(body):
+            self._send(416, b"", content_type, {"Content-Range": f"bytes */{len(body)}"})
+            return
+        self._send(206, body[start:end + 1], content_type, {"Content-Range": f"bytes {start}-{end}/{len(body)}"})
+
+    def do_GET(self):
+        farm = self.server.farm
+        if farm.latency:
+            time.sleep(farm.latency * (0.5 + random.random()))
+
+        path = self.path.split("?", 1)[0]
+        parts = [p for p in path.split("/") if p]
+
+        try:
+            if parts[:1] == ["page"]:
+                count = int(parts[1])
+                body = farm.page_cache.get(count)
+                if body is None:
+                    body = farm.page_cache[count] = generate_page(count, farm.seed)
+                self._send(200, body)
+            elif parts[:1] == ["assets"]:
+                count = int(parts[1])
+                key = ("assets", count)
+                body = farm.page_cache.get(key)
+                if body is None:
+                    body = farm.page_cache[key] = generate_asset_page(count, farm.seed)
+                self._send(200, body)
+            elif parts[:1] == ["menu"]:
+                name = parts[1]
+                if name.endswith(".json"):
+                    self._send(200, generate_menu_json(int(name[:-5])), "application/json")
+                else:
+                    self._send(200, generate_menu_page(int(name), farm.script_kb))
+            elif parts[:1] in (["static"], ["nohead"]):
+                if parts[0] == "nohead" and self.command == "HEAD":
+                    self._send(405, headers={"Allow": "GET"})
+                    return
+                index = int(parts[1].split(".", 1)[0].split("-", 1)[0])
+                status = farm.status_table[index % len(farm.status_table)]
+                self._send_static(status, b"\0" * farm.asset_size)
+            elif parts[:1] == ["link"]:
+                index = int(parts[1])
+                status = farm.status_table[index % len(farm.status_table)]
+                self._send(status, b"<html><body>ok</body></html>")
+            elif parts[:1] == ["redirect"]:
+                hops, index = int(parts[1]), int(parts[2])
+                target = f"/redirect/{hops - 1}/{index}" if hops > 1 else f"/link/{index}"
+                self._send(301, headers={"Location": target})
+            elif parts[:1] == ["large"]:
+                self._send(200, b"x" * int(parts[1]), "application/octet-stream")
+            elif parts[:1] == ["drip"]:
+                self._drip(float(parts[1]))
+            elif path == "/robots.txt":
+                body = f"User-agent: *\nDisallow: /private/\nSitemap: {farm.url('/sitemap.xml')}\n"
+                self._send(200, body.encode("utf-8"), "text/plain")
+            elif path == "/sitemap.xml":
+                self._send(200, generate_sitemap_index(farm), "application/xml")
+            elif parts[:1] == ["sitemap"]:
+                count = int(parts[1].rsplit(".", 1)[0])
+                self._send(200, generate_sitemap(farm, count), "application/xml")
+            elif parts[:2] == ["docs.google.com", "public"]:
+                body = GOOGLE_PUBLIC_PAGE.format(filler="<p>text</p>" * farm.google_filler)
+                self._send(200, body.encode("utf-8"))
+            elif parts[:2] == ["docs.google.com", "login"] or parts[:1] == ["accounts.google.com"]:
+                body = GOOGLE_LOGIN_PAGE.format(filler="<p>text</p>" * farm.google_filler)
+                self._send(200, body.encode("utf-8"))
+            elif parts[:1] == ["docs.google.com"] and parts[2] == "d":
+                document_id = parts[4] if parts[3] == "e" else parts[3]
+                if document_id.startswith("private"):
+                    self._send(302, headers={"Location": f"/accounts.google.com/ServiceLogin?continue={self.path}"})
+                elif document_id.startswith("missing"):
+                    self._send(404, b"not found")
+                else:
+                    body = GOOGLE_PUBLIC_PAGE.format(filler="<p>text</p>" * farm.google_filler)
+                    self._send(200, body.encode("utf-8"))
+            else:
+                self._send(404, b"not found")
+        except (ValueError, IndexError):
+            self._send(400, b"bad request")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _drip(self, seconds, chunks=10):
+        """在指定秒數內分段送出內容，模擬很慢的伺服器"""
+        chunk = b"." * 100
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(chunk) * chunks))
+        self.end_headers()
+        for _ in range(chunks):
+            self.wfile.write(chunk)
+            self.wfile.flush()
+            time.sleep(seconds / chunks)
+
+
+SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+
+
+def generate_sitemap_index(farm, pages=5):
+    """指向一個含多個頁面的 sitemap"""
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{SITEMAP_NS}">'
+        f"<sitemap><loc>{farm.url(f'/sitemap/{pages}.xml')}</loc></sitemap></sitemapindex>"
+    ).encode("utf-8")
+
+
+def generate_sitemap(farm, count):
+    """列出 /page/10、/page/20 ... 共 count 個頁面，另含一個 robots.txt 不允許的頁面"""
+    entries = [
+        f"<url><loc>{farm.url(f'/page/{10 * (i + 1)}')}</loc><lastmod>2024-01-0{i % 9 + 1}</lastmod></url>"
+        for i in range(count)
+    ]
+    entries.append(f"<url><loc>{farm.url('/private/1')}</loc></url>")
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{SITEMAP_NS}">'
+        + "".join(entries)
+        + "</urlset>"
+    ).encode("utf-8")
+
+
+def generate_self_signed_cert(directory, hostname="127.0.0.1"):
+    """使用 openssl 產生自簽憑證，回傳 (certfile, keyfile)"""
+    certfile = os.path.join(directory, "mock_cert.pem")
+    keyfile = os.path.join(directory, "mock_key.pem")
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+            "-keyout", keyfile, "-out", certfile, "-days", "2",
+            "-subj", f"/CN={hostname}",
+            "-addext", f"subjectAltName=IP:{hostname}" if hostname[0].isdigit() else f"subjectAltName=DNS:{hostname}",
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return certfile, keyfile
+
+
+class MockWebFarm:
+    """在背景執行緒啟動的本地模擬網站"""
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        latency=0.0,
+        status_mix=None,
+        seed=0,
+        https=False,
+        certfile=None,
+        keyfile=None,
+        google_filler=50,
+        asset_size=4096,
+        script_kb=0,
+    ):
+        self.latency = latency
+        self.seed = seed
+        self.status_table = _build_status_table(status_mix or DEFAULT_STATUS_MIX)
+        self.google_filler = google_filler
+        self.asset_size = asset_size
+        self.script_kb = script_kb
+        self.page_cache = {}
+        self._tmpdir = None
+
+        self.server = ThreadingHTTPServer((host, port), MockWebFarmHandler)
+        self.server.daemon_threads = True
+        self.server.farm = self
+
+        self.scheme = "http"
+        if https:
+            if certfile is None:
+                self._tmpdir = tempfile.TemporaryDirectory()
+                certfile, keyfile = generate_self_signed_cert(self._tmpdir.name, host)
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile, keyfile)
+            self.server.socket = context.wrap_socket(self.server.socket, server_side=True)
+            self.scheme = "https"
+        self.certfile = certfile
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"{self.scheme}://{host}:{port}"
+
+    def url(self, path):
+        return self.base_url + path
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self._tmpdir is not None:
+            self._tmpdir.cleanup()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="啟動本地模擬網站")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="平均回應延遲 (秒)")
+    parser.add_argument("--https", action="store_true", help="使用自簽憑證啟動 HTTPS")
+    args = parser.parse_args()
+
+    farm = MockWebFarm(port=args.port, latency=args.latency, https=args.https)
+    print(f"模擬網站已啟動: {farm.base_url}/page/100 (資源頁面 {farm.base_url}/assets/20)")
+    if args.https:
+        print(f"自簽憑證: {farm.certfile}")
+    try:
+        farm.server.serve_forever()
+    except KeyboardInterrupt:
+        farm.stop()
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
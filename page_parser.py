@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+頁面解析與 Google 文件權限判斷
+這些函式只做 CPU 運算且只接受 bytes 與簡單參數，可以直接交給子程序執行
+(見 cpu_pool.py)，回應內容不必先在主程序解碼成字串
+BeautifulSoup 在第一次解析時才載入，解析交給子程序時主程序不必載入
+"""
+
+import re
+import urllib.parse
+
+GOOGLE_DOCS_PATTERN = re.compile(
+    r'docs\.google\.com|drive\.google\.com|sheets\.google\.com|slides\.google\.com|forms\.google\.com'
+)
+
+
+# 資源類型與報告中顯示的名稱
+RESOURCE_LABELS = {
+    'link': '連結',
+    'image': '圖片',
+    'script': '腳本',
+    'stylesheet': '樣式表',
+    'iframe': '內嵌框架',
+    'media': '影音',
+    'script_link': '腳本內網址',
+}
+
+# 各標籤中引用資源的屬性與資源類型 (<link> 與 <source> 依 rel 與所在位置另外判斷)
+RESOURCE_ATTRIBUTES = {
+    'img': [('src', 'image'), ('srcset', 'image')],
+    'script': [('src', 'script')],
+    'iframe': [('src', 'iframe')],
+    'frame': [('src', 'iframe')],
+    'video': [('src', 'media'), ('poster', 'image')],
+    'audio': [('src', 'media')],
+    'embed': [('src', 'media')],
+}
+RESOURCE_TAGS = [*RESOURCE_ATTRIBUTES, 'link', 'source']
+
+# 腳本與 JSON 中以引號括住的網址：http(s)://、//主機/ 或以 / 開頭的路徑 (JSON 中的 \/ 先還原成 /)
+SCRIPT_URL_PATTERN = re.compile(
+    r"""["'`]((?:https?:)?//[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)+(?::\d+)?(?:/[^\s"'`<>\\]*)?"""
+    r"""|/[A-Za-z0-9_~%-][^\s"'`<>\\]*)["'`]"""
+)
+# 每個頁面 (或引用的 JSON) 最多掃描的腳本字元數，超過的部分不掃描，讓掃描時間有上限
+MAX_SCRIPT_SCAN_SIZE = 512 * 1024
+SCRIPT_LINK_TEXT = '[腳本中的網址]'
+
+
+def is_google_docs_link(url):
+    """判斷是否為 Google 文件連結"""
+    return GOOGLE_DOCS_PATTERN.search(url) is not None
+
+
+def parse_srcset(value):
+    """解析 srcset 屬性，回傳所有候選網址 ("a.jpg 1x, b.jpg 2x" -> ["a.jpg", "b.jpg"])"""
+    urls = []
+    position = 0
+    while position < len(value):
+        # 略過候選項目之間的空白與逗號
+        while position < len(value) and (value[position].isspace() or value[position] == ','):
+            position += 1
+        start = position
+        while position < len(value) and not value[position].isspace():
+            position += 1
+        url = value[start:position]
+        # 沒有描述子時網址後面直接接逗號
+        if url.endswith(','):
+            url = url.rstrip(',')
+        else:
+            # 略過描述子 (1x、480w)，直到下一個逗號
+            while position < len(value) and value[position] != ',':
+                position += 1
+        if url:
+            urls.append(url)
+    return urls
+
+
+def _resource_urls(tag):
+    """回傳標籤引用的資源 [(原始網址, 資源類型), ...]"""
+    name = tag.name
+    resources = []
+    if name == 'link':
+        rel = [value.lower() for value in tag.get('rel', [])]
+        if 'stylesheet' in rel:
+            resources.append((tag.get('href'), 'stylesheet'))
+        elif 'icon' in rel or 'apple-touch-icon' in rel:
+            resources.append((tag.get('href'), 'image'))
+    elif name == 'source':
+        # <picture> 中的 source 為圖片，<video>/<audio> 中的 source 為影音
+        if tag.parent is not None and tag.parent.name in ('video', 'audio'):
+            resources.append((tag.get('src'), 'media'))
+        else:
+            resources.append((tag.get('src'), 'image'))
+            resources.extend((url, 'image') for url in parse_srcset(tag.get('srcset', '')))
+    else:
+        for attribute, resource_type in RESOURCE_ATTRIBUTES[name]:
+            if attribute == 'srcset':
+                resources.extend((url, resource_type) for url in parse_srcset(tag.get('srcset', '')))
+            else:
+                resources.append((tag.get(attribute), resource_type))
+    return [(url.strip(), resource_type) for url, resource_type in resources if url and url.strip()]
+
+
+def scan_script_urls(source, base_url, limit=MAX_SCRIPT_SCAN_SIZE):
+    """
+    從腳本或 JSON 原始碼找出網址字串，以 base_url 轉成絕對網址並去除重複 (維持出現順序)
+    只掃描前 limit 個字元；含 ${...} 等組合字串的網址與非 http(s) 網址不列入
+    """
+    if isinstance(source, bytes):
+        source = source[:limit].decode('utf-8', errors='replace')
+    source = source[:limit].replace('\\/', '/')
+    base = urllib.parse.urlsplit(base_url)
+    urls = []
+    seen = set()
+    # 先以原始字串去除重複，每個不同的網址只轉換一次
+    for value in dict.fromkeys(SCRIPT_URL_PATTERN.findall(source)):
+        if '${' in value or '{{' in value:
+            continue
+        url = _resolve_script_url(base, value)
+        if url not in seen and url.startswith(('http://', 'https://')):
+            seen.add(url)
+            urls.append(url)
+    return urls
+
+
+def _resolve_script_url(base, value):
+    """轉成絕對網址；常見的絕對網址與以 / 開頭的路徑直接組合，其餘 (含 . 或 .. 的路徑) 交給 urljoin"""
+    if '/.' in value:
+        return urllib.parse.urljoin(base.geturl(), value)
+    if value.startswith('//'):
+        return f"{base.scheme}:{value}"
+    if value.startswith('/'):
+        return f"{base.scheme}://{base.netloc}{value}"
+    return value
+
+
+def _script_urls(soup, base_url):
+    """掃描頁面中所有內嵌 <script> (含 JSON 資料) 的網址，合計最多 MAX_SCRIPT_SCAN_SIZE 個字元"""
+    remaining = MAX_SCRIPT_SCAN_SIZE
+    urls = []
+    for tag in soup.find_all('script'):
+        if tag.get('src') or remaining <= 0:
+            continue
+        source = tag.string or ''
+        urls.extend(scan_script_urls(source, base_url, remaining))
+        remaining -= len(source)
+    return urls
+
+
+def _resource_text(tag, resource_type):
+    text = tag.get('alt') or tag.get('title') or tag.get_text(strip=True)
+    return text or f"[{RESOURCE_LABELS[resource_type]}]"
+
+
+def parse_page_links(content, encoding, page_url, assets=True, scripts=True):
+    """
+    解析頁面並擷取所有連結及其文字內容與父元素
+    assets 為 True 時一併擷取圖片 (含 srcset)、腳本、樣式表、內嵌框架與影音等資源，
+    type 欄位標示資源類型；data:、javascript: 等非 HTTP 的資源不列入
+    scripts 為 True 時另外掃描內嵌腳本與 JSON 中的網址字串 (例如以 JavaScript 產生的選單)
+    相對網址依頁面的 <base href> (沒有時為頁面網址) 轉成絕對網址
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, 'html.parser', from_encoding=encoding)
+    base = soup.find('base', href=True)
+    base_url = urllib.parse.urljoin(page_url, base['href']) if base else page_url
+    names = ['a', *RESOURCE_TAGS] if assets else ['a']
+    links_info = []
+    seen = set()
+    for tag in soup.find_all(names):
+        if tag.name == 'a':
+            if not tag.get('href'):
+                continue
+            resources = [(tag['href'], 'link')]
+        else:
+            resources = _resource_urls(tag)
+
+        for href, resource_type in resources:
+            url = urllib.parse.urljoin(base_url, href)
+            if resource_type != 'link':
+                # 同一頁面重複引用的資源 (例如 src 與 srcset 相同) 只列一次
+                if url in seen or urllib.parse.urlparse(url).scheme not in ('http', 'https'):
+                    continue
+                seen.add(url)
+            parent = tag.parent
+            links_info.append({
+                'href': href,
+                'url': url,
+                'type': resource_type,
+                'text': (tag.get_text(strip=True) or "[無文字]") if resource_type == 'link' else _resource_text(tag, resource_type),
+                'parent': str(parent.name),
+                'parent_class': list(parent.get('class', [])),
+                'parent_id': parent.get('id', ''),
+                'page': page_url
+            })
+
+    if scripts:
+        known = {info['url'] for info in links_info}
+        known.add(page_url)
+        links_info.extend(script_link_entries(_script_urls(soup, base_url), page_url, known))
+    return links_info
+
+
+def script_link_entries(urls, page_url, known):
+    """腳本中找到的網址轉成與其他連結相同格式的項目，已在 known 中的網址略過 (並加入 known)"""
+    entries = []
+    for url in urls:
+        if url in known:
+            continue
+        known.add(url)
+        entries.append({
+            'href': url,
+            'url': url,
+            'type': 'script_link',
+            'text': SCRIPT_LINK_TEXT,
+            'parent': 'script',
+            'parent_class': [],
+            'parent_id': '',
+            'page': page_url,
+        })
+    return entries
+
+
+def classify_google_docs_page(content, encoding, url):
+    """檢查 Google 文件是否需要權限，回傳 (是否可存取, 說明)"""
+    # 檢查是否有登入頁面或權限提示的關鍵詞
+    permission_indicators = [
+        'You need permission',
+        'Request access',
+        '需要權限',
+        '請求存取權限'
+    ]
+    
+    # 這些詞可能出現在正常可訪問的文檔中，但也可能出現在登入頁面
+    # 所以我們需要更嚴格地判斷
+    ambiguous_indicators = [
+        'Sign in',
+        'Google Account', 
+        '登入',
+        'Google 帳戶'
+    ]
+    
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, 'html.parser', from_encoding=encoding)
+    page_text = soup.get_text().lower()
+    
+    # 首先檢查明確的權限指示詞
+    for indicator in permission_indicators:
+        if indicator.lower() in page_text:
+            return False, f"需要權限: {indicator}"
+    
+    # 檢查具有表單特性的元素數量，登入頁面通常有表單
+    login_forms = soup.find_all('form')
+    if login_forms and len(login_forms) >= 1:
+        # 查看表單是否包含密碼欄位，這是登入頁面的特徵
+        password_fields = soup.find_all('input', {'type': 'password'})
+        if password_fields:
+            # 檢查模糊指示詞
+            for indicator in ambiguous_indicators:
+                if indicator.lower() in page_text:
+                    return False, f"疑似需要登入: 發現登入表單和指示詞 '{indicator}'"
+    
+    # 檢查是否有顯示 Google 文件的內容（如果是公開文件應該有這些特徵）
+    content_indicators = ["viewer", "document", "spreadsheet", "presentation", "folder contents"]
+    if is_google_docs_link(url) and any(indicator in page_text for indicator in content_indicators):
+        return True, "文件可公開存取"
+    
+    # 檢查文件內容區塊是否存在
+    content_divs = soup.find_all('div', {'role': 'presentation'}) or \
+                   soup.find_all('div', {'class': 'ndfHFb-c4YZDc-cYSp0e-DARUcf'}) or \
+                   soup.find_all('div', {'class': 'drive-viewer-content'}) or \
+                   soup.find_all('div', {'id': 'drive-viewer-content'})
+    
+    if content_divs:
+        return True, "發現文件內容區塊，應該可以存取"
+        
+    # 額外檢查：Drive 文件夾專用檢查
+    if 'drive.google.com/drive/folders' in url:
+        # 檢查是否有文件列表的特徵
+        file_list_indicators = ["name", "last modified", "file", "folder", "共用", "檔案", "資料夾", "最後修改"]
+        if any(indicator in page_text.lower() for indicator in file_list_indicators):
+            return True, "發現資料夾內容列表，應該可以存取"
+    
+    # 保守結論：我們不確定，但假設可能可以訪問
+    for indicator in ambiguous_indicators:
+        if indicator.lower() in page_text:
+            return True, f"可能需要登入但看起來可以部分存取 (含有'{indicator}'但未發現明確權限阻擋)"
+            
+    return True, "看起來可以存取"
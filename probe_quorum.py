@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+多地點探測與法定數確認
+各探測地點 (GitHub runner、VPS 或本機程序) 同時檢測網站，把結果推送到彙整端 (HTTP POST 或共用目錄)；
+彙整端依時間戳記保留每個地點對每個網站最新的結果，只有達到法定數 (quorum) 的地點都判定異常時
+才視為確認的故障，單一地點的網路問題不會觸發警報
+"""
+
+import os
+import json
+import time
+import threading
+import logging
+from collections import Counter
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# 至少幾個地點判定異常才確認故障
+DEFAULT_QUORUM = 2
+# 超過此秒數的結果不列入判斷
+DEFAULT_MAX_AGE = 300
+# 彙整端等待各地點回報的最長秒數
+DEFAULT_WAIT = 60
+
+
+def make_report(location, results):
+    """探測地點的回報：地點名稱、時間戳記與各網站的檢測結果 (每筆結果也帶有時間戳記)"""
+    now = time.time()
+    return {
+        "location": location,
+        "timestamp": now,
+        "results": [{**result, "timestamp": result.get("timestamp", now)} for result in results],
+    }
+
+
+def push_report(report, destination, token=None, timeout=10):
+    """
+    推送回報：destination 為 http(s) 網址時以 POST 送到彙整端 (token 放在 Authorization 標頭)，
+    否則寫入該目錄下的 <地點>.json (例如 GitHub Actions 各 job 上傳的 artifact)
+    """
+    if destination.startswith(("http://", "https://")):
+        headers = {"Authorization": f"Bearer {token}"} if token else None
+        response = requests.post(destination, json=report, headers=headers, timeout=timeout)
+        response.raise_for_status()
+        return
+    os.makedirs(destination, exist_ok=True)
+    path = os.path.join(destination, f"{report['location'].replace(os.sep, '_')}.json")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def is_outage(result):
+    """需要通知的異常：狀態不是 online，且 (多地點模式下) 已達法定數確認"""
+    return result["status"] != "online" and result.get("confirmed", True)
+
+
+class ProbeAggregator:
+    """合併各地點的探測結果，依法定數判斷是否為確認的故障"""
+
+    def __init__(self, quorum=DEFAULT_QUORUM, max_age=DEFAULT_MAX_AGE, token=None):
+        self.quorum = quorum
+        self.max_age = max_age
+        self.token = token
+        # (網址, 地點) -> 最新的結果
+        self._latest = {}
+        self._locations = set()
+        self._changed = threading.Condition()
+
+    def add(self, report):
+        """加入一個地點的回報，同一地點較舊的結果 (延遲送達或重送) 不會覆蓋較新的結果"""
+        location = report["location"]
+        with self._changed:
+            for result in report["results"]:
+                key = (result["url"], location)
+                current = self._latest.get(key)
+                if current is None or result["timestamp"] >= current["timestamp"]:
+                    self._latest[key] = {**result, "location": location}
+            self._locations.add(location)
+            self._changed.notify_all()
+        logger.info(f"收到 {location} 的探測結果 ({len(report['results'])} 個網站)")
+
+    def load_dir(self, directory):
+        """讀取目錄中各地點寫入的回報檔"""
+        if not os.path.isdir(directory):
+            return
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+                    self.add(json.load(f))
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"無法讀取探測結果 {name}: {e}")
+
+    @property
+    def locations(self):
+        with self._changed:
+            return sorted(self._locations)
+
+    def wait_for(self, expected, timeout=DEFAULT_WAIT):
+        """等到 expected 個地點回報或逾時，回傳已回報的地點數"""
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while len(self._locations) < expected:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+            return len(self._locations)
+
+    def merge(self, urls, now=None):
+        """
+        依網址順序回傳合併後的結果，格式與 check_website 相同，另加上:
+        locations 各地點的狀態、failing_locations 判定異常的地點、confirmed 是否達到法定數
+        確認故障時以最新的異常結果為準；未確認時以最新的正常結果為準 (沒有正常結果時保留異常狀態但不通知)
+        """
+        now = time.time() if now is None else now
+        with self._changed:
+            latest = list(self._latest.values())
+        merged = []
+        for url in urls:
+            entries = sorted(
+                (r for r in latest if r["url"] == url and now - r["timestamp"] <= self.max_age),
+                key=lambda r: r["timestamp"],
+            )
+            if not entries:
+                merged.append({
+                    "url": url,
+                    "status": "error",
+                    "status_code": None,
+                    "response_time": None,
+                    "error": "沒有任何地點回報",
+                    "locations": {},
+                    "failing_locations": [],
+                    "confirmed": False,
+                })
+                continue
+
+            failing = [r for r in entries if r["status"] != "online"]
+            online = [r for r in entries if r["status"] == "online"]
+            confirmed = len(failing) >= self.quorum
+            base = dict(failing[-1] if confirmed or not online else online[-1])
+            base.pop("location", None)
+            base.update(
+                locations={r["location"]: r["status"] for r in entries},
+                failing_locations=[r["location"] for r in failing],
+                confirmed=confirmed,
+            )
+            if failing:
+                summary = f"{len(failing)}/{len(entries)} 個地點異常: {', '.join(base['failing_locations'])}"
+                if confirmed:
+                    # 各地點的錯誤可能不同，列出最常見的錯誤
+                    error = Counter(r["error"] for r in failing).most_common(1)[0][0]
+                    base["error"] = f"{error} ({summary})"
+                    logger.warning(f"{url} 已確認異常 ({summary})", extra={"fields": {"url": url, **base}})
+                else:
+                    logger.warning(
+                        f"{url} 異常未達法定數 {self.quorum}，不發出警報 ({summary})",
+                        extra={"fields": {"url": url, "failing_locations": base["failing_locations"]}},
+                    )
+            merged.append(base)
+        return merged
+
+    def serve(self, port=0, host="0.0.0.0"):
+        """在背景執行緒啟動接收回報的 HTTP 服務 (POST /probe)，回傳 server"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        aggregator = self
+
+        class ProbeHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path.split("?", 1)[0] != "/probe":
+                    self.send_error(404)
+                    return
+                if aggregator.token and self.headers.get("Authorization") != f"Bearer {aggregator.token}":
+                    self.send_error(401)
+                    return
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    aggregator.add(json.loads(self.rfile.read(length)))
+                except (ValueError, KeyError, TypeError) as e:
+                    self.send_error(400, str(e))
+                    return
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), ProbeHandler)
+        server.daemon_threads = True
+        thread = threading.Thread(target=server.serve_forever, name="probe-aggregator", daemon=True)
+        thread.start()
+        logger.info(f"探測彙整服務已啟動: http://{host}:{server.server_address[1]}/probe")
+        return server
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+網站檢測的結果表 (checkWebsite)
+各網站的狀態、是否為確認的故障與對應的憑證以欄位 (array) 存放，建立時依主機對應憑證一次，
+之後的摘要、憑證門檻、結束代碼與各收件者的統計只需計數或查列號，不再反覆篩選結果清單或重新解析網址
+"""
+
+from array import array
+
+from probe_quorum import is_outage
+from run_status import DEGRADED, FAILED, HEALTHY
+
+# 網站狀態欄的代碼
+ONLINE = 0
+TIMEOUT = 1
+DOWN = 2
+
+# 憑證等級欄的代碼，數字越大越嚴重 (無法取得剩餘天數的憑證不列入門檻)
+CERT_UNKNOWN = -1
+CERT_OK = 0
+CERT_WARNING = 1
+CERT_CRITICAL = 2
+CERT_EXPIRED = 3
+
+
+def site_state(result):
+    status = result["status"]
+    if status == "online":
+        return ONLINE
+    return TIMEOUT if status == "timeout" else DOWN
+
+
+def cert_level(cert):
+    """依憑證本身的 warning_days / critical_days 判斷等級"""
+    days = cert["remaining_days"]
+    if days is None:
+        return CERT_UNKNOWN
+    if days <= 0:
+        return CERT_EXPIRED
+    if days <= cert.get("critical_days", 7):
+        return CERT_CRITICAL
+    if days <= cert.get("warning_days", 14):
+        return CERT_WARNING
+    return CERT_OK
+
+
+class ResultTable:
+    """
+    一次檢測的結果，targets 與 results 依相同順序排列，ssl_results 以 hostname 對應到網站
+    results 與 certs 仍保留原本的字典，供報告與 JSON 摘要使用
+    """
+
+    def __init__(self, targets=(), results=(), ssl_results=()):
+        self.targets = list(targets)
+        self.results = list(results)
+        self.certs = list(ssl_results)
+        # 同一主機有多筆憑證時以最後一筆為準
+        cert_rows = {cert["hostname"]: row for row, cert in enumerate(self.certs)}
+
+        self.state = array("b")
+        self.outage = array("b")
+        self.cert_row = array("l")  # 各網站對應的憑證列，沒有憑證為 -1
+        for target, result in zip(self.targets, self.results):
+            self.state.append(site_state(result))
+            self.outage.append(is_outage(result))
+            self.cert_row.append(cert_rows.get(target.host, -1))
+        self.cert_level = array("b", map(cert_level, self.certs))
+        self._rows = None
+
+    @classmethod
+    def _from_columns(cls, targets, results, certs, state, outage, cert_row, cert_level):
+        table = cls.__new__(cls)
+        table.targets, table.results, table.certs = targets, results, certs
+        table.state, table.outage, table.cert_row, table.cert_level = state, outage, cert_row, cert_level
+        table._rows = None
+        return table
+
+    def __len__(self):
+        return len(self.results)
+
+    def rows(self, targets):
+        """網站在表中的列號"""
+        if self._rows is None:
+            self._rows = {target.url: row for row, target in enumerate(self.targets)}
+        return [self._rows[target.url] for target in targets]
+
+    def take(self, rows):
+        """取出部分網站的子表，直接沿用已算好的欄位 (每個有憑證的網站各帶一筆憑證)"""
+        certs, levels, cert_row = [], array("b"), array("l")
+        for row in rows:
+            source = self.cert_row[row]
+            if source < 0:
+                cert_row.append(-1)
+                continue
+            cert_row.append(len(certs))
+            certs.append(self.certs[source])
+            levels.append(self.cert_level[source])
+        return ResultTable._from_columns(
+            [self.targets[row] for row in rows],
+            [self.results[row] for row in rows],
+            certs,
+            array("b", (self.state[row] for row in rows)),
+            array("b", (self.outage[row] for row in rows)),
+            cert_row,
+            levels,
+        )
+
+    def select(self, targets):
+        return self.take(self.rows(targets))
+
+    def filter(self, predicate):
+        """依網站設定篩選 (例如只留下啟用 Telegram 通知的網站)"""
+        return self.take([row for row, target in enumerate(self.targets) if predicate(target)])
+
+    def cert_counts(self):
+        """各憑證等級的數量"""
+        return {level: self.cert_level.count(level) for level in (CERT_OK, CERT_WARNING, CERT_CRITICAL, CERT_EXPIRED)}
+
+    def summary(self):
+        """網站數、正常數、異常數、確認的故障數與達到各門檻的憑證數"""
+        certs = self.cert_counts()
+        return {
+            "total": len(self.state),
+            "online": self.state.count(ONLINE),
+            "timeout": self.state.count(TIMEOUT),
+            "down": self.state.count(DOWN),
+            "outages": self.outage.count(1),
+            "cert_warning": certs[CERT_WARNING] + certs[CERT_CRITICAL] + certs[CERT_EXPIRED],
+            "cert_critical": certs[CERT_CRITICAL] + certs[CERT_EXPIRED],
+        }
+
+    def status(self):
+        """
+        整次檢測的結束代碼：確認的故障或達到緊急天數的憑證為失敗，
+        其他異常 (包含未達法定數的) 或即將到期的憑證為有問題
+        """
+        summary = self.summary()
+        if summary["outages"] or summary["cert_critical"]:
+            return FAILED
+        if summary["online"] < summary["total"] or summary["cert_warning"]:
+            return DEGRADED
+        return HEALTHY
+
+    def outages(self):
+        return [result for result, outage in zip(self.results, self.outage) if outage]
+
+    def certs_at_least(self, level):
+        """等級達到 level 的憑證 (CERT_WARNING 包含緊急與已過期)"""
+        return [cert for cert, cert_level in zip(self.certs, self.cert_level) if cert_level >= level]
+
+    def rollup(self, groups):
+        """
+        各組 (例如收件者 -> 負責的網站) 的列號與確認的故障數，groups 為 {組: [網站設定]}
+        回傳 {組: (列號, 故障數)}，再以 take 取出要寄送的子表
+        """
+        outage = self.outage
+        rolled = {}
+        for key, targets in groups.items():
+            rows = self.rows(targets)
+            rolled[key] = (rows, sum(outage[row] for row in rows))
+        return rolled
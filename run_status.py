@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+執行結果與結束代碼
+排程 (cron、GitHub Actions) 依結束代碼判斷結果:
+  0 正常 (healthy)
+  1 有問題但檢查已完成 (degraded)：失效連結、憑證達到警告天數、未達法定數的異常、時間預算用完而延後檢查
+  2 失敗 (failed)：確認的故障、憑證已過期或達到緊急天數、無法存取檢查目標、執行時發生未處理的錯誤
+--format json 時另外在 stdout 輸出一行 JSON 摘要 (日誌一律寫到 stderr)
+"""
+
+import os
+import sys
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+HEALTHY = 0
+DEGRADED = 1
+FAILED = 2
+
+STATUS_NAMES = {HEALTHY: "healthy", DEGRADED: "degraded", FAILED: "failed"}
+
+
+def worst(statuses):
+    """多個目標 (或分片) 中最嚴重的狀態"""
+    return max(statuses, default=HEALTHY)
+
+
+def add_arguments(parser):
+    parser.add_argument(
+        "--format",
+        choices=["text", "json"],
+        default=os.getenv("OUTPUT_FORMAT", "text"),
+        help="結果摘要的格式：text 只寫日誌，json 另外在 stdout 輸出一行摘要 (預設 text)",
+    )
+
+
+def finish(args, status, **summary):
+    """記錄並依 --format 輸出執行結果，回傳結束代碼"""
+    logger.info(f"執行結果: {STATUS_NAMES[status]} (結束代碼 {status})")
+    if getattr(args, "format", "text") == "json":
+        sys.stdout.write(json.dumps(
+            {"status": STATUS_NAMES[status], "exit_code": status, **summary},
+            ensure_ascii=False, default=str,
+        ) + "\n")
+        sys.stdout.flush()
+    return status
+
+
+def run_main(main, argv=None):
+    """執行入口函式並以其回傳的結束代碼結束程式，未處理的例外視為失敗"""
+    try:
+        status = main(argv)
+    except Exception as e:
+        logger.exception(f"執行時發生未處理的錯誤: {e}")
+        status = FAILED
+    sys.exit(HEALTHY if status is None else status)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+執行環境資訊
+主機名稱、IP 位址、使用者與 GitHub Actions runner 資訊只在啟動時收集一次，
+DNS 解析在背景執行並設有逾時，報告與通知不會因為 DNS 而卡住
+"""
+
+import os
+import socket
+import threading
+
+# DNS 解析最多等待的秒數
+DNS_TIMEOUT = 2.0
+
+_lock = threading.Lock()
+_resolver_thread = None
+_resolved = {}
+_runtime_info = None
+
+
+def _resolve_ip(hostname):
+    try:
+        _resolved["ip_address"] = socket.gethostbyname(hostname)
+    except OSError:
+        _resolved["ip_address"] = None
+
+
+def _get_user():
+    import getpass
+
+    try:
+        return getpass.getuser()
+    except Exception:
+        # 容器內可能沒有對應的使用者資料
+        return os.environ.get("USER") or os.environ.get("USERNAME") or "未知"
+
+
+def prefetch_runtime_info():
+    """在背景開始解析本機 IP，讓 DNS 查詢與網站檢測同時進行"""
+    global _resolver_thread
+    with _lock:
+        if _resolver_thread is None:
+            _resolved["hostname"] = socket.gethostname()
+            _resolver_thread = threading.Thread(
+                target=_resolve_ip,
+                args=(_resolved["hostname"],),
+                name="runtime-env-dns",
+                daemon=True,
+            )
+            _resolver_thread.start()
+
+
+def get_runtime_info(timeout=DNS_TIMEOUT):
+    """取得執行環境資訊 (只收集一次)，DNS 逾時的 IP 位址以「未知」表示"""
+    global _runtime_info
+    if _runtime_info is not None:
+        return _runtime_info
+
+    prefetch_runtime_info()
+    _resolver_thread.join(timeout)
+
+    with _lock:
+        if _runtime_info is None:
+            _runtime_info = {
+                "hostname": _resolved["hostname"],
+                "ip_address": _resolved.get("ip_address") or "未知",
+                "user": _get_user(),
+                "github_run_id": os.environ.get("GITHUB_RUN_ID"),
+                "github_workflow": os.environ.get("GITHUB_WORKFLOW"),
+                "github_repository": os.environ.get("GITHUB_REPOSITORY"),
+                "runner_name": os.environ.get("RUNNER_NAME"),
+                "runner_os": os.environ.get("RUNNER_OS"),
+                "runner_arch": os.environ.get("RUNNER_ARCH"),
+                # GitHub 未提供 runner 所在區域，可由 workflow 自行設定 RUNNER_REGION
+                "runner_region": os.environ.get("RUNNER_REGION"),
+            }
+    return _runtime_info
+
+
+def format_runner_info(info=None):
+    """格式化 GitHub Actions runner 資訊，非 Actions 環境回傳空字串"""
+    info = info or get_runtime_info()
+    if not info["github_run_id"]:
+        return ""
+
+    parts = [f"{info['github_workflow']} #{info['github_run_id']}"]
+    if info["runner_os"]:
+        parts.append(f"{info['runner_os']}/{info['runner_arch']}")
+    if info["runner_region"]:
+        parts.append(info["runner_region"])
+    if info["runner_name"]:
+        parts.append(info["runner_name"])
+    return ", ".join(parts)
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+網站檢測目標設定
+從 JSON / TOML / YAML 設定檔載入並驗證檢測目標，每個目標的
+URL 過濾規則預先編譯成單一正規表示式
+"""
+
+import os
+import re
+import json
+from urllib.parse import urlparse
+
+from content_probe import ContentAssertions
+
+DEFAULT_CONFIG_FILE = "sites.json"
+
+# 每個目標未設定時使用的預設值
+DEFAULTS = {
+    "timeout": 10,
+    "interval": 600,
+    "expected_status": [200],
+    "expected_keyword": None,
+    "content": None,
+    "ssl_warning_days": 14,
+    "ssl_critical_days": 7,
+    "include": [],
+    "exclude": [],
+    "notify": {"email": [], "telegram": True},
+}
+
+TARGET_KEYS = set(DEFAULTS) | {"name", "url"}
+# 其他檢測功能讀取的選填欄位 (見 checkWeblink.py)，存放在 Target.options
+OPTION_KEYS = {"sitemap", "max_pages", "max_body_size", "deadline", "assets", "scripts"}
+
+
+class ConfigError(ValueError):
+    """設定檔格式錯誤"""
+
+
+def _compile_patterns(patterns, field, name):
+    """將多個規則合併成單一正規表示式，比對一次即可判斷"""
+    if not patterns:
+        return None
+    for pattern in patterns:
+        try:
+            re.compile(pattern)
+        except re.error as e:
+            raise ConfigError(f"目標 {name} 的 {field} 規則 {pattern!r} 無效: {e}")
+    return re.compile("|".join(f"(?:{pattern})" for pattern in patterns))
+
+
+class Target:
+    """單一檢測目標與其設定"""
+
+    __slots__ = (
+        "name",
+        "url",
+        "host",
+        "timeout",
+        "interval",
+        "expected_status",
+        "expected_keyword",
+        "content",
+        "ssl_warning_days",
+        "ssl_critical_days",
+        "include_re",
+        "exclude_re",
+        "email",
+        "telegram",
+        "options",
+    )
+
+    def __init__(self, settings):
+        self.name = settings["name"]
+        self.url = settings["url"]
+        self.host = urlparse(self.url).netloc
+        self.timeout = settings["timeout"]
+        self.interval = settings["interval"]
+        self.expected_status = frozenset(settings["expected_status"])
+        self.expected_keyword = settings["expected_keyword"]
+        # 預先編譯內容斷言的關鍵字比對器
+        self.content = ContentAssertions.from_settings(
+            settings["content"], self.expected_keyword
+        )
+        self.ssl_warning_days = settings["ssl_warning_days"]
+        self.ssl_critical_days = settings["ssl_critical_days"]
+        self.include_re = _compile_patterns(settings["include"], "include", self.name)
+        self.exclude_re = _compile_patterns(settings["exclude"], "exclude", self.name)
+        self.email = tuple(settings["notify"].get("email", []))
+        self.telegram = bool(settings["notify"].get("telegram", True))
+        # 其餘選填欄位供其他檢測功能使用
+        self.options = {k: v for k, v in settings.items() if k not in TARGET_KEYS}
+
+    def allows(self, url):
+        """判斷 URL 是否符合 include/exclude 規則"""
+        if self.include_re is not None and not self.include_re.search(url):
+            return False
+        if self.exclude_re is not None and self.exclude_re.search(url):
+            return False
+        return True
+
+    def __repr__(self):
+        return f"Target({self.name!r}, {self.url!r})"
+
+
+def _build_target(raw, defaults, index, section):
+    if isinstance(raw, str):
+        raw = {"url": raw}
+    if not isinstance(raw, dict) or not raw.get("url"):
+        raise ConfigError(f"{section}[{index}] 必須提供 url")
+
+    url = raw["url"]
+    if urlparse(url).scheme not in ("http", "https"):
+        raise ConfigError(f"{section}[{index}] 的 url 必須是 http 或 https: {url}")
+
+    settings = dict(defaults)
+    settings.update(raw)
+    settings["notify"] = {**defaults["notify"], **raw.get("notify", {})}
+    settings.setdefault("name", url)
+    if not settings.get("name"):
+        settings["name"] = url
+
+    unknown = set(settings) - TARGET_KEYS - OPTION_KEYS
+    if unknown:
+        raise ConfigError(f"目標 {settings['name']} 有不明的欄位: {', '.join(sorted(unknown))}")
+
+    for field in ("timeout", "interval", "ssl_warning_days", "ssl_critical_days"):
+        if not isinstance(settings[field], (int, float)) or settings[field] <= 0:
+            raise ConfigError(f"目標 {settings['name']} 的 {field} 必須是正數")
+    if isinstance(settings["expected_status"], int):
+        settings["expected_status"] = [settings["expected_status"]]
+    if isinstance(settings["notify"].get("email"), str):
+        settings["notify"]["email"] = [settings["notify"]["email"]]
+
+    return Target(settings)
+
+
+class SiteConfig:
+    """已驗證的檢測設定，同一區段內的目標名稱不可重複"""
+
+    def __init__(self, data):
+        if not isinstance(data, dict):
+            raise ConfigError("設定檔最外層必須是物件")
+
+        defaults = dict(DEFAULTS)
+        defaults.update(data.get("defaults", {}))
+        defaults["notify"] = {**DEFAULTS["notify"], **data.get("defaults", {}).get("notify", {})}
+
+        self.sites = [
+            _build_target(raw, defaults, i, "sites")
+            for i, raw in enumerate(data.get("sites", []))
+        ]
+        self.link_checks = [
+            _build_target(raw, defaults, i, "link_checks")
+            for i, raw in enumerate(data.get("link_checks", []))
+        ]
+
+        for section in (self.sites, self.link_checks):
+            names = set()
+            for target in section:
+                if target.name in names:
+                    raise ConfigError(f"目標名稱重複: {target.name}")
+                names.add(target.name)
+
+    @classmethod
+    def from_urls(cls, urls, section="sites", defaults=None):
+        """由命令列提供的網址建立設定"""
+        return cls({"defaults": defaults or {}, section: list(urls)})
+
+    def recipients(self, targets):
+        """依郵件收件者分組目標，回傳 {收件者: [目標, ...]}"""
+        routing = {}
+        for target in targets:
+            for recipient in target.email:
+                routing.setdefault(recipient, []).append(target)
+        return routing
+
+
+def load_config(path=None):
+    """載入並驗證設定檔，副檔名決定格式 (.json / .toml / .yaml / .yml)"""
+    path = path or os.environ.get("SITES_CONFIG", DEFAULT_CONFIG_FILE)
+    ext = os.path.splitext(path)[1].lower()
+
+    try:
+        if ext == ".toml":
+            try:
+                import tomllib
+            except ImportError:
+                try:
+                    import tomli as tomllib
+                except ImportError:
+                    raise ConfigError("讀取 TOML 設定檔需要 Python 3.11 或安裝 tomli (pip install tomli)")
+
+            with open(path, "rb") as f:
+                data = tomllib.load(f)
+        elif ext in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError:
+                raise ConfigError("讀取 YAML 設定檔需要安裝 PyYAML (pip install pyyaml)")
+            with open(path, "r", encoding="utf-8") as f:
+                try:
+                    data = yaml.safe_load(f)
+                except yaml.YAMLError as e:
+                    raise ConfigError(f"無法讀取設定檔 {path}: {e}")
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+    except (OSError, ValueError) as e:
+        if isinstance(e, ConfigError):
+            raise
+        raise ConfigError(f"無法讀取設定檔 {path}: {e}")
+
+    return SiteConfig(data)
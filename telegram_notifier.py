@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Telegram 通知發送工具
+將過長的報告依行切分成多則訊息，透過同一個連線依序送出，
+遇到 429 時依 retry_after 等待重送，並合併時間窗內重複的警報
+"""
+
+import os
+import re
+import json
+import time
+
+import requests
+import logging
+
+from instrumentation import instrumentation
+
+logger = logging.getLogger(__name__)
+
+# Telegram 單則訊息上限為 4096 字元，保留一些空間給分段標示
+TELEGRAM_MAX_LENGTH = 4096
+DEFAULT_CHUNK_LENGTH = 4000
+
+TAG_PATTERN = re.compile(r"<(/?)([a-zA-Z][a-zA-Z0-9-]*)[^>]*>")
+ALL_TAGS_PATTERN = re.compile(r"<[^>]+>")
+# 切分長行時不可從中間切斷的標籤與 HTML 實體
+MARKUP_PATTERN = re.compile(r"<[^>]+>|&#?\w+;")
+
+
+def _closing_tags(open_tags):
+    """依相反順序產生尚未關閉標籤的結束標籤"""
+    return "".join(f"</{name}>" for name, _ in reversed(open_tags))
+
+
+def _apply_tags(open_tags, text):
+    """回傳處理過 text 中所有標籤後的未關閉標籤堆疊"""
+    tags = list(open_tags)
+    for match in TAG_PATTERN.finditer(text):
+        is_closing, name = match.group(1), match.group(2).lower()
+        if not is_closing:
+            tags.append((name, match.group(0)))
+            continue
+        # 從堆疊頂端往下找對應的開始標籤
+        for index in range(len(tags) - 1, -1, -1):
+            if tags[index][0] == name:
+                del tags[index]
+                break
+    return tags
+
+
+def _split_long_line(line, max_length):
+    """
+    將單行過長的內容切段，只在標籤與 HTML 實體 (&amp; 等) 之間或文字中切斷，保留 <a href> 等標記；
+    各段之間未關閉的標籤由 split_telegram_message 以 _apply_tags 追蹤，在分段時關閉並重新開啟
+    """
+    if len(line) <= max_length:
+        return [line]
+
+    pieces = []
+    current = ""
+
+    def add_text(text):
+        nonlocal current
+        while text:
+            if len(current) >= max_length:
+                pieces.append(current)
+                current = ""
+            room = max_length - len(current)
+            current += text[:room]
+            text = text[room:]
+
+    position = 0
+    for match in MARKUP_PATTERN.finditer(line):
+        add_text(line[position:match.start()])
+        markup = match.group(0)
+        if current and len(current) + len(markup) > max_length:
+            pieces.append(current)
+            current = ""
+        current += markup
+        position = match.end()
+    add_text(line[position:])
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_telegram_message(message, limit=DEFAULT_CHUNK_LENGTH):
+    """依行 (必要時依實體) 切分訊息，每段的 HTML 標籤都會正確開啟與關閉"""
+    if len(message) <= limit:
+        return [message]
+
+    chunks = []
+    current = ""
+    open_tags = []
+
+    for line in message.splitlines(keepends=True):
+        for piece in _split_long_line(line, limit // 2):
+            next_tags = _apply_tags(open_tags, piece)
+            if (
+                current
+                and len(current) + len(piece) + len(_closing_tags(next_tags)) > limit
+            ):
+                # 結束目前段落，並在下一段重新開啟尚未關閉的標籤
+                chunks.append(current + _closing_tags(open_tags))
+                current = "".join(tag for _, tag in open_tags)
+            current += piece
+            open_tags = next_tags
+
+    if current.strip():
+        chunks.append(current + _closing_tags(open_tags))
+    return chunks
+
+
+class TelegramNotifier:
+    """透過重複使用的 HTTP 連線發送 Telegram 訊息"""
+
+    def __init__(
+        self,
+        bot_token,
+        chat_id,
+        api_base="https://api.telegram.org",
+        timeout=10,
+        max_retries=3,
+        max_retry_wait=60,
+        coalesce_window=0,
+        state_file=None,
+        chunk_length=DEFAULT_CHUNK_LENGTH,
+    ):
+        self.chat_id = chat_id
+        self.api_url = f"{api_base.rstrip('/')}/bot{bot_token}/sendMessage"
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_retry_wait = max_retry_wait
+        self.coalesce_window = coalesce_window
+        self.state_file = state_file
+        self.chunk_length = chunk_length
+        # 同一個 Session 會保留 keep-alive 連線，多則訊息不必重新握手
+        self.session = requests.Session()
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        """由環境變數建立通知器，未設定 Token 或 Chat ID 時回傳 None"""
+        bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
+        chat_id = os.getenv("TELEGRAM_CHAT_ID")
+        if not bot_token or not chat_id:
+            return None
+
+        kwargs.setdefault(
+            "api_base", os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org")
+        )
+        kwargs.setdefault(
+            "coalesce_window", int(os.getenv("TELEGRAM_COALESCE_WINDOW", "1800"))
+        )
+        kwargs.setdefault(
+            "state_file", os.getenv("TELEGRAM_STATE_FILE", ".telegram_state.json")
+        )
+        return cls(bot_token, chat_id, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+    def _load_state(self):
+        if not self.state_file or not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self, state):
+        if not self.state_file:
+            return
+        # 先寫入暫存檔再取代，避免同時執行時讀到寫一半的檔案
+        tmp_file = f"{self.state_file}.tmp"
+        try:
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(tmp_file, self.state_file)
+        except OSError as e:
+            logger.warning(f"無法寫入 Telegram 狀態檔 {self.state_file}: {e}")
+
+    def _current_state(self, dedup_key, now):
+        """讀取狀態檔並清除超過時間窗的舊紀錄 (dedup_key 的紀錄保留)"""
+        return {
+            key: entry
+            for key, entry in self._load_state().items()
+            if now - entry.get("last_sent", 0) < self.coalesce_window
+            or key == dedup_key
+        }
+
+    def _coalesce(self, dedup_key):
+        """
+        檢查同一警報是否在時間窗內已發送過，回傳 (是否略過, 已合併次數)
+        不略過時不寫入狀態，發送成功後才由 _record_sent 記錄
+        """
+        if not dedup_key or self.coalesce_window <= 0:
+            return False, 0
+
+        now = time.time()
+        state = self._current_state(dedup_key, now)
+        entry = state.get(dedup_key)
+
+        if entry and now - entry.get("last_sent", 0) < self.coalesce_window:
+            entry["suppressed"] = entry.get("suppressed", 0) + 1
+            self._save_state(state)
+            return True, entry["suppressed"]
+
+        return False, entry.get("suppressed", 0) if entry else 0
+
+    def _record_sent(self, dedup_key):
+        """記錄警報已送達，之後時間窗內相同的警報會被合併"""
+        if not dedup_key or self.coalesce_window <= 0:
+            return
+        now = time.time()
+        state = self._current_state(dedup_key, now)
+        state[dedup_key] = {"last_sent": now, "suppressed": 0}
+        self._save_state(state)
+
+    def _post(self, payload):
+        """發送單一請求，遇到 429 依 retry_after 等待後重試"""
+        response = None
+        for attempt in range(self.max_retries + 1):
+            with instrumentation.stage("telegram_send"):
+                response = self.session.post(
+                    self.api_url, json=payload, timeout=self.timeout
+                )
+            if response.status_code != 429 or attempt == self.max_retries:
+                return response
+
+            try:
+                retry_after = response.json().get("parameters", {}).get("retry_after", 1)
+            except ValueError:
+                retry_after = response.headers.get("Retry-After", 1)
+            wait = min(float(retry_after), self.max_retry_wait)
+            logger.warning(f"Telegram 速率限制，{wait:.0f} 秒後重試...")
+            time.sleep(wait)
+        return response
+
+    def _send_chunk(self, chunk):
+        payload = {"chat_id": self.chat_id, "text": chunk, "parse_mode": "HTML"}
+        response = self._post(payload)
+        if response.status_code == 200:
+            return True
+
+        logger.error(
+            f"發送 Telegram 通知失敗，狀態碼: {response.status_code}, 回應: {response.text}"
+        )
+        # 如果 HTML 解析失敗，嘗試發送純文本
+        if "can't parse entities" not in response.text:
+            return False
+
+        logger.warning("Telegram HTML 解析失敗，嘗試以純文本格式重新發送...")
+        payload = {"chat_id": self.chat_id, "text": ALL_TAGS_PATTERN.sub("", chunk)}
+        response = self._post(payload)
+        if response.status_code == 200:
+            logger.info("已成功以純文本格式發送 Telegram 通知")
+            return True
+        logger.error(
+            f"純文本發送也失敗，狀態碼: {response.status_code}, 回應: {response.text}"
+        )
+        return False
+
+    def send(self, message, dedup_key=None):
+        """發送訊息，過長時自動分段；dedup_key 相同的警報在時間窗內只發送一次"""
+        skipped, suppressed = self._coalesce(dedup_key)
+        if skipped:
+            logger.info(f"相同警報已於 {self.coalesce_window} 秒內發送過，本次合併 (第 {suppressed} 次)")
+            return False
+        if suppressed:
+            message += f"\n\n(上次通知後另有 {suppressed} 次相同警報已合併)"
+
+        chunks = split_telegram_message(message, self.chunk_length)
+        success = True
+        for index, chunk in enumerate(chunks, 1):
+            if len(chunks) > 1:
+                chunk = f"({index}/{len(chunks)})\n{chunk}"
+            success = self._send_chunk(chunk) and success
+        if success:
+            # 有任何一段沒送達時保留原本的狀態，下次相同的警報不會被合併
+            self._record_sent(dedup_key)
+            logger.info(f"已成功發送 Telegram 通知 (共 {len(chunks)} 則)")
+        return success
@@ -8,7 +8,6 @@ GitHub Actions IP 範圍更新工具
 """
 
 import os
-import sys
 import json
 import subprocess
 import tempfile
@@ -17,20 +16,22 @@ from datetime import datetime
 import shutil
 import re
 import logging
+import argparse
 import requests
 
+from log_setup import setup_logging
+from run_status import FAILED, HEALTHY, add_arguments as add_output_arguments, finish as finish_run, run_main
+
 # 設定日誌
 LOG_DIR = os.path.expanduser("~/crontab")
 os.makedirs(LOG_DIR, exist_ok=True)
 LOG_FILE = os.path.join(LOG_DIR, "github_ufw.log")
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(LOG_FILE),
-        logging.StreamHandler()
-    ]
+# 與連結檢查腳本共用日誌設定 (背景執行緒寫出，LOG_JSON=1 時輸出 JSON)
+setup_logging(
+    os.getenv("LOG_LEVEL", "INFO").upper(),
+    json_format=os.getenv("LOG_JSON") == "1",
+    log_file=LOG_FILE,
 )
 logger = logging.getLogger("github-ip-updater")
 
@@ -201,12 +202,16 @@ def reload_ufw():
     else:
         logger.error(f"重新載入 UFW 規則失敗: {stderr}")
 
-def main():
-    """主函數"""
+def main(argv=None):
+    """主函數，回傳結束代碼 (見 run_status.py)"""
+    parser = argparse.ArgumentParser(description="以 GitHub Actions 的 IP 範圍更新 UFW 規則")
+    add_output_arguments(parser)
+    args = parser.parse_args(argv)
+
     logger.info("===== GitHub Actions IP 更新腳本啟動 =====")
     
     if not check_prerequisites():
-        sys.exit(1)
+        return finish_run(args, FAILED, command="sync-firewall", error="缺少 ufw")
     
     # 檢查 UFW 版本
     ufw_version = check_ufw_version()
@@ -216,7 +221,7 @@ def main():
     ip_ranges = get_github_ips()
     if not ip_ranges:
         logger.error("無法獲取 GitHub Actions IP 範圍，腳本終止")
-        sys.exit(1)
+        return finish_run(args, FAILED, command="sync-firewall", error="無法獲取 GitHub Actions IP 範圍")
     
     # 完全重置 UFW (比刪除個別規則更可靠)
     reset_ufw()
@@ -238,10 +243,7 @@ def main():
     
     logger.info(f"共添加 {ipv4_count} 條 GitHub Actions IP 規則")
     logger.info("===== GitHub Actions IP 更新腳本完成 =====")
+    return finish_run(args, HEALTHY, command="sync-firewall", ufw_version=ufw_version, rules=ipv4_count)
 
 if __name__ == "__main__":
-    try:
-        main()
-    except Exception as e:
-        logger.exception(f"腳本執行時發生未處理的錯誤: {e}")
-        sys.exit(1)
\ No newline at end of file
+    run_main(main)
\ No newline at end of file
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+統一的命令列入口
+各工具 (checkWeblink.py、checkWebsite.py、update_github_actions_ips.py、benchmark.py) 仍可單獨執行，
+這裡以子命令集中在一起，並提供共用的設定檔、並行數、快取目錄與輸出格式選項
+
+使用方法:
+  weblink check-links [--sitemap] [--time-budget 600] ...    檢查網站頁面上的失效連結
+  weblink check-sites [--daemon] [--aggregate ...] ...       檢查重要網站的可用性與 SSL 憑證
+  weblink sync-firewall                                      以 GitHub Actions 的 IP 範圍更新 UFW 規則
+  weblink bench [--modes links,google,scripts,startup] ...   離線效能測試
+
+共用選項寫在子命令之後，其餘選項原樣交給對應的工具 (weblink check-links --help 列出所有選項)
+結束代碼: 0 正常、1 有問題 (degraded)、2 失敗 (見 run_status.py)
+"""
+
+import os
+import sys
+import argparse
+import importlib
+
+from run_status import run_main
+
+# --cache-dir 下各狀態檔對應的環境變數
+CACHE_FILES = {
+    "CERT_CACHE_FILE": ".cert_cache.json",
+    "HOST_LATENCY_FILE": ".host_latency.json",
+    "LINK_INDEX_FILE": ".link_index.sqlite",
+    "CRAWL_STATE_FILE": ".crawl_state.json",
+    "TELEGRAM_STATE_FILE": ".telegram_state.json",
+    "MAIL_SPOOL_DIR": ".mail_spool",
+}
+
+# 子命令 -> (模組, 說明, 支援的共用選項)
+COMMANDS = {
+    "check-links": ("checkWeblink", "檢查網站頁面上的失效連結", ("config", "concurrency", "cache_dir", "format")),
+    "check-sites": ("checkWebsite", "檢查重要網站的可用性與 SSL 憑證", ("config", "concurrency", "cache_dir", "format")),
+    "sync-firewall": ("update_github_actions_ips", "以 GitHub Actions 的 IP 範圍更新 UFW 規則", ("format",)),
+    "bench": ("benchmark", "離線效能測試 (--modes 選擇 links、google、google_pool、google_probe、sites、scripts、startup、aggregate)", ()),
+}
+
+
+def _shared_parser(options):
+    """子命令共用的選項，--help 交給各工具處理"""
+    parser = argparse.ArgumentParser(add_help=False)
+    if "config" in options:
+        parser.add_argument("--config", help="設定檔路徑 (預設 SITES_CONFIG 或 sites.json)")
+    if "concurrency" in options:
+        parser.add_argument("--concurrency", type=int, help="同時檢查的連結或網站數")
+    if "cache_dir" in options:
+        parser.add_argument(
+            "--cache-dir",
+            default=os.getenv("WEBLINK_CACHE_DIR"),
+            help="憑證快取、主機延遲、連結索引、爬取狀態、通知狀態與待寄郵件的存放目錄 (預設為目前目錄)",
+        )
+    if "format" in options:
+        parser.add_argument("--format", choices=["text", "json"], help="結果摘要的格式 (json 時在 stdout 輸出一行摘要)")
+    return parser
+
+
+def apply_cache_dir(cache_dir):
+    """把各狀態檔移到 cache_dir 下 (已以環境變數指定的不變)，須在載入工具模組前呼叫"""
+    os.makedirs(cache_dir, exist_ok=True)
+    for variable, name in CACHE_FILES.items():
+        os.environ.setdefault(variable, os.path.join(cache_dir, name))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="weblink",
+        description="網站連結與可用性檢查工具",
+        epilog="結束代碼: 0 正常、1 有問題 (degraded)、2 失敗",
+    )
+    commands = parser.add_subparsers(dest="command", required=True, metavar="COMMAND")
+    for name, (_, help_text, options) in COMMANDS.items():
+        commands.add_parser(name, help=help_text, parents=[_shared_parser(options)], add_help=False, allow_abbrev=False)
+    return parser.parse_known_args(argv)
+
+
+def main(argv=None):
+    args, rest = parse_args(sys.argv[1:] if argv is None else argv)
+    module_name, _, _ = COMMANDS[args.command]
+
+    if getattr(args, "cache_dir", None):
+        apply_cache_dir(args.cache_dir)
+        if args.command == "check-links":
+            # 放在前面，命令列另外指定的 --checkpoint-dir 優先
+            rest = ["--checkpoint-dir", os.path.join(args.cache_dir, ".link_shards"), *rest]
+    for option in ("config", "concurrency", "format"):
+        value = getattr(args, option, None)
+        if value is not None:
+            rest += [f"--{option}", str(value)]
+
+    # 只載入執行的子命令需要的模組
+    return importlib.import_module(module_name).main(rest)
+
+
+def cli():
+    """套件安裝的 weblink 指令的進入點"""
+    run_main(main)
+
+
+if __name__ == "__main__":
+    cli()